@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import re
 import time
@@ -6,18 +7,64 @@ import discord
 from discord.ext import tasks
 
 from bot.embed_creation import create_profile_embed, create_help_embed, create_birthday_embed #for birthday
+from bot.embed_cache import embed_page_cache, prebuild_leaderboard_pages
 from bot.pagination_view import PaginationView
-from database.crud_data import (update_data, get_data_organization_leaderboard, get_organization_rank)
-from database.crud_user import (get_user, update_user, insert_user, get_active_users, get_deactivated_users)
+from database.aio import (update_data, get_snapshot_date, get_data_organization_leaderboard,
+                          get_current_organization_rank, get_profile_data, flush_daily_data_buffer,
+                          get_user, update_user, insert_user, get_active_users, get_deactivated_users,
+                          get_users_with_birthday_today, apply_retention, load_score_matrices, run_in_database)
+from database.crud_data import daily_data_buffer
+from database.manager import DatabaseManager
 from database.models import User, DailyUserData
-from utils.api import (get_htb_data, get_rm_data, get_thm_data)
+from utils.api import (get_htb_data, get_rm_data, get_thm_data, aclose_clients)
 from utils.ressources import setup_emoji
-from utils.services import update_all_daily_data
-from database.crud_user import get_users_with_birthday_today
-from datetime import datetime
+from utils.services import CYCLE_MAX_AGE_RATIO, data_freshness, fetch_with_deadline, update_all_daily_data
+from utils.statistics import movers, overall_leaderboard, MAX_MOVERS_WINDOW
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+DAILY_DATA_FLUSH_INTERVAL: int = 30
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _on_background_task_done(task: asyncio.Task) -> None:
+    """
+    Forget a finished background task and log its failure
+    :param task: asyncio.Task, finished task
+    :return: None
+    """
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f'Background task {task.get_name()} failed. Error: {task.exception()}', exc_info=task.exception())
+
+
+def start_background_task(coroutine) -> asyncio.Task:
+    """
+    Run a coroutine in the background, a reference is kept until it finishes so it can't be garbage collected
+    :param coroutine: Coroutine, coroutine to run
+    :return: asyncio.Task, running task
+    """
+    task: asyncio.Task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_task_done)
+    return task
+
+
+class RankerBot(discord.Bot):
+    """
+    Bot closing the pooled HTTP clients of the platforms when it shuts down.
+    """
+
+    async def close(self) -> None:
+        """
+        Close the connection to Discord, then the HTTP clients
+        :return: None
+        """
+        await super().close()
+        await aclose_clients()
+
 
 def setup_bot(
         guild_id: int,
@@ -25,11 +72,18 @@ def setup_bot(
         birthday_channel_id: int,
         update_interval: int,
         organization_name: str,
-        dev_mode: bool = False
+        dev_mode: bool = False,
+        database_maintenance_interval: int = 24,
+        database_backup_path: str | None = None,
+        data_retention_days: int | None = None,
+        weekly_retention_days: int | None = None,
+        score_matrix_directory: str | None = None,
+        profile_fetch_deadline: float = 5.0,
+        profile_max_age: int = 15
 ) -> discord.Bot:
     intents = discord.Intents.default()
     intents.members = True
-    bot = discord.Bot(intents=intents)
+    bot = RankerBot(intents=intents)
 
     guild_emojis: dict = {}
 
@@ -46,10 +100,17 @@ def setup_bot(
         guild_emojis.update({'RM_logo': discord.utils.get(bot.emojis, name='RM_logo')})
         guild_emojis.update({'THM_logo': discord.utils.get(bot.emojis, name='THM_logo')})
 
+        await load_score_matrices(score_matrix_directory)
+        active_users: list[User] = await get_active_users()
+        movers.refresh(active_users)
+        overall_leaderboard.refresh(active_users)
+        bot.add_view(PaginationView(organization_name))
         logger.info(f'{bot.user} is ready and online!')
 
         check_birthdays.start()
         update_users_score.start()
+        flush_daily_data.start()
+        maintain_database.start()
 
     @bot.event
     async def on_application_command_error(ctx, error) -> None:
@@ -85,8 +146,8 @@ def setup_bot(
         :return: None
         """
         members_ids: list[int] = [member.id for member in bot.get_guild(guild_id).members]
-        users: list[User] = get_active_users()
-        users_deactivated: list[User] = get_deactivated_users()
+        users: list[User] = await get_active_users()
+        users_deactivated: list[User] = await get_deactivated_users()
 
         update_channel_id: int = channel_id[len(channel_id) - 1]
         update_channel = bot.get_channel(update_channel_id)
@@ -101,21 +162,59 @@ def setup_bot(
         logger.debug('Updating users score...')
 
         start_time = time.time()
-        await update_all_daily_data(members_ids, users, users_deactivated, dev_mode)
+        updated_users: int = await update_all_daily_data(
+            members_ids, users, users_deactivated, dev_mode, update_interval * 60 * CYCLE_MAX_AGE_RATIO
+        )
         duration = time.time() - start_time
+        throughput: float = updated_users / duration if duration else 0.0
 
         end_embed = discord.Embed(
             title="Update Complete",
             description=f"Scores of users have been updated successfully!\n\n"
                         f"Activated users: `{len(users)}`\n"
                         f"Deactivated users: `{len(users_deactivated)}`"
-                        f"\n\nDuration: `{duration:.2f}` seconds",
+                        f"\n\nDuration: `{duration:.2f}` seconds"
+                        f"\nThroughput: `{throughput:.2f}` users/sec",
             color=discord.Color.green()
         )
         end_embed.set_thumbnail(url="https://upload.wikimedia.org/wikipedia/commons/thumb/3/3b/"
                                     "Eo_circle_green_checkmark.svg/1200px-Eo_circle_green_checkmark.svg.png")
         await message.edit(content=None, embed=end_embed)
-        logger.debug('Users score updated!')
+        logger.debug(f'Users score updated! {updated_users} users in {duration:.2f}s ({throughput:.2f} users/sec)')
+        start_background_task(prebuild_leaderboards())
+
+    async def prebuild_leaderboards() -> None:
+        """
+        Render the pages of the new leaderboard snapshots in the background once the update cycle is done
+        :return: None
+        """
+        embed_page_cache.new_snapshot()
+        for platform in ['htb', 'rm', 'thm']:
+            leaderboard_list: list[dict] = await get_data_organization_leaderboard(platform)
+            prebuild_leaderboard_pages(leaderboard_list, platform, organization_name)
+        prebuild_leaderboard_pages(overall_leaderboard.get(), 'overall', organization_name)
+
+    @tasks.loop(seconds=DAILY_DATA_FLUSH_INTERVAL)
+    async def flush_daily_data() -> None:
+        """
+        Every few seconds, write the daily data buffered by the /profile command
+        The stored organization ranks are only rebuilt by the update cycle
+        :return: None
+        """
+        await flush_daily_data_buffer()
+
+    @tasks.loop(hours=database_maintenance_interval)
+    async def maintain_database() -> None:
+        """
+        Periodically roll the old daily data up into weekly and monthly aggregates,
+        run the database maintenance (ANALYZE, optimize, incremental vacuum)
+        and back the database up if a backup path is set
+        :return: None
+        """
+        await apply_retention(data_retention_days, weekly_retention_days)
+        await run_in_database(DatabaseManager.run_maintenance)
+        if database_backup_path:
+            await asyncio.to_thread(DatabaseManager.backup, database_backup_path)
 
     @tasks.loop(hours=24)
     async def check_birthdays() -> None:
@@ -123,7 +222,7 @@ def setup_bot(
         Every 24 hrs, check if any user has a birthday today.
         :return: None
         """
-        users_with_birthday = get_users_with_birthday_today()
+        users_with_birthday = await get_users_with_birthday_today()
         logger.info(f'Checking birthdays... {len(users_with_birthday)} users have a birthday today.')
 
         if users_with_birthday:
@@ -165,18 +264,18 @@ def setup_bot(
                 'Make sure to use alphanumeric characters, -, _, or . and keep it between 3 and 25 characters.',
                 ephemeral=True
             )
-        elif (user := get_user(discord_id=author_id)) is not None:
+        elif (user := await get_user(discord_id=author_id)) is not None:
             await ctx.respond(
                 f':detective: Hey `{user.username}`! Looks like you\'re already registered. Ready for another mission?',
                 ephemeral=True
             )
-        elif get_user(username=username) is not None:
+        elif await get_user(username=username) is not None:
             await ctx.respond(
                 f':no_entry_sign: Oops! The username `{username}` is already taken. Maybe a hacker alias?',
                 ephemeral=True
             )
         else:
-            insert_user({'discord_id': author_id, 'username': username})
+            await insert_user({'discord_id': author_id, 'username': username})
             logger.debug(f'New user registered: {username} by {author_id}')
             await ctx.respond(
                 f':tada: Welcome aboard, `{username}`! Gear up for some cybersecurity challenges!',
@@ -229,7 +328,7 @@ def setup_bot(
             return None
 
         author_id: int = ctx.author.id
-        user: User = get_user(discord_id=author_id)
+        user: User = await get_user(discord_id=author_id)
         updates_user: dict = {}
         updates_daily_data: dict = {}
 
@@ -250,7 +349,7 @@ def setup_bot(
                         ephemeral=True
                     )
                     return None
-                elif get_user(username=username) is not None:
+                elif await get_user(username=username) is not None:
                     await ctx.respond(
                         f':no_entry_sign: Oops! The username `{username}` is already taken. Maybe a hacker alias?',
                         ephemeral=True
@@ -270,71 +369,67 @@ def setup_bot(
                     )
                     return None
 
-            if htb_id:
-                if re.match(r'^([0-9]{1,9})$', str(htb_id)) is None:
-                    await ctx.respond(
-                        f':closed_lock_with_key: Hmm... `{htb_id}` doesn\'t seem like a valid HackTheBox ID.',
-                        ephemeral=True
-                    )
-                    return None
-                else:
-                    htb_data = await get_htb_data(htb_id)
-                    if not htb_data:
-                        await ctx.respond(
-                            f':no_entry_sign: Oops! The HackTheBox ID `{htb_id}` doesn\'t exist.',
-                            ephemeral=True
-                        )
-                        return None
-                    else:
-                        updates_user['htb_id']: int = htb_id
-                        updates_daily_data['htb_rank']: int = htb_data['htb_rank']
-                        updates_daily_data['htb_score']: int = htb_data['htb_score']
+            if htb_id and re.match(r'^([0-9]{1,9})$', str(htb_id)) is None:
+                await ctx.respond(
+                    f':closed_lock_with_key: Hmm... `{htb_id}` doesn\'t seem like a valid HackTheBox ID.',
+                    ephemeral=True
+                )
+                return None
+
+            if rm_id and re.match(r'^[0-9]{1,9}$', str(rm_id)) is None:
+                await ctx.respond(
+                    f':closed_lock_with_key: Hmm... `{rm_id}` doesn\'t seem like a valid RootMe ID.',
+                    ephemeral=True
+                )
+                return None
+
+            if thm_id and re.match(r'^([a-zA-Z0-9-_.]{2,16})$', thm_id) is None:
+                await ctx.respond(
+                    f':closed_lock_with_key: Hmm... `{thm_id}` doesn\'t seem like a valid TryHackMe ID.',
+                    ephemeral=True
+                )
+                return None
 
+            # The new IDs are checked concurrently, an ID the platform couldn't check in time is rejected
+            platform_ids: dict = {'htb': ('HackTheBox', htb_id), 'rm': ('RootMe', rm_id), 'thm': ('TryHackMe', thm_id)}
+            fetches: dict = {}
+            if htb_id:
+                fetches['htb'] = get_htb_data(htb_id)
             if rm_id:
-                if re.match(r'^[0-9]{1,9}$', str(rm_id)) is None:
+                fetches['rm'] = get_rm_data(rm_id, rm_name=user.rm_name if rm_id == user.rm_id else None)
+            if thm_id:
+                fetches['thm'] = get_thm_data(thm_id)
+            platforms_data: dict[str, dict | None] = await fetch_with_deadline(fetches, profile_fetch_deadline)
+
+            for platform, platform_data in platforms_data.items():
+                platform_name, platform_id = platform_ids[platform]
+                if platform_data is None:
                     await ctx.respond(
-                        f':closed_lock_with_key: Hmm... `{rm_id}` doesn\'t seem like a valid RootMe ID.',
+                        f':hourglass: {platform_name} is unreachable, the ID `{platform_id}` couldn\'t be checked. '
+                        'Please try again later.',
                         ephemeral=True
                     )
                     return None
-                else:
-                    rm_data = await get_rm_data(rm_id, fast_mode=True)
-                    if not rm_data:
-                        await ctx.respond(
-                            f':no_entry_sign: Oops! The RootMe ID `{rm_id}` doesn\'t exist.',
-                            ephemeral=True
-                        )
-                        return None
-                    else:
-                        updates_user['rm_id']: int = rm_id
-                        updates_daily_data['rm_rank']: int = rm_data['rm_rank']
-                        updates_daily_data['rm_score']: int = rm_data['rm_score']
-                        updates_user['rm_name']: str = rm_data['rm_name']
-
-            if thm_id:
-                if re.match(r'^([a-zA-Z0-9-_.]{2,16})$', thm_id) is None:
+                elif not platform_data:
                     await ctx.respond(
-                        f':closed_lock_with_key: Hmm... `{thm_id}` doesn\'t seem like a valid TryHackMe ID.',
+                        f':no_entry_sign: Oops! The {platform_name} ID `{platform_id}` doesn\'t exist.',
                         ephemeral=True
                     )
                     return None
                 else:
-                    thm_data = await get_thm_data(thm_id)
-                    if not thm_data:
-                        await ctx.respond(
-                            f':no_entry_sign: Oops! The TryHackMe ID `{thm_id}` doesn\'t exist.',
-                            ephemeral=True
-                        )
-                        return None
-                    else:
-                        updates_user['thm_id']: str = thm_id
-                        updates_daily_data['thm_rank']: int = thm_data['thm_rank']
-                        updates_daily_data['thm_rooms']: int = thm_data['thm_rooms']
+                    updates_daily_data.update(platform_data)
+                updates_user[f'{platform}_id'] = platform_id
+            if rm_id and rm_id != user.rm_id:
+                updates_user['rm_name'] = None
+            if 'rm_name' in updates_daily_data:
+                updates_user['rm_name']: str = updates_daily_data.pop('rm_name')
+            fetched_ids: dict = {platform: platform_id for platform, (_, platform_id) in platform_ids.items()}
+            updates_daily_data.update(data_freshness.record(author_id, platforms_data, fetched_ids))
 
             if updates_user or updates_daily_data:
-                user: User = update_user(user, updates_user)
-                daily_user_data: DailyUserData = update_data(user.discord_id, updates_daily_data)
-                orga_user_rank: dict = get_organization_rank(user.discord_id)
+                user: User = await update_user(user, updates_user)
+                daily_user_data: DailyUserData = await update_data(user.discord_id, updates_daily_data)
+                orga_user_rank: dict = await get_current_organization_rank(daily_user_data)
 
                 logger.debug(f'User @{user.username} updated: {user=}, {daily_user_data=}, {orga_user_rank=}')
 
@@ -369,10 +464,12 @@ def setup_bot(
         :param member: discord.Member, username of the user
         :return: None
         """
+        # The database thread can be busy with an update cycle, so the interaction is acknowledged before reading it
+        await ctx.defer()
 
         author: discord.Member = ctx.author
         member: discord.Member = author if not member else member
-        user: User = get_user(discord_id=member.id)
+        user: User = await get_user(discord_id=member.id)
         is_author: bool = member == author
         display_name: str = "You" if is_author else member.display_name
 
@@ -388,35 +485,50 @@ def setup_bot(
             await ctx.respond(message, ephemeral=True)
             return None
 
-        await ctx.defer()
+        # Stale-while-revalidate: the stored data is displayed at once,
+        # then the platforms not fetched recently are refreshed and the message is edited with the fresh numbers
+        daily_user_data, orga_user_rank = await get_profile_data(user.discord_id)
+        logger.debug(f'User @{user.username} profile displayed: {user=}, {daily_user_data=}, {orga_user_rank=}')
+        profile_embed: discord.Embed = create_profile_embed(
+            user, daily_user_data, orga_user_rank, author, member, guild_emojis, organization_name
+        )
+        await ctx.respond(embed=profile_embed)
+
+        platform_ids: dict = {'htb': user.htb_id, 'rm': user.rm_id, 'thm': user.thm_id}
+        stale_platforms: list[str] = [
+            platform for platform, platform_id in platform_ids.items()
+            if platform_id and not data_freshness.is_fresh(user.discord_id, platform, profile_max_age * 60)
+        ]
+        if not stale_platforms:
+            return None
+
+        # The platforms are fetched concurrently, the ones missing the deadline keep their last stored data
+        fetches: dict = {}
+        if 'htb' in stale_platforms:
+            fetches['htb'] = get_htb_data(user.htb_id)
+        if 'rm' in stale_platforms:
+            fetches['rm'] = get_rm_data(user.rm_id, fast_mode=True)
+        if 'thm' in stale_platforms:
+            fetches['thm'] = get_thm_data(user.thm_id)
+        logger.debug(f'Refreshing {", ".join(fetches)} data for {user.username}')
+        platforms_data: dict[str, dict | None] = await fetch_with_deadline(fetches, profile_fetch_deadline)
 
         updates_daily_data: dict = {}
-        if user.htb_id:
-            logger.debug(f'Fetching HTB data for {user.htb_id}')
-            htb_data = await get_htb_data(user.htb_id)
-            updates_daily_data['htb_rank']: int = htb_data['htb_rank']
-            updates_daily_data['htb_score']: int = htb_data['htb_score']
-        if user.rm_id:
-            logger.debug(f'Fetching RM data for {user.rm_id}')
-            rm_data = await get_rm_data(user.rm_id, fast_mode=True)
-            updates_daily_data['rm_rank']: int = rm_data['rm_rank']
-            updates_daily_data['rm_score']: int = rm_data['rm_score']
-        if user.thm_id:
-            logger.debug(f'Fetching THM data for {user.thm_id}')
-            thm_data = await get_thm_data(user.thm_id)
-            updates_daily_data['thm_rank']: int = thm_data['thm_rank']
-            updates_daily_data['thm_rooms']: int = thm_data['thm_rooms']
-
-        daily_user_data: DailyUserData = update_data(user.discord_id, updates_daily_data)
-        orga_user_rank: dict = get_organization_rank(member.id)
+        for platform_data in platforms_data.values():
+            updates_daily_data.update(platform_data or {})
+        updates_daily_data.update(data_freshness.record(user.discord_id, platforms_data, platform_ids))
+        stale_platforms = [platform for platform, data in platforms_data.items() if not data]
 
-        logger.debug(f'User @{user.username} profile displayed: {user=}, {daily_user_data=}, {orga_user_rank=}')
+        if updates_daily_data and daily_data_buffer.add(user.discord_id, updates_daily_data):
+            await flush_daily_data()
+        daily_user_data, orga_user_rank = await get_profile_data(user.discord_id)
+
+        logger.debug(f'User @{user.username} profile refreshed: {daily_user_data=}, {stale_platforms=}')
 
         profile_embed: discord.Embed = create_profile_embed(
-            user, daily_user_data, orga_user_rank, author, member, guild_emojis, organization_name
+            user, daily_user_data, orga_user_rank, author, member, guild_emojis, organization_name, stale_platforms
         )
-
-        await ctx.respond(embed=profile_embed)
+        await ctx.edit(embed=profile_embed)
 
     @bot.slash_command(
         name='leaderboard',
@@ -427,29 +539,116 @@ def setup_bot(
             ctx,
             platform: discord.Option(
                 str,
-                description='The platform you want to display the leaderboard of',
-                choices=['htb', 'rm', 'thm'],
+                description='The platform you want to display the leaderboard of, or overall for all of them',
+                choices=['htb', 'rm', 'thm', 'overall'],
                 required=True
+            ),
+            date: discord.Option(
+                str,
+                description='Display the leaderboard as it was on this date (DD/MM/YYYY)',
+                required=False
+            ),
+            days_ago: discord.Option(
+                int,
+                description='Display the leaderboard as it was this number of days ago',
+                min_value=0,
+                required=False
             )
     ) -> None:
         """
-        Display the leaderboard of the organization members
+        Display the leaderboard of the organization members, today or as it was on a past date
+        When no data was stored on the requested date, the latest earlier snapshot is displayed.
         :param ctx: ApplicationContext, automatically passed
         :param platform: str, platform to display the leaderboard of
+        :param date: str, past date of the leaderboard (DD/MM/YYYY)
+        :param days_ago: int, number of days before today of the leaderboard
         :return: None
         """
         if not platform:
             await ctx.respond(
-                ':warning: You need to provide a platform [htb, rm, thm].',
+                ':warning: You need to provide a platform [htb, rm, thm, overall].',
+                ephemeral=True
+            )
+            return None
+
+        today = datetime.now().date()
+        requested_date = today
+        if date is not None and days_ago is not None:
+            await ctx.respond(
+                ':warning: You can provide either a date or a number of days ago, not both.',
+                ephemeral=True
+            )
+            return None
+        elif date:
+            try:
+                requested_date = datetime.strptime(date, "%d/%m/%Y").date()
+            except ValueError:
+                await ctx.respond(
+                    f':closed_lock_with_key: Hmm... `{date}` doesn\'t seem like a valid date (DD/MM/YYYY).',
+                    ephemeral=True
+                )
+                return None
+        elif days_ago:
+            requested_date = today - timedelta(days=days_ago)
+
+        if requested_date > today:
+            await ctx.respond(':crystal_ball: The leaderboard of the future is not written yet.', ephemeral=True)
+            return None
+
+        snapshot_date = await get_snapshot_date(requested_date)
+        if requested_date != today and snapshot_date is None:
+            await ctx.respond(
+                f':hourglass: No leaderboard was stored on or before {requested_date.strftime("%d/%m/%Y")}.',
+                ephemeral=True
+            )
+            return None
+        snapshot_date = snapshot_date or today
+        past_date = snapshot_date if snapshot_date != today else None
+        logger.debug(f'Leaderboard {platform=} {requested_date=} {snapshot_date=}')
+
+        pagination_view = PaginationView(organization_name)
+        await pagination_view.respond(ctx, 'leaderboard', platform, board_date=past_date, snapshot_date=snapshot_date)
+
+    @bot.slash_command(
+        name='movers',
+        description='Display the members who progressed the most over the last days',
+        guild_ids=[guild_id]
+    )
+    async def movers_(
+            ctx,
+            platform: discord.Option(
+                str,
+                description='The platform you want to display the movers of',
+                choices=['htb', 'rm', 'thm'],
+                required=True
+            ),
+            window: discord.Option(
+                str,
+                description='The number of days to look back: 1d, 7d, 30d or any number of days like 90d',
+                required=False,
+                default='7d'
+            )
+    ) -> None:
+        """
+        Display the members who progressed the most on a platform over the last days
+        :param ctx: ApplicationContext, automatically passed
+        :param platform: str, platform to display the movers of
+        :param window: str, number of days to look back
+        :return: None
+        """
+        window_match: re.Match | None = re.match(r'^(\d{1,3})d?$', window.strip().lower())
+        days: int = int(window_match.group(1)) if window_match else 0
+        if not 1 <= days <= MAX_MOVERS_WINDOW:
+            await ctx.respond(
+                f':warning: The window must be a number of days between 1 and {MAX_MOVERS_WINDOW}, like `7d`.',
                 ephemeral=True
             )
             return None
 
-        leaderboard_list: list[dict] = get_data_organization_leaderboard(platform)
-        logger.debug(f'Leaderboard {platform=} {leaderboard_list=}')
+        logger.debug(f'Movers {platform=} {days=}')
 
-        pagination_view = PaginationView(leaderboard_list, platform, ctx.author, organization_name)
-        await pagination_view.respond(ctx)
+        pagination_view = PaginationView(organization_name)
+        await pagination_view.respond(ctx, 'movers', platform, days=days, snapshot_date=movers.date)
 
     @bot.slash_command(
         name='help',
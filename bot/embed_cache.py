@@ -0,0 +1,126 @@
+import logging
+import math
+from collections import OrderedDict
+from datetime import date, datetime
+
+import discord
+
+from bot.embed_creation import create_leaderboard_page_embed
+
+logger = logging.getLogger(__name__)
+
+EMBED_PAGE_CACHE_MAX_PAGES: int = 256
+LEADERBOARD_PAGE_SIZE: int = 10
+
+
+class EmbedPageCache:
+    """
+    LRU cache of the rendered leaderboard pages, keyed by (platform, date, snapshot version, page).
+    Pages are stored without the footer naming the author of the command, which is added to a copy when served.
+    The snapshot version is only bumped by the update cycle, so the writes of /profile between two cycles
+    don't drop the prebuilt pages. The pages of the previous versions are evicted as they age.
+    """
+
+    def __init__(self, max_pages: int):
+        self.max_pages: int = max_pages
+        self.version: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._pages: OrderedDict[tuple, discord.Embed] = OrderedDict()
+
+    def get(self, key: tuple) -> discord.Embed | None:
+        """
+        Get a rendered page, the returned embed is shared and must be copied before being modified
+        :param key: tuple, (platform, date, snapshot version, page)
+        :return: discord.Embed | None, rendered page or None if not cached
+        """
+        page: discord.Embed | None = self._pages.get(key)
+        if page is None:
+            self.misses += 1
+            return None
+        self._pages.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def set(self, key: tuple, page: discord.Embed) -> None:
+        """
+        Store a rendered page, evicting the least recently used ones to stay within bounds
+        :param key: tuple, (platform, date, snapshot version, page)
+        :param page: discord.Embed, rendered page
+        :return: None
+        """
+        self._pages[key] = page
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def new_snapshot(self) -> int:
+        """
+        Start a new snapshot version, once the update cycle stored new leaderboards
+        :return: int, new snapshot version
+        """
+        self.version += 1
+        return self.version
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache
+        :return: dict, {'hits': int, 'misses': int, 'pages': int}
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'pages': len(self._pages)}
+
+
+embed_page_cache: EmbedPageCache = EmbedPageCache(EMBED_PAGE_CACHE_MAX_PAGES)
+
+
+def get_leaderboard_page(
+        leaderboard_list: list[dict],
+        platform: str,
+        page: int,
+        organization_name: str,
+        leaderboard_date: date = None,
+        sep: int = LEADERBOARD_PAGE_SIZE,
+        snapshot_date: date = None
+) -> discord.Embed:
+    """
+    Get a page of a leaderboard, rendered once per date and snapshot version
+    :param leaderboard_list: list[dict], whole leaderboard
+    :param platform: str, platform of the leaderboard
+    :param page: int, page number, starting at 1
+    :param organization_name: str, organization name
+    :param leaderboard_date: date, date of a past leaderboard, None for the current one
+    :param sep: int, number of users per page
+    :param snapshot_date: date, date of the data of the leaderboard, the displayed date or today by default
+    :return: discord.Embed, shared rendered page, to be copied before being modified
+    """
+    key: tuple = (
+        platform, snapshot_date or leaderboard_date or datetime.now().date(), embed_page_cache.version, page
+    )
+    page_embed: discord.Embed | None = embed_page_cache.get(key)
+    if page_embed is None:
+        page_embed = create_leaderboard_page_embed(
+            leaderboard_list[(page - 1) * sep:page * sep], platform, organization_name, leaderboard_date
+        )
+        embed_page_cache.set(key, page_embed)
+    return page_embed
+
+
+def prebuild_leaderboard_pages(
+        leaderboard_list: list[dict],
+        platform: str,
+        organization_name: str,
+        sep: int = LEADERBOARD_PAGE_SIZE
+) -> int:
+    """
+    Render every page of a new leaderboard snapshot, so browsing it only costs the message edits
+    :param leaderboard_list: list[dict], whole leaderboard
+    :param platform: str, platform of the leaderboard
+    :param organization_name: str, organization name
+    :param sep: int, number of users per page
+    :return: int, number of pages rendered
+    """
+    pages: int = max(math.ceil(len(leaderboard_list) / sep), 1)
+    for page in range(1, pages + 1):
+        get_leaderboard_page(leaderboard_list, platform, page, organization_name, sep=sep)
+    logger.debug(f'{pages} {platform} leaderboard pages prebuilt: {embed_page_cache.stats()}')
+    return pages
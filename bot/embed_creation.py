@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 
 import discord
 
+from database.crud_data import FETCH_STATUS_OK
 from database.models import DailyUserData, User
 
 
@@ -44,7 +45,13 @@ help_fields: list[dict] = [
     },
     {
         'name': 'Display the leaderboard of the given platform',
-        'value': '`/leaderboard <platform>(htb|rm|thm)[required]`',
+        'value': '`/leaderboard <platform>(htb|rm|thm|overall)[required] <date>[opt] <days_ago>[opt]`\n'
+                 '• overall: sum of your percentiles inside the organization on each platform, out of 300\n'
+                 '• date (DD/MM/YYYY) or days_ago: display the leaderboard as it was on this day\n\u200b',
+    },
+    {
+        'name': 'Display the members who progressed the most on the given platform over the last days',
+        'value': '`/movers <platform>(htb|rm|thm)[required] <window>(1d|7d|30d|<days>d)[opt]`',
     }
 ]
 
@@ -76,6 +83,16 @@ platforms: dict[str, PlatformInfo] = {
     )
 }
 
+# Not a platform of its own: the overall leaderboard combines the others, so it's kept out of platforms
+overall_info: PlatformInfo = PlatformInfo(
+    name='Overall',
+    short_name='overall',
+    logo='',
+    color=0xf1c40f,
+    profile='',
+    emoji_name='',
+)
+
 
 def create_help_embed(author: discord.Member, organization_name: str) -> discord.Embed:
     """
@@ -141,12 +158,33 @@ def build_user_stats(user: dict, platform_info: PlatformInfo) -> str:
     return stats
 
 
+def build_overall_stats(user: dict) -> str:
+    """
+    Build and return the overall stats string for a user.
+    :param user: dict, user data from the overall leaderboard list
+    :return: str, formatted stats string
+    """
+    percentiles: str = ' - '.join(
+        f'{platform.upper()}: `{percentile}`' for platform, percentile in user['platform_percentiles'].items()
+    )
+    stats = f'Score: `{user["platform_score"]}` ({percentiles}) '
+
+    score_evolution = user['score_evolution']
+    if score_evolution > 0:
+        stats += f'[+{score_evolution} :crossed_swords:]'
+    elif score_evolution < 0:
+        stats += f'[-{abs(score_evolution)} :shield:]'
+
+    return stats
+
+
 def build_platform_info(
         db_user: User,
         db_data: DailyUserData,
         db_rank: dict,
         platform: PlatformInfo,
-        org_name: str
+        org_name: str,
+        stale: bool = False
 ) -> str:
     """
     Build and return the platform info string for a user.
@@ -155,6 +193,8 @@ def build_platform_info(
     :param db_rank: dict, rank of the user
     :param platform: PlatformInfo, information about the platform
     :param org_name: str, organization name
+    :param stale: bool, whether the data is the last stored one because the platform couldn't be fetched,
+    also shown when the stored fetch status of the platform isn't ok
     :return: str, formatted platform info string
     """
     platform_s = platform.short_name
@@ -167,34 +207,42 @@ def build_platform_info(
         user_link = f'{platform.profile}{user_n}'
         if platform.name == 'RootMe' and user_n.startswith('?'):
             user_link = f'https://www.root-me.org/?page=recherche&lang=en&recherche={user_n[1:]}'
+        fetched_at: datetime | None = getattr(db_data, f'{platform_s}_fetched_at', None)
+        fetch_status: str | None = getattr(db_data, f'{platform_s}_fetch_status', None)
+        stale_notice = ''
+        if stale or fetch_status not in (None, FETCH_STATUS_OK):
+            stale_notice = ':hourglass: Last stored data, platform unreachable'
+            stale_notice += f' (fetched <t:{int(fetched_at.timestamp())}:R>)\n' if fetched_at else '\n'
         return ('-----------------\n'
                 f'{org_name} rank: `#{platform_rank if platform_rank else "..."}`\n\n'
                 f'Rank: `#{rank if rank else "..."}`\n'
-                f'{"Rooms" if platform_s == "thm" else "Score"}: `{score if score else "..."}`\n\n'
+                f'{"Rooms" if platform_s == "thm" else "Score"}: `{score if score else "..."}`\n'
+                f'{stale_notice}\n'
                 f'ID: [{user_id}]({user_link})\n'
                 '-----------------')
     return ''
 
 
-def create_leaderboard_embed(
+def create_leaderboard_page_embed(
         leaderboard_list: list[dict],
         platform: str,
-        author: discord.Member,
-        organization_name: str
+        organization_name: str,
+        leaderboard_date: date = None
 ) -> discord.Embed:
     """
-    Create the leaderboard embed
+    Create a page of the leaderboard embed, without the parts depending on the author of the command
     :param leaderboard_list: list[dict], list of users to display
     :param platform: str, platform to display the leaderboard of
-    :param author: discord.Member, author of the command
     :param organization_name: str, organization name
-    :return: discord.Embed, leaderboard embed
+    :param leaderboard_date: date, date of a past leaderboard, None for the current one
+    :return: discord.Embed, leaderboard page embed
     """
 
-    platform_info: PlatformInfo = platforms[platform]
+    platform_info: PlatformInfo = platforms.get(platform, overall_info)
+    snapshot: str = f'snapshot as of {leaderboard_date.strftime("%d/%m/%Y")}' if leaderboard_date else 'snapshot'
     leaderboard_embed = discord.Embed(
         title=f'{organization_name} {platform_info.name} leaderboard',
-        description=('Here\'s a snapshot of hacking accomplishments across various platforms. '
+        description=(f'Here\'s a {snapshot} of hacking accomplishments across various platforms. '
                      'Use `/leaderboard` to explore more leaderboards. 🔍\n\u200b'),
         colour=platform_info.color
     )
@@ -203,16 +251,68 @@ def create_leaderboard_embed(
         if user['platform_score'] == 0:
             continue
         username: str = f'{get_ranking_emoji(user["platform_rank"])} {user["username"]}'
-        stats: str = build_user_stats(user, platform_info)
+        stats: str = build_overall_stats(user) if platform == 'overall' else build_user_stats(user, platform_info)
         leaderboard_embed.add_field(name=username, value=stats, inline=False)
 
-    leaderboard_embed.set_thumbnail(url=platform_info.logo)
-    leaderboard_embed.timestamp = datetime.utcnow()
-    leaderboard_embed.set_footer(
+    if platform_info.logo:
+        leaderboard_embed.set_thumbnail(url=platform_info.logo)
+    return leaderboard_embed
+
+
+def add_requested_by_footer(embed: discord.Embed, author: discord.Member) -> discord.Embed:
+    """
+    Add the timestamp and the footer naming the author of the command to an embed
+    :param embed: discord.Embed, embed to complete
+    :param author: discord.Member, author of the command
+    :return: discord.Embed, completed embed
+    """
+    embed.timestamp = datetime.utcnow()
+    embed.set_footer(
         text=f'Requested by {author.display_name}',
         icon_url=author.avatar if author.avatar else None
     )
-    return leaderboard_embed
+    return embed
+
+
+def create_movers_embed(
+        movers_list: list[dict],
+        platform: str,
+        days: int,
+        author: discord.Member,
+        organization_name: str
+) -> discord.Embed:
+    """
+    Create the movers embed
+    :param movers_list: list[dict], list of users to display
+    :param platform: str, platform to display the movers of
+    :param days: int, size of the window in days
+    :param author: discord.Member, author of the command
+    :param organization_name: str, organization name
+    :return: discord.Embed, movers embed
+    """
+    platform_info: PlatformInfo = platforms[platform]
+    score_display = 'Score' if platform_info.name in ['HackTheBox', 'RootMe'] else 'Rooms'
+    movers_embed = discord.Embed(
+        title=f'{organization_name} {platform_info.name} movers',
+        description=(f'Here are the members who progressed the most over the last '
+                     f'{days} day{"s" if days > 1 else ""}. Use `/movers` to explore other windows. 🔍\n\u200b'),
+        colour=platform_info.color
+    )
+
+    if not movers_list:
+        movers_embed.description += 'Nobody progressed over this window... yet! :crossed_swords:'
+    for user in movers_list:
+        username: str = f'{get_ranking_emoji(user["platform_rank"])} {user["username"]}'
+        stats: str = f'[+{user["score_evolution"]} :crossed_swords:] - {score_display}: `{user["platform_score"]}`'
+        movers_embed.add_field(name=username, value=stats, inline=False)
+
+    movers_embed.set_thumbnail(url=platform_info.logo)
+    movers_embed.timestamp = datetime.utcnow()
+    movers_embed.set_footer(
+        text=f'Requested by {author.display_name}',
+        icon_url=author.avatar if author.avatar else None
+    )
+    return movers_embed
 
 
 def create_profile_embed(
@@ -222,7 +322,8 @@ def create_profile_embed(
         author: discord.Member,
         member: discord.Member,
         guild_emojis: dict,
-        organization_name: str
+        organization_name: str,
+        stale_platforms: list[str] = None
 ) -> discord.Embed:
     """
     Create the profile embed
@@ -233,6 +334,7 @@ def create_profile_embed(
     :param member: discord.Member, user to display
     :param guild_emojis: dict, guild emojis
     :param organization_name: str, organization name
+    :param stale_platforms: list[str], platforms displayed from their last stored data
     :return:
     """
     profile_embed = discord.Embed(
@@ -247,7 +349,8 @@ def create_profile_embed(
             db_data,
             db_rank,
             platform,
-            organization_name
+            organization_name,
+            platform.short_name in (stale_platforms or [])
         )
         if platform_info:
             profile_embed.add_field(
@@ -1,57 +1,165 @@
+import logging
 import math
+from datetime import date, datetime
+from typing import Callable
 
 import discord
 
-from bot.embed_creation import create_leaderboard_embed
+from bot.embed_cache import get_leaderboard_page, LEADERBOARD_PAGE_SIZE
+from bot.embed_creation import add_requested_by_footer, create_movers_embed
+from database.aio import (get_data_organization_leaderboard, get_pagination_message, save_pagination_message,
+                          set_pagination_page)
+from database.models import PaginationMessage
+from utils.statistics import movers, overall_leaderboard
+
+logger = logging.getLogger(__name__)
+
+
+async def get_board(
+        board: str,
+        platform: str,
+        snapshot_date: date = None,
+        days: int = None
+) -> list[dict]:
+    """
+    Get the entries of a leaderboard or of the movers, from the in-memory caches when possible
+    :param board: str, leaderboard or movers
+    :param platform: str, platform of the board
+    :param snapshot_date: date, date of the leaderboard or last day of the movers window, the latest one if None
+    :param days: int, size of the movers window in days
+    :return: list[dict], entries of the board
+    """
+    if board == 'movers':
+        return movers.get(platform, days, snapshot_date)
+    if platform == 'overall':
+        return overall_leaderboard.get(snapshot_date)
+    return await get_data_organization_leaderboard(platform, snapshot_date or datetime.now().date())
 
 
 class PaginationView(discord.ui.View):
+    """
+    Persistent pagination buttons of the leaderboard and movers messages.
+    A single instance registered at startup handles the buttons of every message: the page displayed by each message
+    is stored in the database and the entries are read again from the caches, so no board is kept per message.
+    """
 
-    def __init__(
-            self,
-            leaderboard_list: list[dict],
-            platform: str,
-            author: discord.Member,
-            organization_name: str,
-            sep: int = 10,
-            current_page: int = 1,
-    ):
+    def __init__(self, organization_name: str, sep: int = LEADERBOARD_PAGE_SIZE):
         super().__init__(timeout=None)
-        self.leaderboard_list: list[dict] = leaderboard_list
-        self.platform: str = platform
-        self.author: discord.Member = author
         self.organization_name: str = organization_name
         self.sep: int = sep
-        self.current_page: int = current_page
-        self.message = None
 
-    async def respond(self, ctx):
-        await ctx.defer()
-        self.update_buttons()
-        self.message = await ctx.respond(
-            embed=create_leaderboard_embed(
-                self.get_current_page_data(),
-                self.platform,
-                self.author,
+    def get_last_page(self, board_list: list[dict]) -> int:
+        return max(math.ceil(len(board_list) / self.sep), 1)
+
+    def build_embed(
+            self,
+            state: PaginationMessage,
+            board_list: list[dict],
+            author: discord.Member
+    ) -> discord.Embed:
+        if state.board == 'movers':
+            return create_movers_embed(
+                board_list[(state.page - 1) * self.sep:state.page * self.sep],
+                state.platform,
+                state.days,
+                author,
                 self.organization_name
-            ),
-            view=self
+            )
+        page_embed: discord.Embed = get_leaderboard_page(
+            board_list,
+            state.platform,
+            state.page,
+            self.organization_name,
+            state.board_date,
+            self.sep,
+            state.snapshot_date
         )
+        return add_requested_by_footer(page_embed.copy(), author)
 
-    async def update_message(self, leaderboard_list: list[dict]):
-        self.update_buttons()
-        await self.message.edit(
-            embed=create_leaderboard_embed(
-                leaderboard_list,
-                self.platform,
-                self.author,
-                self.organization_name
-            ),
-            view=self
+    def render_buttons(self, current_page: int, last_page: int) -> 'PaginationView':
+        """
+        Build the buttons of a message, stopped so that discord doesn't keep a view per message
+        The interactions are dispatched to the persistent view registered at startup through the custom IDs.
+        :param current_page: int, page displayed
+        :param last_page: int, number of pages
+        :return: PaginationView, view to send with the message
+        """
+        view: PaginationView = PaginationView(self.organization_name, self.sep)
+        view.update_buttons(current_page, last_page)
+        view.stop()
+        return view
+
+    async def respond(
+            self,
+            ctx,
+            board: str,
+            platform: str,
+            board_date: date = None,
+            days: int = None,
+            snapshot_date: date = None
+    ) -> None:
+        """
+        Send the first page of a board and store the state of the message
+        The snapshot date is stored with it, so the other pages are read from the same data.
+        :param ctx: ApplicationContext, context of the command
+        :param board: str, leaderboard or movers
+        :param platform: str, platform of the board
+        :param board_date: date, date of a past leaderboard, None for the current one
+        :param days: int, size of the movers window in days
+        :param snapshot_date: date, date of the leaderboard or last day of the movers window
+        :return: None
+        """
+        await ctx.defer()
+        state: PaginationMessage = PaginationMessage(
+            board=board, platform=platform, board_date=board_date, snapshot_date=snapshot_date, days=days, page=1,
+            author_id=ctx.author.id
+        )
+        board_list: list[dict] = await get_board(board, platform, snapshot_date, days)
+        message = await ctx.respond(
+            embed=self.build_embed(state, board_list, ctx.author),
+            view=self.render_buttons(1, self.get_last_page(board_list))
         )
+        await save_pagination_message({
+            'message_id': message.id,
+            'board': board,
+            'platform': platform,
+            'board_date': board_date,
+            'snapshot_date': snapshot_date,
+            'days': days,
+            'page': 1,
+            'author_id': ctx.author.id,
+        })
 
-    def update_buttons(self):
-        if self.current_page == 1:
+    async def turn_page(self, interaction: discord.Interaction, get_page: Callable[[int, int], int]) -> None:
+        """
+        Display another page of a paginated message
+        :param interaction: discord.Interaction, interaction of the clicked button
+        :param get_page: Callable[[int, int], int], page to display from the current page and the number of pages
+        :return: None
+        """
+        await interaction.response.defer()
+        state: PaginationMessage | None = await get_pagination_message(interaction.message.id)
+        if state is None:
+            logger.debug(f'Paginated message {interaction.message.id} expired')
+            await interaction.edit_original_response(view=None)
+            await interaction.followup.send(
+                ':hourglass: This board has expired, run the command again to browse it.',
+                ephemeral=True
+            )
+            return None
+
+        board_list: list[dict] = await get_board(state.board, state.platform, state.snapshot_date, state.days)
+        last_page: int = self.get_last_page(board_list)
+        state.page = min(max(get_page(state.page, last_page), 1), last_page)
+        author: discord.Member = interaction.guild.get_member(state.author_id) or interaction.user
+        await interaction.edit_original_response(
+            embed=self.build_embed(state, board_list, author),
+            view=self.render_buttons(state.page, last_page)
+        )
+        await set_pagination_page(state.message_id, state.page)
+
+    def update_buttons(self, current_page: int, last_page: int):
+        if current_page == 1:
             self.first_page_button.disabled = True
             self.prev_button.disabled = True
             self.first_page_button.style = discord.ButtonStyle.gray
@@ -62,7 +170,7 @@ class PaginationView(discord.ui.View):
             self.first_page_button.style = discord.ButtonStyle.green
             self.prev_button.style = discord.ButtonStyle.primary
 
-        if self.current_page == int(len(self.leaderboard_list) / self.sep) + 1:
+        if current_page == last_page:
             self.next_button.disabled = True
             self.last_page_button.disabled = True
             self.last_page_button.style = discord.ButtonStyle.gray
@@ -73,31 +181,18 @@ class PaginationView(discord.ui.View):
             self.last_page_button.style = discord.ButtonStyle.green
             self.next_button.style = discord.ButtonStyle.primary
 
-    def get_current_page_data(self):
-        from_item = (self.current_page - 1) * self.sep
-        until_item = from_item + self.sep
-        return self.leaderboard_list[from_item:until_item]
-
-    @discord.ui.button(label="|<", style=discord.ButtonStyle.green)
+    @discord.ui.button(label="|<", style=discord.ButtonStyle.green, custom_id='pagination:first')
     async def first_page_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.current_page = 1
-        await interaction.response.defer(ephemeral=True)
-        await self.update_message(self.get_current_page_data())
+        await self.turn_page(interaction, lambda current_page, last_page: 1)
 
-    @discord.ui.button(label="<", style=discord.ButtonStyle.primary)
+    @discord.ui.button(label="<", style=discord.ButtonStyle.primary, custom_id='pagination:previous')
     async def prev_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.current_page -= 1
-        await interaction.response.defer(ephemeral=True)
-        await self.update_message(self.get_current_page_data())
+        await self.turn_page(interaction, lambda current_page, last_page: current_page - 1)
 
-    @discord.ui.button(label=">", style=discord.ButtonStyle.primary)
+    @discord.ui.button(label=">", style=discord.ButtonStyle.primary, custom_id='pagination:next')
     async def next_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.current_page += 1
-        await interaction.response.defer(ephemeral=True)
-        await self.update_message(self.get_current_page_data())
+        await self.turn_page(interaction, lambda current_page, last_page: current_page + 1)
 
-    @discord.ui.button(label=">|", style=discord.ButtonStyle.green)
+    @discord.ui.button(label=">|", style=discord.ButtonStyle.green, custom_id='pagination:last')
     async def last_page_button(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.current_page = math.ceil(len(self.leaderboard_list) / self.sep)
-        await interaction.response.defer(ephemeral=True)
-        await self.update_message(self.get_current_page_data())
+        await self.turn_page(interaction, lambda current_page, last_page: last_page)
@@ -0,0 +1,73 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from typing import Any, Awaitable, Callable
+
+from database import crud_data, crud_pagination, crud_user, retention, score_matrix
+
+# A single worker serializes the SQLite accesses and keeps them off the event loop
+_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+
+
+async def run_in_database(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a synchronous database function in the database thread and wait for its result
+    :param func: Callable, synchronous function to run
+    :param args: positional arguments of the function
+    :param kwargs: keyword arguments of the function
+    :return: Any, result of the function
+    """
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def _awaitable(func: Callable) -> Callable[..., Awaitable]:
+    """
+    Build the awaitable version of a synchronous database function, run in the database thread
+    :param func: Callable, synchronous function to wrap
+    :return: Callable[..., Awaitable], coroutine function with the same signature
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs) -> Any:
+        return await run_in_database(func, *args, **kwargs)
+    return wrapper
+
+
+# Users
+insert_user = _awaitable(crud_user.insert_user)
+get_user = _awaitable(crud_user.get_user)
+get_active_users = _awaitable(crud_user.get_active_users)
+get_deactivated_users = _awaitable(crud_user.get_deactivated_users)
+update_user = _awaitable(crud_user.update_user)
+deactivate_user = _awaitable(crud_user.deactivate_user)
+activate_user = _awaitable(crud_user.activate_user)
+delete_user = _awaitable(crud_user.delete_user)
+get_users_with_birthday_today = _awaitable(crud_user.get_users_with_birthday_today)
+
+# Daily data
+get_data = _awaitable(crud_data.get_data)
+get_snapshot_date = _awaitable(crud_data.get_snapshot_date)
+get_data_organization_leaderboard = _awaitable(crud_data.get_data_organization_leaderboard)
+get_organization_rank = _awaitable(crud_data.get_organization_rank)
+compute_organization_rank = _awaitable(crud_data.compute_organization_rank)
+get_current_organization_rank = _awaitable(crud_data.get_current_organization_rank)
+update_organization_ranks = _awaitable(crud_data.update_organization_ranks)
+update_data = _awaitable(crud_data.update_data)
+get_discord_ids_with_data = _awaitable(crud_data.get_discord_ids_with_data)
+upsert_data = _awaitable(crud_data.upsert_data)
+preview_data = _awaitable(crud_data.preview_data)
+get_profile_data = _awaitable(crud_data.get_profile_data)
+flush_daily_data_buffer = _awaitable(crud_data.daily_data_buffer.flush)
+
+# History retention
+apply_retention = _awaitable(retention.apply_retention)
+get_score_on_date = _awaitable(retention.get_score_on_date)
+get_score_evolution = _awaitable(retention.get_score_evolution)
+
+# Score matrices
+load_score_matrices = _awaitable(score_matrix.score_matrices.load)
+refresh_score_matrices = _awaitable(score_matrix.score_matrices.refresh)
+
+# Paginated messages
+save_pagination_message = _awaitable(crud_pagination.save_pagination_message)
+get_pagination_message = _awaitable(crud_pagination.get_pagination_message)
+set_pagination_page = _awaitable(crud_pagination.set_pagination_page)
@@ -0,0 +1,149 @@
+import logging
+import logging.config
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from database import crud_data
+from database.cache import leaderboard_cache
+from database.manager import DatabaseManager, MIGRATIONS
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_USERS: int = 300
+BENCHMARK_DAYS: int = 3 * 365
+BENCHMARK_RUNS: int = 5
+INDEXES: tuple[str, ...] = (
+    'ix_daily_user_data_discord_id_date',
+    'ix_daily_user_data_date_htb_score',
+    'ix_daily_user_data_date_rm_score',
+    'ix_daily_user_data_date_thm_rooms',
+)
+EXPLAINED_QUERIES: dict[str, str] = {
+    'rank count': 'SELECT count(*) FROM daily_user_data WHERE date = :date AND htb_score > 5000',
+    'first positive score': (
+        'SELECT date FROM daily_user_data WHERE discord_id = 42 AND htb_score > 0 ORDER BY date LIMIT 1'
+    ),
+}
+
+
+def _seed(connection: sqlite3.Connection, today: datetime.date) -> int:
+    """
+    Helper function to fill the database with BENCHMARK_USERS users having BENCHMARK_DAYS days of growing scores
+    :param connection: sqlite3.Connection, connection to the benchmark database
+    :param today: datetime.date, last day of the history
+    :return: int, number of daily rows inserted
+    """
+    random.seed(0)
+    connection.executemany(
+        'INSERT INTO users (discord_id, username, active, htb_id, rm_id, rm_name, thm_id) VALUES (?, ?, 1, ?, ?, ?, ?)',
+        [(user, f'user{user}', user, user, f'name{user}', f'thm{user}') for user in range(BENCHMARK_USERS)]
+    )
+    rows: list[tuple] = []
+    for user in range(BENCHMARK_USERS):
+        htb_score, rm_score, thm_rooms = 0, 0, 0
+        for days_ago in range(BENCHMARK_DAYS, -1, -1):
+            htb_score += random.randint(0, 20)
+            rm_score += random.randint(0, 10)
+            thm_rooms += random.randint(0, 1)
+            rows.append((
+                (today - timedelta(days=days_ago)).isoformat(), user, 1000, htb_score, 2000, rm_score, 3000, thm_rooms
+            ))
+    connection.executemany(
+        'INSERT INTO daily_user_data (date, discord_id, htb_rank, htb_score, rm_rank, rm_score, thm_rank, thm_rooms)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    connection.commit()
+    return len(rows)
+
+
+def _measure(connection: sqlite3.Connection, today: datetime.date) -> dict[str, float]:
+    """
+    Helper function to time the queries of the bot depending on the daily_user_data indexes
+    :param connection: sqlite3.Connection, connection to the benchmark database
+    :param today: datetime.date, date of the leaderboard and the ranks
+    :return: dict[str, float], mean duration of each query in milliseconds
+    """
+    yesterday: datetime.date = today - timedelta(days=1)
+    queries: dict[str, Callable] = {
+        'leaderboard htb': lambda: (
+            leaderboard_cache.invalidate(), crud_data.get_data_organization_leaderboard('htb', today)
+        ),
+        'live org rank': lambda: crud_data.get_organization_rank(42, yesterday),
+        'rank refresh': lambda: crud_data.update_organization_ranks(today),
+        'user history': lambda: connection.execute(
+            'SELECT date, htb_score FROM daily_user_data WHERE discord_id = 42 ORDER BY date'
+        ).fetchall(),
+    }
+    durations: dict[str, float] = {}
+    for name, query in queries.items():
+        start: float = time.perf_counter()
+        for _ in range(BENCHMARK_RUNS):
+            query()
+        durations[name] = (time.perf_counter() - start) / BENCHMARK_RUNS * 1000
+    return durations
+
+
+def _explain(connection: sqlite3.Connection, today: datetime.date) -> dict[str, list[str]]:
+    """
+    Helper function to get the query plans of the queries relying on the daily_user_data indexes
+    :param connection: sqlite3.Connection, connection to the benchmark database
+    :param today: datetime.date, date of the queries
+    :return: dict[str, list[str]], steps of the plan of each query
+    """
+    return {
+        name: [row[3] for row in connection.execute(f'EXPLAIN QUERY PLAN {query}', {'date': today.isoformat()})]
+        for name, query in EXPLAINED_QUERIES.items()
+    }
+
+
+def run_benchmark(database_path: str) -> dict[str, dict]:
+    """
+    Benchmark the migrations on a synthetic history, before and after they are applied
+    The indexes of migration 1 are dropped after the tables are created to measure the database as it was before.
+    :param database_path: str, path of the benchmark database, must not exist
+    :return: dict[str, dict], durations and query plans before and after the migrations
+    """
+    if os.path.exists(database_path):
+        raise ValueError(f'{database_path} already exists, the benchmark needs a new database.')
+    today: datetime.date = datetime.now().date()
+    DatabaseManager(database_path).create_database()
+    connection: sqlite3.Connection = sqlite3.connect(database_path)
+    for index in INDEXES:
+        connection.execute(f'DROP INDEX {index}')
+    connection.execute('PRAGMA user_version = 0')
+    logger.info(f'Benchmark database seeded with {_seed(connection, today)} daily rows')
+
+    results: dict[str, dict] = {}
+    results['before'] = {'durations': _measure(connection, today), 'plans': _explain(connection, today)}
+    connection.close()
+    DatabaseManager.migrate()
+    logger.info(f'Migrations applied up to version {MIGRATIONS[-1][0]}')
+    # A new connection loads the statistics gathered by the migrations
+    connection = sqlite3.connect(database_path)
+    results['after'] = {'durations': _measure(connection, today), 'plans': _explain(connection, today)}
+    connection.close()
+    return results
+
+
+if __name__ == '__main__':
+    logging.config.fileConfig(fname='logging.conf', disable_existing_loggers=True)
+    benchmark_path: str = (
+        sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    )
+    benchmark: dict[str, dict] = run_benchmark(benchmark_path)
+    print(f'Benchmark on {BENCHMARK_USERS} users x {BENCHMARK_DAYS} days, mean of {BENCHMARK_RUNS} runs:')
+    for query_name in benchmark['before']['durations']:
+        print(
+            f'- {query_name}: {benchmark["before"]["durations"][query_name]:.1f}ms'
+            f' -> {benchmark["after"]["durations"][query_name]:.1f}ms'
+        )
+    print('Query plans:')
+    for query_name in EXPLAINED_QUERIES:
+        print(f'- {query_name}: {benchmark["before"]["plans"][query_name]} -> {benchmark["after"]["plans"][query_name]}')
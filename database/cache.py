@@ -0,0 +1,148 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from database.models import DailyUserData, User, DAILY_USER_DATA_TABLE, USERS_TABLE
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_CACHE_MAX_SNAPSHOTS: int = 16
+LEADERBOARD_CACHE_MAX_ROWS: int = 10_000
+LEADERBOARD_TABLES: set[str] = {DAILY_USER_DATA_TABLE, USERS_TABLE}
+STALE_FLAG: str = 'leaderboard_stale'
+
+
+class LeaderboardCache:
+    """
+    In-memory LRU cache of the organization leaderboards, keyed by (platform, date).
+    Memory is bounded by a number of snapshots and by a total number of rows,
+    the whole cache is invalidated when a commit touches the users or their daily data.
+    """
+
+    def __init__(self, max_snapshots: int, max_rows: int):
+        self.max_snapshots: int = max_snapshots
+        self.max_rows: int = max_rows
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self.version: int = 0
+        self._rows: int = 0
+        self._snapshots: OrderedDict[tuple[str, date], list[dict]] = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, platform: str, leaderboard_date: date) -> list[dict] | None:
+        """
+        Get a leaderboard snapshot, the returned list is shared and must not be modified
+        :param platform: str, platform of the leaderboard
+        :param leaderboard_date: date, date of the leaderboard
+        :return: list[dict] | None, leaderboard or None if not cached
+        """
+        with self._lock:
+            leaderboard: list[dict] | None = self._snapshots.get((platform, leaderboard_date))
+            if leaderboard is None:
+                self.misses += 1
+                return None
+            self._snapshots.move_to_end((platform, leaderboard_date))
+            self.hits += 1
+            return leaderboard
+
+    def set(self, platform: str, leaderboard_date: date, leaderboard: list[dict], version: int) -> None:
+        """
+        Store a leaderboard snapshot, evicting the least recently used ones to stay within bounds
+        The snapshot is dropped if the cache was invalidated since the given version was read
+        :param platform: str, platform of the leaderboard
+        :param leaderboard_date: date, date of the leaderboard
+        :param leaderboard: list[dict], leaderboard to store
+        :param version: int, cache version read before querying the leaderboard
+        :return: None
+        """
+        with self._lock:
+            if version != self.version or len(leaderboard) > self.max_rows:
+                return
+            previous: list[dict] | None = self._snapshots.pop((platform, leaderboard_date), None)
+            if previous is not None:
+                self._rows -= len(previous)
+            self._snapshots[(platform, leaderboard_date)] = leaderboard
+            self._rows += len(leaderboard)
+            while len(self._snapshots) > self.max_snapshots or self._rows > self.max_rows:
+                _, evicted = self._snapshots.popitem(last=False)
+                self._rows -= len(evicted)
+
+    def invalidate(self) -> None:
+        """
+        Drop every snapshot and bump the cache version
+        :return: None
+        """
+        with self._lock:
+            self._snapshots.clear()
+            self._rows = 0
+            self.version += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache
+        :return: dict, {'hits': int, 'misses': int, 'invalidations': int, 'snapshots': int, 'rows': int}
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'snapshots': len(self._snapshots),
+                'rows': self._rows,
+            }
+
+
+leaderboard_cache: LeaderboardCache = LeaderboardCache(LEADERBOARD_CACHE_MAX_SNAPSHOTS, LEADERBOARD_CACHE_MAX_ROWS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _flag_flushed_leaderboard_changes(session: Session, flush_context) -> None:
+    """
+    Flag the session when a flush writes users or daily data
+    :param session: Session, flushed session
+    :param flush_context: UOWTransaction, automatically passed
+    :return: None
+    """
+    if any(isinstance(obj, (User, DailyUserData)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[STALE_FLAG] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _flag_executed_leaderboard_changes(orm_execute_state: ORMExecuteState) -> None:
+    """
+    Flag the session when a bulk INSERT, UPDATE or DELETE statement targets users or daily data
+    :param orm_execute_state: ORMExecuteState, automatically passed
+    :return: None
+    """
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) in LEADERBOARD_TABLES:
+            orm_execute_state.session.info[STALE_FLAG] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session: Session) -> None:
+    """
+    Invalidate the leaderboard cache once a flagged session commits
+    :param session: Session, committed session
+    :return: None
+    """
+    if session.info.pop(STALE_FLAG, False):
+        leaderboard_cache.invalidate()
+        logger.debug(f'Leaderboard cache invalidated: {leaderboard_cache.stats()}')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session: Session) -> None:
+    """
+    Forget the flag of a rolled back session
+    :param session: Session, rolled back session
+    :return: None
+    """
+    session.info.pop(STALE_FLAG, None)
@@ -1,63 +1,184 @@
 import logging
+import threading
 from datetime import datetime, timedelta
 
-from sqlalchemy import and_
+from sqlalchemy import Date, Row, and_, case, delete, func, insert, literal, select, true, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
 
-from database.crud_user import get_user, get_active_users
+from database.cache import leaderboard_cache
 from database.manager import DatabaseManager
-from database.models import DailyUserData
+from database.models import DailyOrgRank, DailyUserData, MonthlyUserData, User, WeeklyUserData
+from database.retention import get_rolled_up_period
 
 SessionLocal = DatabaseManager.get_session_local
 logger = logging.getLogger(__name__)
 
+SCORE_KEYS: dict[str, str] = {'htb': 'htb_score', 'rm': 'rm_score', 'thm': 'thm_rooms'}
+FETCH_STATUS_OK: str = 'ok'
+FETCH_STATUS_FAILED: str = 'failed'
+FETCH_STATUS_TIMEOUT: str = 'timeout'
+FETCH_STATE_COLUMNS: tuple[str, ...] = tuple(
+    f'{platform}_{state}' for platform in SCORE_KEYS for state in ('fetched_at', 'fetch_status')
+)
+UPSERT_CHUNK_SIZE: int = 200
 
-def get_data(discord_id: int, date: datetime.date = datetime.now().date()) -> DailyUserData:
+
+def _is_change_only_storage() -> bool:
+    """
+    Helper function to check if the daily data is stored only when it changes
+    :return: bool, True in 'changes' storage mode
+    """
+    return DatabaseManager.get_storage_mode() == 'changes'
+
+
+def data_as_of(date: datetime.date) -> tuple:
+    """
+    Get the daily data of the users on a date, whatever the storage mode, to build queries on it.
+    In 'daily' mode it's the rows of the date, in 'changes' mode it's the latest row up to the date of each active user.
+    :param date: datetime.date, date of the data
+    :return: tuple, (aliased DailyUserData entity, criterion to filter it on)
+    """
+    if not _is_change_only_storage():
+        daily_data = aliased(DailyUserData)
+        return daily_data, daily_data.date == date
+
+    latest_dates = (
+        select(DailyUserData.discord_id, func.max(DailyUserData.date).label('date'))
+        .where(DailyUserData.date <= date)
+        .group_by(DailyUserData.discord_id)
+        .subquery()
+    )
+    snapshot = (
+        select(DailyUserData)
+        .join(latest_dates, and_(
+            DailyUserData.discord_id == latest_dates.c.discord_id, DailyUserData.date == latest_dates.c.date
+        ))
+        .join(User, User.discord_id == DailyUserData.discord_id)
+        .where(User.active == 1)
+        .subquery()
+    )
+    return aliased(DailyUserData, snapshot), true()
+
+
+def _get_latest_data(db, discord_id: int, date: datetime.date) -> DailyUserData:
+    """
+    Helper function to get the latest daily data of a user up to a date, read from the (discord_id, date) index
+    :param db: Session, session to query
+    :param discord_id: int, discord id of the user
+    :param date: datetime.date, latest date to consider
+    :return: DailyUserData, latest daily data of the user or None if there is none
+    """
+    return (
+        db.query(DailyUserData)
+        .filter(DailyUserData.discord_id == discord_id, DailyUserData.date <= date)
+        .order_by(DailyUserData.date.desc())
+        .first()
+    )
+
+
+def get_data(discord_id: int, date: datetime.date = None) -> DailyUserData:
     """
     Get the daily data of a user, date is set to today by default
+    In 'changes' storage mode, the latest data up to the date is returned.
     :param discord_id: int, discord id of the user
     :param date: datetime.date, date of the data to get
     :return: DailyUserData, daily data of the user
     """
+    date = date or datetime.now().date()
     with SessionLocal() as db:
-        daily_user = db.query(DailyUserData).filter_by(discord_id=discord_id, date=date).first()
+        if _is_change_only_storage():
+            daily_user = _get_latest_data(db, discord_id, date)
+        else:
+            daily_user = db.query(DailyUserData).filter_by(discord_id=discord_id, date=date).first()
     return daily_user
 
 
-def get_data_organization_leaderboard(platform: str, date: datetime.date = datetime.now().date()) -> list[dict]:
+def get_snapshot_date(date: datetime.date = None) -> datetime.date:
+    """
+    Get the date of the latest snapshot of the daily data up to the given date, today by default
+    In 'daily' mode it's the latest date with daily data, read from the (date, score) indexes.
+    In 'changes' mode every date after the first row is a snapshot.
+    A date whose daily data has been rolled up is served by the weekly or monthly aggregate holding it.
+    :param date: datetime.date, requested date
+    :return: datetime.date | None, snapshot date or None if there is no data up to the date
+    """
+    date = date or datetime.now().date()
+    rolled_up_period: tuple[type, datetime.date] | None = get_rolled_up_period(date)
+    if rolled_up_period is not None:
+        return rolled_up_period[1]
+    with SessionLocal() as db:
+        snapshot_date: datetime.date | None = db.execute(
+            select(func.max(DailyUserData.date)).where(DailyUserData.date <= date)
+        ).scalar()
+    if snapshot_date is not None and _is_change_only_storage():
+        return date
+    return snapshot_date
+
+
+def get_data_organization_leaderboard(platform: str, date: datetime.date = None) -> list[dict]:
     """
     Get the daily leaderboard of the organization members
     Date is set to today by default and users are sorted by their score on the given platform
+    Leaderboards are served from an in-memory snapshot cache, invalidated when users or daily data are committed
+    :param platform: str, platform to get the ranking from
+    :param date: datetime.date, date of the data to get
+    :return: list[dict], daily leaderboard of the organization members, shared and not to be modified
+    """
+    date = date or datetime.now().date()
+    organization_leaderboard: list[dict] | None = leaderboard_cache.get(platform, date)
+    if organization_leaderboard is not None:
+        logger.debug(f'Organization leaderboard retrieved from the cache: {leaderboard_cache.stats()}')
+        return organization_leaderboard
+
+    cache_version: int = leaderboard_cache.version
+    organization_leaderboard = _query_organization_leaderboard(platform, date)
+    leaderboard_cache.set(platform, date, organization_leaderboard, cache_version)
+    return organization_leaderboard
+
+
+def _query_organization_leaderboard(platform: str, date: datetime.date) -> list[dict]:
+    """
+    Helper function to query the daily leaderboard of the organization members.
+    Users, their daily data and their score evolution are retrieved in a single query
     :param platform: str, platform to get the ranking from
     :param date: datetime.date, date of the data to get
     :return: list[dict], daily leaderboard of the organization members
     """
     score_key = f'{platform}_score' if platform in ['htb', 'rm'] else f'{platform}_rooms'
-    with SessionLocal() as db:
-        profiles_ids: dict = {
-            user.discord_id: getattr(user, f'{platform}_id' if platform in ['htb', 'thm'] else f'{platform}_name')
-            for user in get_active_users()
-        }
-
-        discord_ids_list: list[int] = list(profiles_ids.keys())
+    id_key = f'{platform}_id' if platform in ['htb', 'thm'] else f'{platform}_name'
+    rolled_up_period: tuple[type, datetime.date] | None = get_rolled_up_period(date)
+    if rolled_up_period is not None:
+        return _query_rolled_up_leaderboard(platform, *rolled_up_period)
+    daily_data, on_date = data_as_of(date)
+    score_column = getattr(daily_data, score_key)
 
+    with SessionLocal() as db:
         organization_leaderboard_raw = (
-            db.query(DailyUserData)
-            .filter(and_(DailyUserData.date == date, DailyUserData.discord_id.in_(discord_ids_list)))
-            .order_by(getattr(DailyUserData, score_key).desc())
+            db.query(
+                User.username,
+                getattr(User, id_key).label('platform_id'),
+                score_column.label('platform_score'),
+                getattr(daily_data, f'{platform}_rank').label('platform_global_rank'),
+                _score_evolution_baseline(score_key, date, daily_data).label('baseline_score'),
+            )
+            .join(User, User.discord_id == daily_data.discord_id)
+            .filter(on_date, User.active == 1)
+            .order_by(score_column.desc())
             .all()
         )
 
         organization_leaderboard: list[dict] = [
             {
-                'username': get_user(discord_id=user.discord_id).username,
+                'username': user.username,
                 'platform_rank': index + 1,
-                'platform_score': getattr(user, score_key),
-                'platform_global_rank': getattr(user, f'{platform}_rank'),
-                'score_evolution': _calculate_score_evolution(user, score_key, date),
-                'platform_id': profiles_ids.get(user.discord_id)
+                'platform_score': user.platform_score,
+                'platform_global_rank': user.platform_global_rank,
+                'score_evolution': user.platform_score - user.baseline_score if user.baseline_score is not None else 0,
+                'platform_id': user.platform_id
             }
-            for index, user in enumerate(organization_leaderboard_raw) if getattr(user, score_key)
+            for index, user in enumerate(organization_leaderboard_raw) if user.platform_score
         ]
 
         logger.debug(f'Organization leaderboard retrieved from the database.')
@@ -67,79 +188,357 @@ def get_data_organization_leaderboard(platform: str, date: datetime.date = datet
     return organization_leaderboard
 
 
-def _calculate_score_evolution(user, score_key, date) -> int:
+def _query_rolled_up_leaderboard(platform: str, model: type, period_start: datetime.date) -> list[dict]:
+    """
+    Helper function to query the leaderboard of the organization members over a rolled-up period.
+    Scores and global ranks are the last ones of the period and the score evolution is the progress over the period.
+    In 'changes' mode the users without a score in the period, like the weeks holding only organization ranks,
+    keep their latest earlier period with a score, with no evolution.
+    :param platform: str, platform to get the ranking from
+    :param model: type, WeeklyUserData or MonthlyUserData
+    :param period_start: datetime.date, first day of the period
+    :return: list[dict], leaderboard of the organization members at the end of the period
     """
-    Helper function to calculate the score evolution for a user.
-    :param user: DailyUserData, user to calculate the score evolution from
+    score_key = f'{platform}_score' if platform in ['htb', 'rm'] else f'{platform}_rooms'
+    id_key = f'{platform}_id' if platform in ['htb', 'thm'] else f'{platform}_name'
+    score_column = getattr(model, f'{score_key}_last')
+    score_evolution = getattr(model, f'{score_key}_delta')
+    on_period = model.period_start == period_start
+    if _is_change_only_storage():
+        latest_periods = (
+            select(model.discord_id, func.max(model.period_start))
+            .where(model.period_start <= period_start, score_column.is_not(None))
+            .group_by(model.discord_id)
+        )
+        on_period = tuple_(model.discord_id, model.period_start).in_(latest_periods)
+        score_evolution = case((model.period_start == period_start, score_evolution), else_=0)
+
+    with SessionLocal() as db:
+        organization_leaderboard_raw = db.execute(
+            select(
+                User.username,
+                getattr(User, id_key).label('platform_id'),
+                score_column.label('platform_score'),
+                getattr(model, f'{platform}_rank_last').label('platform_global_rank'),
+                score_evolution.label('score_evolution'),
+            )
+            .join(User, User.discord_id == model.discord_id)
+            .where(on_period, User.active == 1)
+            .order_by(score_column.desc())
+        ).all()
+
+    organization_leaderboard: list[dict] = [
+        {
+            'username': user.username,
+            'platform_rank': index + 1,
+            'platform_score': user.platform_score,
+            'platform_global_rank': user.platform_global_rank,
+            'score_evolution': user.score_evolution or 0,
+            'platform_id': user.platform_id
+        }
+        for index, user in enumerate(organization_leaderboard_raw) if user.platform_score
+    ]
+    logger.debug(f'Organization leaderboard of the {model.__tablename__} from {period_start} retrieved.')
+    return organization_leaderboard
+
+
+def _score_evolution_baseline(score_key: str, date: datetime.date, daily_data):
+    """
+    Helper function to build the score the evolution of a user is computed from, correlated to the given daily data.
+    It's the score 30 days before the given date or, if missing or null, the first positive score of the user.
+    When the daily data has been rolled up, both are read from the weekly then monthly aggregates: the last score
+    of the period holding the date 30 days before, and the first score of the first period with a positive score,
+    or its last score if it started at 0. In 'changes' mode the old score is the one of the latest period with a score.
     :param score_key: str, attribute to get the score from
     :param date: datetime.date, date of the data to get
-    :return: int, score evolution
+    :param daily_data: AliasedClass, daily data entity the baseline is correlated to
+    :return: ColumnElement, baseline score, NULL if the user has no positive score
     """
     thirty_days_ago = date - timedelta(days=30)
-    old_data = get_data(user.discord_id, thirty_days_ago)
-    if not old_data or not getattr(old_data, score_key):
-        with SessionLocal() as db:
-            old_data = (
-                db.query(DailyUserData)
-                .filter(
-                    DailyUserData.discord_id == user.discord_id,
-                    getattr(DailyUserData, score_key) > 0
-                )
-                .order_by(DailyUserData.date)
-                .first()
+    old_data = aliased(DailyUserData)
+    first_data = aliased(DailyUserData)
+
+    old_score = select(getattr(old_data, score_key)).where(old_data.discord_id == daily_data.discord_id)
+    if _is_change_only_storage():
+        old_score = old_score.where(old_data.date <= thirty_days_ago).order_by(old_data.date.desc()).limit(1)
+    else:
+        old_score = old_score.where(old_data.date == thirty_days_ago)
+    old_scores: list = [old_score.scalar_subquery()]
+    first_positive_scores: list = []
+    old_week_start = thirty_days_ago - timedelta(days=thirty_days_ago.weekday())
+    old_periods: tuple = ((WeeklyUserData, old_week_start), (MonthlyUserData, old_week_start.replace(day=1)))
+    for model, old_period_start in old_periods:
+        last_score = getattr(model, f'{score_key}_last')
+        first_score = last_score - func.coalesce(getattr(model, f'{score_key}_delta'), 0)
+        old_period_score = select(last_score).where(model.discord_id == daily_data.discord_id)
+        if _is_change_only_storage():
+            old_period_score = (
+                old_period_score.where(model.period_start <= old_period_start, last_score.is_not(None))
+                .order_by(model.period_start.desc())
+                .limit(1)
             )
-    if old_data:
-        old_score = getattr(old_data, score_key)
-        return getattr(user, score_key) - old_score
-    return 0
+        else:
+            old_period_score = old_period_score.where(model.period_start == old_period_start)
+        old_scores.append(old_period_score.scalar_subquery())
+        first_positive_scores.insert(0, (
+            select(case((first_score > 0, first_score), else_=last_score))
+            .where(model.discord_id == daily_data.discord_id, last_score > 0)
+            .order_by(model.period_start)
+            .limit(1)
+            .scalar_subquery()
+        ))
+    first_positive_scores.append(
+        select(getattr(first_data, score_key))
+        .where(first_data.discord_id == daily_data.discord_id, getattr(first_data, score_key) > 0)
+        .order_by(first_data.date)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return func.coalesce(func.nullif(func.coalesce(*old_scores), 0), *first_positive_scores)
 
 
-def get_platform_rank(discord_id: int, date: datetime.date, score_attr: str) -> int:
+def _compute_organization_rank(discord_id: int, date: datetime.date) -> dict:
     """
-    Helper function to get the rank for a specific platform.
+    Helper function to compute the daily rank of a user on HackTheBox, RootMe and TryHackMe.
+    The three ranks are computed in a single query by counting the members with a higher score,
+    members with the same score share the same rank and users without a positive score have no rank.
     :param discord_id: int, discord id of the user
     :param date: datetime.date, date of the data to get
-    :param score_attr: str, attribute to get the score from
-    :return: int, rank of the user
+    :return: dict, daily rank of the user on HackTheBox, RootMe and TryHackMe
     """
-    with SessionLocal() as db:
-        leaderboard = (
-            db.query(DailyUserData)
-            .filter_by(date=date)
-            .filter(getattr(DailyUserData, score_attr) > 0)
-            .order_by(getattr(DailyUserData, score_attr).desc())
-            .all()
+    user_data, user_on_date = data_as_of(date)
+    ranks: list = []
+    for platform, score_key in SCORE_KEYS.items():
+        user_score = getattr(user_data, score_key)
+        other_data, others_on_date = data_as_of(date)
+        higher_scores = (
+            select(func.count())
+            .select_from(other_data)
+            .where(others_on_date, getattr(other_data, score_key) > user_score)
+            .scalar_subquery()
         )
-        logger.debug(f'Rank retrieved from the database: {leaderboard}')
-    return next((index + 1 for index, user in enumerate(leaderboard) if user.discord_id == discord_id), None)
+        ranks.append(case((user_score > 0, higher_scores + 1), else_=None).label(f'{platform}_orga_rank'))
+
+    with SessionLocal() as db:
+        organization_rank = db.query(*ranks).filter(user_data.discord_id == discord_id, user_on_date).first()
+        logger.debug(f'Rank computed from the database: {organization_rank}')
+
+    return {
+        f'{platform}_orga_rank': getattr(organization_rank, f'{platform}_orga_rank') if organization_rank else None
+        for platform in SCORE_KEYS
+    }
 
 
-def get_organization_rank(discord_id: int, date: datetime.date = datetime.now().date()) -> dict:
+def compute_organization_rank(daily_user: DailyUserData) -> dict:
+    """
+    Compute the rank inside the organization of the given daily data of a user, against the stored data of the others
+    Used for the data written or previewed since the last update cycle, whose stored ranks are outdated.
+    The others are read from the latest snapshot up to the date of the data, like before the first cycle of a day.
+    :param daily_user: DailyUserData, daily data of the user, stored or transient
+    :return: dict, daily rank of the user on HackTheBox, RootMe and TryHackMe
     """
-    Get the daily rank of a user on HackTheBox, RootMe and TryHackMe.
+    date: datetime.date = get_snapshot_date(daily_user.date) or daily_user.date or datetime.now().date()
+    higher_scores: dict = {}
+    for platform, score_key in SCORE_KEYS.items():
+        user_score: int | None = getattr(daily_user, score_key)
+        if user_score and user_score > 0:
+            other_data, others_on_date = data_as_of(date)
+            higher_scores[platform] = (
+                select(func.count())
+                .select_from(other_data)
+                .where(
+                    others_on_date,
+                    other_data.discord_id != daily_user.discord_id,
+                    getattr(other_data, score_key) > user_score
+                )
+                .scalar_subquery()
+                .label(platform)
+            )
+
+    organization_rank: dict = {f'{platform}_orga_rank': None for platform in SCORE_KEYS}
+    if higher_scores:
+        with SessionLocal() as db:
+            counts: Row = db.execute(select(*higher_scores.values())).one()
+        for platform in higher_scores:
+            organization_rank[f'{platform}_orga_rank'] = getattr(counts, platform) + 1
+    logger.debug(f'Rank computed for the data of {daily_user.discord_id}: {organization_rank}')
+    return organization_rank
+
+
+def get_organization_rank(discord_id: int, date: datetime.date = None) -> dict:
+    """
+    Get the daily rank of a user on HackTheBox, RootMe and TryHackMe, date is set to today by default
+    Ranks are read from the ones stored at the end of the update cycle, and computed if not stored yet.
+    The ranks of a rolled-up date are the last ones of the weekly or monthly period holding it.
     :param discord_id: int, discord id of the user
     :param date: datetime.date, date of the data to get
     :return: dict, daily rank of the user on HackTheBox, RootMe and TryHackMe
     """
+    date = date or datetime.now().date()
+    with SessionLocal() as db:
+        organization_rank: DailyOrgRank = db.get(DailyOrgRank, (date, discord_id))
+
+    if not organization_rank:
+        rolled_up_period: tuple[type, datetime.date] | None = get_rolled_up_period(date)
+        if rolled_up_period is not None:
+            model, period_start = rolled_up_period
+            with SessionLocal() as db:
+                aggregated_data = db.get(model, (period_start, discord_id))
+            return {
+                f'{platform}_orga_rank': getattr(aggregated_data, f'{platform}_orga_rank_last', None)
+                for platform in SCORE_KEYS
+            }
+        return _compute_organization_rank(discord_id, date)
+
+    logger.debug(f'Rank retrieved from the database: {organization_rank}')
     return {
-        'htb_orga_rank': get_platform_rank(discord_id, date, 'htb_score'),
-        'rm_orga_rank': get_platform_rank(discord_id, date, 'rm_score'),
-        'thm_orga_rank': get_platform_rank(discord_id, date, 'thm_rooms')
+        f'{platform}_orga_rank': getattr(organization_rank, f'{platform}_orga_rank') for platform in SCORE_KEYS
     }
 
 
+class OrganizationRanking:
+    """
+    State of the organization ranks stored at the end of the last update cycle.
+    The stored ranks of a user no longer match its data once it is written again, until the next ranking.
+    """
+
+    def __init__(self):
+        self.date: datetime.date | None = None
+        self._written: set[int] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+    def mark_written(self, discord_ids) -> None:
+        """
+        Record that the daily data of users was written after the last ranking
+        :param discord_ids: Iterable[int], discord ids of the users
+        :return: None
+        """
+        with self._lock:
+            self._written.update(discord_ids)
+
+    def mark_ranked(self, date: datetime.date) -> None:
+        """
+        Record that the ranks of every user were stored for a date, older dates are ignored
+        :param date: datetime.date, date of the ranking
+        :return: None
+        """
+        with self._lock:
+            if self.date is None or date >= self.date:
+                self.date = date
+                self._written.clear()
+
+    def is_ranked(self, discord_id: int) -> bool:
+        """
+        Check if the stored ranks of the last ranking still match the data of a user
+        :param discord_id: int, discord id of the user
+        :return: bool, True if the user wasn't written since the last ranking
+        """
+        with self._lock:
+            return self.date is not None and discord_id not in self._written
+
+
+organization_ranking: OrganizationRanking = OrganizationRanking()
+
+
+def get_current_organization_rank(daily_user: DailyUserData, pending: bool = False) -> dict:
+    """
+    Get the rank inside the organization of the latest data of a user, for /profile and /update
+    The ranks stored at the end of the last update cycle are read with an indexed lookup while they match the data,
+    they are computed live if the user was written or has buffered updates since, or if they aren't stored.
+    :param daily_user: DailyUserData, latest daily data of the user, stored or previewed
+    :param pending: bool, True if the data includes updates still in the write buffer
+    :return: dict, daily rank of the user on HackTheBox, RootMe and TryHackMe
+    """
+    if not pending and organization_ranking.is_ranked(daily_user.discord_id):
+        with SessionLocal() as db:
+            organization_rank: DailyOrgRank | None = db.get(
+                DailyOrgRank, (organization_ranking.date, daily_user.discord_id)
+            )
+        if organization_rank is not None:
+            logger.debug(f'Rank retrieved from the database: {organization_rank}')
+            return {
+                f'{platform}_orga_rank': getattr(organization_rank, f'{platform}_orga_rank')
+                for platform in SCORE_KEYS
+            }
+    return compute_organization_rank(daily_user)
+
+
+def update_organization_ranks(date: datetime.date = None) -> None:
+    """
+    Compute and store the daily rank of every member inside the organization, today by default
+    Ranks are computed in bulk with a RANK() window function per platform and replace the stored ones
+    :param date: datetime.date, date of the ranking
+    :return: None
+    """
+    date = date or datetime.now().date()
+    daily_data, on_date = data_as_of(date)
+    ranks: list = [
+        case(
+            (getattr(daily_data, score_key) > 0, func.rank().over(order_by=getattr(daily_data, score_key).desc())),
+            else_=None
+        )
+        for score_key in SCORE_KEYS.values()
+    ]
+    ranking = select(literal(date, Date), daily_data.discord_id, *ranks).where(on_date)
+
+    with SessionLocal() as db:
+        try:
+            db.execute(delete(DailyOrgRank).where(DailyOrgRank.date == date))
+            db.execute(
+                insert(DailyOrgRank).from_select(
+                    ['date', 'discord_id', *(f'{platform}_orga_rank' for platform in SCORE_KEYS)], ranking
+                )
+            )
+            db.commit()
+            logger.info(f'Organization ranks of {date} stored in the database.')
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+    organization_ranking.mark_ranked(date)
+
+
 def update_data(discord_id: int, daily_data: dict) -> DailyUserData:
     """
     Update the daily data of a user or create it if it doesn't exist
     It will look for the user's data of the current day
+    The buffered update of the user is written first, so that a later flush can't overwrite the new data.
+    :param discord_id: int, discord id of the user
+    :param daily_data: dict, data to update
+    :return: DailyUserData, updated daily data
+    """
+    pending: dict = daily_data_buffer.pop(discord_id)
+    try:
+        return _write_data(discord_id, {**pending, **daily_data})
+    except SQLAlchemyError:
+        if pending:
+            daily_data_buffer.add(discord_id, pending)
+        raise
+
+
+def _write_data(discord_id: int, daily_data: dict) -> DailyUserData:
+    """
+    Helper function to write today's data of a user
     :param discord_id: int, discord id of the user
     :param daily_data: dict, data to update
     :return: DailyUserData, updated daily data
     """
+    if _is_change_only_storage():
+        today = datetime.now().date()
+        upsert_data([{'date': today, 'discord_id': discord_id, **daily_data}])
+        return get_data(discord_id, today)
+
     with SessionLocal() as db:
         daily_user = db.query(DailyUserData).filter_by(discord_id=discord_id, date=datetime.now().date()).first()
         if not daily_user:
-            daily_user = DailyUserData(discord_id=discord_id, date=datetime.now().date(), **daily_data)
+            # The platforms missing from the update keep their latest values, with their fetch state
+            latest_user: DailyUserData | None = _get_latest_data(db, discord_id, datetime.now().date())
+            latest_values: dict = {
+                column: getattr(latest_user, column)
+                for column in DailyUserData.__table__.columns.keys() if column not in ('date', 'discord_id')
+            } if latest_user else {}
+            daily_user = DailyUserData(discord_id=discord_id, date=datetime.now().date(), **{
+                **latest_values, **daily_data
+            })
             db.add(daily_user)
         else:
             for key, value in daily_data.items():
@@ -147,8 +546,249 @@ def update_data(discord_id: int, daily_data: dict) -> DailyUserData:
         try:
             db.commit()
             db.refresh(daily_user)
+            organization_ranking.mark_written([discord_id])
             logger.info(f'Daily data for {discord_id} inserted successfully in the database.')
         except SQLAlchemyError:
             db.rollback()
             raise
     return daily_user
+
+
+def _get_latest_rows(db, date: datetime.date, discord_ids: set[int]) -> dict[int, Row]:
+    """
+    Helper function to get the latest daily data row of each given user up to a date
+    :param db: Session, session to query
+    :param date: datetime.date, latest date to consider
+    :param discord_ids: set[int], discord ids of the users
+    :return: dict[int, Row], latest row of each user having one
+    """
+    latest_dates = (
+        select(DailyUserData.discord_id, func.max(DailyUserData.date).label('date'))
+        .where(DailyUserData.date <= date, DailyUserData.discord_id.in_(discord_ids))
+        .group_by(DailyUserData.discord_id)
+        .subquery()
+    )
+    return {
+        latest_row.discord_id: latest_row for latest_row in db.execute(
+            select(DailyUserData.__table__).join(latest_dates, and_(
+                DailyUserData.discord_id == latest_dates.c.discord_id, DailyUserData.date == latest_dates.c.date
+            ))
+        )
+    }
+
+
+def _complete_new_rows(db, daily_data_rows: list[dict], skip_unchanged: bool) -> tuple[list[dict], int]:
+    """
+    Helper function to complete the new rows with the latest values of their user, rows of a date already stored
+    are kept as updates. The platforms missing from a row, not fetched or failed, keep their values and fetched_at.
+    In the 'changes' storage mode, the rows not changing the scores of their user are skipped, the ranks of the latest
+    row are carried forward and the fetch state is written on the latest row of the user instead.
+    :param db: Session, session of the running transaction
+    :param daily_data_rows: list[dict], rows to write
+    :param skip_unchanged: bool, True to skip the unchanged rows
+    :return: tuple[list[dict], int], rows to write and number of unchanged rows skipped
+    """
+    value_columns: list[str] = [
+        column for column in DailyUserData.__table__.columns.keys() if column not in ('date', 'discord_id')
+    ]
+    rows_by_date: dict[datetime.date, list[dict]] = {}
+    for row in daily_data_rows:
+        rows_by_date.setdefault(row['date'], []).append(row)
+
+    completed_rows: list[dict] = []
+    unchanged_rows: int = 0
+    for date, rows in rows_by_date.items():
+        latest_rows: dict[int, Row] = _get_latest_rows(db, date, {row['discord_id'] for row in rows})
+        for row in rows:
+            latest_row: Row | None = latest_rows.get(row['discord_id'])
+            if latest_row is None or latest_row.date == date:
+                completed_rows.append(row)
+                continue
+            latest_values: dict = {column: getattr(latest_row, column) for column in value_columns}
+            if not skip_unchanged or any(
+                latest_values[column] != row[column] for column in SCORE_KEYS.values() if column in row
+            ):
+                completed_rows.append({**latest_values, **row})
+                continue
+            unchanged_rows += 1
+            fetch_state: dict = {column: value for column, value in row.items() if column in FETCH_STATE_COLUMNS}
+            if fetch_state:
+                completed_rows.append({'date': latest_row.date, 'discord_id': latest_row.discord_id, **fetch_state})
+    return completed_rows, unchanged_rows
+
+
+def get_discord_ids_with_data(date: datetime.date) -> set[int]:
+    """
+    Get the users having a daily data row at the given date, read from the (date, score) indexes
+    :param date: datetime.date, date of the rows
+    :return: set[int], discord ids of the users
+    """
+    with SessionLocal() as db:
+        discord_ids: set[int] = set(
+            db.execute(select(DailyUserData.discord_id).where(DailyUserData.date == date)).scalars()
+        )
+    return discord_ids
+
+
+def get_fetch_states() -> dict[int, dict]:
+    """
+    Get the fetch state of each platform stored with the latest daily data of every user
+    :return: dict[int, dict], fetch state columns ({platform}_fetched_at, {platform}_fetch_status) of each user
+    """
+    latest_dates = (
+        select(DailyUserData.discord_id, func.max(DailyUserData.date).label('date'))
+        .group_by(DailyUserData.discord_id)
+        .subquery()
+    )
+    with SessionLocal() as db:
+        rows: list[Row] = db.execute(
+            select(DailyUserData.discord_id, *(getattr(DailyUserData, column) for column in FETCH_STATE_COLUMNS))
+            .join(latest_dates, and_(
+                DailyUserData.discord_id == latest_dates.c.discord_id, DailyUserData.date == latest_dates.c.date
+            ))
+        ).all()
+    return {row.discord_id: {column: getattr(row, column) for column in FETCH_STATE_COLUMNS} for row in rows}
+
+
+def upsert_data(daily_data_rows: list[dict]) -> int:
+    """
+    Insert or update many daily data rows in a single transaction
+    Each row must contain its date and discord_id, only the given columns are updated on existing rows.
+    New rows are completed with the latest values of their user, for the platforms they don't contain.
+    Rows are written with INSERT ... ON CONFLICT(date, discord_id) DO UPDATE, by chunks of UPSERT_CHUNK_SIZE.
+    In 'changes' storage mode, the rows that don't change the data of their user are skipped.
+    :param daily_data_rows: list[dict], rows to write
+    :return: int, number of rows upserted, skipped ones included
+    """
+    with SessionLocal() as db:
+        try:
+            changed_rows, unchanged_rows = _complete_new_rows(db, daily_data_rows, _is_change_only_storage())
+            rows_by_columns: dict[tuple, list[dict]] = {}
+            for row in changed_rows:
+                rows_by_columns.setdefault(tuple(sorted(row)), []).append(row)
+
+            for columns, rows in rows_by_columns.items():
+                updated_columns: list[str] = [column for column in columns if column not in ('date', 'discord_id')]
+                for index in range(0, len(rows), UPSERT_CHUNK_SIZE):
+                    statement = sqlite_insert(DailyUserData).values(rows[index:index + UPSERT_CHUNK_SIZE])
+                    if updated_columns:
+                        statement = statement.on_conflict_do_update(
+                            index_elements=['date', 'discord_id'],
+                            set_={column: statement.excluded[column] for column in updated_columns}
+                        )
+                    else:
+                        statement = statement.on_conflict_do_nothing(index_elements=['date', 'discord_id'])
+                    db.execute(statement)
+            db.commit()
+            organization_ranking.mark_written(row['discord_id'] for row in changed_rows)
+            logger.info(
+                f'Daily data of {len(daily_data_rows)} users upserted successfully in the database,'
+                f' {unchanged_rows} unchanged skipped.'
+            )
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+    return len(daily_data_rows)
+
+
+def preview_data(discord_id: int, daily_data: dict) -> DailyUserData:
+    """
+    Build today's daily data of a user from its latest stored data and the given update, without writing it
+    The values missing from the update, like the platforms that couldn't be fetched, keep their last stored value.
+    :param discord_id: int, discord id of the user
+    :param daily_data: dict, data to update
+    :return: DailyUserData, transient daily data
+    """
+    today = datetime.now().date()
+    with SessionLocal() as db:
+        daily_user: DailyUserData = _get_latest_data(db, discord_id, today)
+    values: dict = {
+        column: getattr(daily_user, column) for column in DailyUserData.__table__.columns.keys()
+    } if daily_user else {'discord_id': discord_id}
+    values.update(daily_data, date=today)
+    return DailyUserData(**values)
+
+
+class DailyDataWriteBuffer:
+    """
+    Write-behind buffer of daily data.
+    Updates are merged per (date, discord_id) and written in bulk with upsert_data when flushed.
+    """
+
+    def __init__(self, max_pending: int = 50):
+        self.max_pending: int = max_pending
+        self._pending: dict[tuple, dict] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, discord_id: int, daily_data: dict) -> bool:
+        """
+        Buffer an update of today's data of a user
+        :param discord_id: int, discord id of the user
+        :param daily_data: dict, data to update
+        :return: bool, True if the buffer is full and should be flushed
+        """
+        date = datetime.now().date()
+        with self._lock:
+            pending: dict = self._pending.setdefault((date, discord_id), {'date': date, 'discord_id': discord_id})
+            pending.update(daily_data)
+            return len(self._pending) >= self.max_pending
+
+    def get_pending(self, discord_id: int) -> dict:
+        """
+        Get the buffered update of today's data of a user, not written yet
+        :param discord_id: int, discord id of the user
+        :return: dict, buffered data, empty if there is none
+        """
+        with self._lock:
+            pending: dict = dict(self._pending.get((datetime.now().date(), discord_id), {}))
+        pending.pop('date', None)
+        pending.pop('discord_id', None)
+        return pending
+
+    def pop(self, discord_id: int) -> dict:
+        """
+        Remove the buffered update of today's data of a user, to write it along a direct update
+        :param discord_id: int, discord id of the user
+        :return: dict, buffered data, empty if there is none
+        """
+        with self._lock:
+            pending: dict = self._pending.pop((datetime.now().date(), discord_id), {})
+        pending.pop('date', None)
+        pending.pop('discord_id', None)
+        return pending
+
+    def flush(self) -> int:
+        """
+        Write every pending update in a single transaction, updates are kept in the buffer if the write fails
+        :return: int, number of rows written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            return upsert_data(list(pending.values()))
+        except SQLAlchemyError:
+            with self._lock:
+                for key, daily_data in self._pending.items():
+                    pending.setdefault(key, {}).update(daily_data)
+                self._pending = pending
+            raise
+
+
+daily_data_buffer: DailyDataWriteBuffer = DailyDataWriteBuffer()
+
+
+def get_profile_data(discord_id: int) -> tuple[DailyUserData, dict]:
+    """
+    Get the latest data of a user and its organization ranks, including the updates still in the write buffer
+    The ranks always match the displayed data, they are computed from the previewed scores if some are buffered.
+    :param discord_id: int, discord id of the user
+    :return: tuple[DailyUserData, dict], transient daily data and organization ranks of the user
+    """
+    pending: dict = daily_data_buffer.get_pending(discord_id)
+    daily_user: DailyUserData = preview_data(discord_id, pending)
+    return daily_user, get_current_organization_rank(daily_user, bool(pending))
@@ -0,0 +1,72 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.manager import DatabaseManager
+from database.models import PaginationMessage
+
+logger = logging.getLogger(__name__)
+SessionLocal = DatabaseManager.get_session_local
+
+PAGINATION_MESSAGES_MAX: int = 1000
+
+
+def save_pagination_message(message_data: dict) -> None:
+    """
+    Store the state of a new paginated message
+    Only the PAGINATION_MESSAGES_MAX most recently used messages are kept, the buttons of the others expire.
+    :param message_data: dict, message_id, board, platform, board_date, snapshot_date, days, page and author_id
+    of the message
+    :return: None
+    """
+    with SessionLocal() as db:
+        try:
+            db.merge(PaginationMessage(**message_data, last_used_at=datetime.now()))
+            db.flush()
+            kept_messages = (
+                select(PaginationMessage.message_id)
+                .order_by(PaginationMessage.last_used_at.desc())
+                .limit(PAGINATION_MESSAGES_MAX)
+            )
+            evicted: int = db.execute(
+                delete(PaginationMessage).where(PaginationMessage.message_id.not_in(kept_messages))
+            ).rowcount
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    if evicted:
+        logger.debug(f'{evicted} least recently used paginated messages expired.')
+
+
+def get_pagination_message(message_id: int) -> PaginationMessage | None:
+    """
+    Retrieve the state of a paginated message
+    :param message_id: int, Discord ID of the message
+    :return: PaginationMessage | None, state of the message or None if it expired
+    """
+    with SessionLocal() as db:
+        return db.get(PaginationMessage, message_id)
+
+
+def set_pagination_page(message_id: int, page: int) -> None:
+    """
+    Store the page displayed by a paginated message and mark it as recently used
+    :param message_id: int, Discord ID of the message
+    :param page: int, page displayed
+    :return: None
+    """
+    with SessionLocal() as db:
+        try:
+            db.execute(
+                update(PaginationMessage)
+                .where(PaginationMessage.message_id == message_id)
+                .values(page=page, last_used_at=datetime.now())
+            )
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
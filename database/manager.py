@@ -1,44 +1,153 @@
 import logging
+import os
+import sqlite3
+from typing import Callable
 
 import sqlalchemy
-from sqlalchemy import create_engine, exc
-from sqlalchemy.engine import reflection
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Connection, reflection
 from sqlalchemy.orm import sessionmaker
 
-from database.models import Base, User
+from database.models import Base, DailyUserData, MonthlyUserData, PaginationMessage, User, WeeklyUserData
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_STORAGE_PROFILE: dict = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -8000,
+    'mmap_size': 64 * 1024 * 1024,
+    'busy_timeout': 5000,
+}
+STORAGE_MODES: tuple[str, ...] = ('daily', 'changes')
+BACKUP_PAGES_PER_STEP: int = 256
+BACKUP_SLEEP_BETWEEN_STEPS: float = 0.01
+
+
+def _enable_incremental_vacuum(connection: Connection) -> None:
+    """
+    Switch an existing database to incremental auto-vacuum, which requires a full VACUUM once
+    :param connection: Connection, connection to the database
+    :return: None
+    """
+    if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+        connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.exec_driver_sql('VACUUM')
+
+
+def _add_missing_columns(connection: Connection, model: type) -> None:
+    """
+    Add the columns of a model missing from its existing table
+    :param connection: Connection, connection to the database
+    :param model: type, model of the table
+    :return: None
+    """
+    table: str = model.__tablename__
+    existing_columns: set[str] = {
+        column_info[1] for column_info in connection.exec_driver_sql(f'PRAGMA table_info({table})')
+    }
+    for column in model.__table__.columns:
+        if column.name not in existing_columns:
+            connection.exec_driver_sql(
+                f'ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}'
+            )
+
+
+def _add_daily_user_data_columns(connection: Connection) -> None:
+    """
+    Add the columns of the DailyUserData model missing from an existing daily_user_data table
+    :param connection: Connection, connection to the database
+    :return: None
+    """
+    _add_missing_columns(connection, DailyUserData)
+
+
+def _add_aggregated_user_data_columns(connection: Connection) -> None:
+    """
+    Add the columns of the aggregated models missing from the existing weekly and monthly tables
+    :param connection: Connection, connection to the database
+    :return: None
+    """
+    for model in (WeeklyUserData, MonthlyUserData):
+        _add_missing_columns(connection, model)
+
+
+def _add_pagination_message_columns(connection: Connection) -> None:
+    """
+    Add the columns of the PaginationMessage model missing from an existing pagination_messages table
+    :param connection: Connection, connection to the database
+    :return: None
+    """
+    _add_missing_columns(connection, PaginationMessage)
+
+
+# Versioned migrations applied in order on existing databases, the applied version is stored in PRAGMA user_version.
+# Each step is either a SQL statement or a function receiving the connection, and must be safe to run again.
+MIGRATIONS: list[tuple[int, str, list[str | Callable[[Connection], None]]]] = [
+    (1, 'Index daily_user_data for score history, leaderboard and organization rank queries', [
+        'CREATE INDEX IF NOT EXISTS ix_daily_user_data_discord_id_date ON daily_user_data (discord_id, date)',
+        'CREATE INDEX IF NOT EXISTS ix_daily_user_data_date_htb_score ON daily_user_data (date, htb_score)',
+        'CREATE INDEX IF NOT EXISTS ix_daily_user_data_date_rm_score ON daily_user_data (date, rm_score)',
+        'CREATE INDEX IF NOT EXISTS ix_daily_user_data_date_thm_rooms ON daily_user_data (date, thm_rooms)',
+        'ANALYZE daily_user_data',
+    ]),
+    (2, 'Enable incremental auto-vacuum', [_enable_incremental_vacuum]),
+    (3, 'Add the platform fetch states to daily_user_data', [_add_daily_user_data_columns]),
+    (4, 'Add the organization rank aggregates to the weekly and monthly data', [_add_aggregated_user_data_columns]),
+    (5, 'Add the snapshot date to pagination_messages', [_add_pagination_message_columns]),
+]
+
 
 class DatabaseManager:
     _instance = None
     _session_local = None
     _engine = None
+    _database_path = None
+    _storage_mode = 'daily'
 
-    def __new__(cls, database_path: str = None):
+    def __new__(cls, database_path: str = None, storage_profile: dict = None, storage_mode: str = 'daily'):
         """
         Singleton pattern, only one instance of DatabaseManager can exist at a time
         :param database_path: str, path to the database
+        :param storage_profile: dict, SQLite pragmas overriding DEFAULT_STORAGE_PROFILE
+        :param storage_mode: str, 'daily' to store a row per user and day, 'changes' to store a row only on changes
         """
         if cls._instance is None:
             if database_path is None:
                 raise ValueError("Database path must be provided for the first instantiation of DatabaseManager")
+            if storage_mode not in STORAGE_MODES:
+                raise ValueError(f"Storage mode must be one of {', '.join(STORAGE_MODES)}")
             cls._instance = super(DatabaseManager, cls).__new__(cls)
-            cls._initialize(database_path)
+            cls._storage_mode = storage_mode
+            cls._initialize(database_path, {**DEFAULT_STORAGE_PROFILE, **(storage_profile or {})})
         return cls._instance
 
     @classmethod
-    def _initialize(cls, database_path: str) -> None:
+    def _initialize(cls, database_path: str, storage_profile: dict) -> None:
         """
-        Initialize the database with the given path
+        Initialize the database with the given path, every connection is configured with the storage profile
         :param database_path: str, path to the database
+        :param storage_profile: dict, SQLite pragmas (journal_mode, synchronous, cache_size, mmap_size, busy_timeout)
         :return: None
         """
         database_url: str = f'sqlite:///{database_path}'
+        cls._database_path = database_path
         cls._engine = create_engine(database_url)
+
+        @event.listens_for(cls._engine, 'connect')
+        def _set_pragmas(dbapi_connection: sqlite3.Connection, connection_record) -> None:
+            cursor: sqlite3.Cursor = dbapi_connection.cursor()
+            cursor.execute(f'PRAGMA busy_timeout = {int(storage_profile["busy_timeout"])}')
+            cursor.execute(f'PRAGMA journal_mode = {storage_profile["journal_mode"]}')
+            cursor.execute(f'PRAGMA synchronous = {storage_profile["synchronous"]}')
+            cursor.execute(f'PRAGMA cache_size = {int(storage_profile["cache_size"])}')
+            cursor.execute(f'PRAGMA mmap_size = {int(storage_profile["mmap_size"])}')
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.close()
+
         cls._session_local = sessionmaker(bind=cls._engine)
         Base.metadata.create_all(bind=cls._engine)
-        logger.info('Database initialized successfully.')
+        logger.info(f'Database initialized successfully with the storage profile {storage_profile}.')
 
     @classmethod
     def get_session_local(cls) -> sqlalchemy.orm.session.sessionmaker:
@@ -50,6 +159,16 @@ class DatabaseManager:
             raise ValueError("DatabaseManager has not been initialized with a database path")
         return cls._session_local()
 
+    @classmethod
+    def get_storage_mode(cls) -> str:
+        """
+        Get the storage mode of the daily data
+        In 'changes' mode, a row is only written when a value of the user changes,
+        the data of a user on a date is the latest row up to this date.
+        :return: str, 'daily' or 'changes'
+        """
+        return cls._storage_mode
+
     @classmethod
     def create_database(cls) -> None:
         """
@@ -66,10 +185,92 @@ class DatabaseManager:
                 logger.info(f'Database created successfully. Tables created: {", ".join(created_tables)}')
             else:
                 logger.debug('Database already exists. No tables were created.')
+            cls.migrate()
 
         except exc.SQLAlchemyError as e:
             logger.error(f'An error occurred while creating the database: {str(e)}')
 
+    @classmethod
+    def get_schema_version(cls) -> int:
+        """
+        Get the version of the last migration applied to the database
+        :return: int, schema version
+        """
+        with cls._engine.connect() as connection:
+            return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+    @classmethod
+    def migrate(cls) -> None:
+        """
+        Apply the pending migrations in order
+        The steps aren't atomic: pysqlite doesn't open a transaction for DDL and PRAGMA statements, so each step must
+        be safe to run again. The version of a migration is only stored once all its steps succeeded, an interrupted
+        migration is therefore run again from its first step at the next start.
+        :return: None
+        """
+        schema_version: int = cls.get_schema_version()
+        for version, description, steps in MIGRATIONS:
+            if version <= schema_version:
+                continue
+            with cls._engine.begin() as connection:
+                for step in steps:
+                    if callable(step):
+                        step(connection)
+                    else:
+                        connection.exec_driver_sql(step)
+                connection.exec_driver_sql(f'PRAGMA user_version = {version}')
+            logger.info(f'Migration {version} applied: {description}')
+
+    @classmethod
+    def run_maintenance(cls) -> None:
+        """
+        Refresh the query planner statistics, give the free pages back to the file system and truncate the WAL
+        :return: None
+        """
+        with cls._engine.connect() as connection:
+            connection.exec_driver_sql('ANALYZE')
+            connection.exec_driver_sql('PRAGMA optimize')
+            connection.exec_driver_sql('PRAGMA incremental_vacuum')
+            connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+            connection.commit()
+        logger.info(f'Database maintenance done: {cls.get_storage_stats()}')
+
+    @classmethod
+    def backup(cls, backup_path: str) -> None:
+        """
+        Copy the database to the given path with the SQLite online backup API
+        Pages are copied by small steps so the other connections can keep reading and writing meanwhile,
+        the backup is written to a temporary file first and replaces the previous one once complete.
+        :param backup_path: str, path of the backup file
+        :return: None
+        """
+        temporary_path: str = f'{backup_path}.tmp'
+        source: sqlite3.Connection = sqlite3.connect(cls._database_path)
+        destination: sqlite3.Connection = sqlite3.connect(temporary_path)
+        try:
+            source.backup(destination, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_SLEEP_BETWEEN_STEPS)
+        finally:
+            destination.close()
+            source.close()
+        os.replace(temporary_path, backup_path)
+        logger.info(f'Database backed up to {backup_path}.')
+
+    @classmethod
+    def get_storage_stats(cls) -> dict:
+        """
+        Get the size and page statistics of the database, used for capacity planning
+        :return: dict, {'page_size', 'page_count', 'freelist_count', 'database_bytes', 'wal_bytes', 'journal_mode'}
+        """
+        with cls._engine.connect() as connection:
+            stats: dict = {
+                pragma: connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+                for pragma in ('page_size', 'page_count', 'freelist_count', 'journal_mode')
+            }
+        wal_path: str = f'{cls._database_path}-wal'
+        stats['database_bytes'] = stats['page_size'] * stats['page_count']
+        stats['wal_bytes'] = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        return stats
+
     @classmethod
     def reset_database(cls) -> None:
         """
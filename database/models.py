@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Date, PrimaryKeyConstraint
+from sqlalchemy import Column, Integer, String, Date, DateTime, PrimaryKeyConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 USERS_TABLE = 'users'
 DAILY_USER_DATA_TABLE = 'daily_user_data'
+DAILY_ORG_RANK_TABLE = 'daily_org_rank'
+WEEKLY_USER_DATA_TABLE = 'weekly_user_data'
+MONTHLY_USER_DATA_TABLE = 'monthly_user_data'
+PAGINATION_MESSAGES_TABLE = 'pagination_messages'
 
 
 class User(Base):
@@ -48,10 +52,136 @@ class DailyUserData(Base):
     thm_rank: int = Column(Integer, comment="User's rank on TryHackMe for the given date")
     thm_rooms: int = Column(Integer, comment="Number of rooms completed by the user on TryHackMe for the given date")
 
-    __table_args__ = (PrimaryKeyConstraint('date', 'discord_id'),)
+    # Platform fetch states, a value carried over from a previous fetch keeps its fetched_at
+    htb_fetched_at: DateTime = Column(DateTime, comment='Time the HackTheBox values were fetched')
+    htb_fetch_status: str = Column(String, comment="Outcome of the last HackTheBox fetch: 'ok', 'failed' or 'timeout'")
+    rm_fetched_at: DateTime = Column(DateTime, comment='Time the RootMe values were fetched')
+    rm_fetch_status: str = Column(String, comment="Outcome of the last RootMe fetch: 'ok', 'failed' or 'timeout'")
+    thm_fetched_at: DateTime = Column(DateTime, comment='Time the TryHackMe values were fetched')
+    thm_fetch_status: str = Column(String, comment="Outcome of the last TryHackMe fetch: 'ok', 'failed' or 'timeout'")
+
+    __table_args__ = (
+        PrimaryKeyConstraint('date', 'discord_id'),
+        Index('ix_daily_user_data_discord_id_date', 'discord_id', 'date'),
+        Index('ix_daily_user_data_date_htb_score', 'date', 'htb_score'),
+        Index('ix_daily_user_data_date_rm_score', 'date', 'rm_score'),
+        Index('ix_daily_user_data_date_thm_rooms', 'date', 'thm_rooms'),
+    )
 
     def __repr__(self):
         return (f'<DailyUserData(date={self.date}, discord_id={self.discord_id},'
                 f' htb_rank={self.htb_rank}, htb_score={self.htb_score},'
                 f' rm_rank={self.rm_rank}, rm_score={self.rm_score}'
                 f' thm_rank={self.thm_rank}, thm_rooms={self.thm_rooms})>')
+
+
+class DailyOrgRank(Base):
+    """
+    DailyOrgRank model for the database.
+    Used to store the daily rank of a user inside the organization, computed at the end of each update cycle.
+    """
+    __tablename__ = DAILY_ORG_RANK_TABLE
+
+    date: Date = Column(Date, nullable=False, comment='Date of the ranking')
+    discord_id: int = Column(Integer, nullable=False, comment='Discord ID of the user')
+
+    # Organization rankings
+    htb_orga_rank: int = Column(Integer, comment="User's rank in the organization on HackTheBox for the given date")
+    rm_orga_rank: int = Column(Integer, comment="User's rank in the organization on RootMe for the given date")
+    thm_orga_rank: int = Column(Integer, comment="User's rank in the organization on TryHackMe for the given date")
+
+    __table_args__ = (
+        PrimaryKeyConstraint('date', 'discord_id'),
+        Index('ix_daily_org_rank_discord_id_date', 'discord_id', 'date'),
+    )
+
+    def __repr__(self):
+        return (f'<DailyOrgRank(date={self.date}, discord_id={self.discord_id},'
+                f' htb_orga_rank={self.htb_orga_rank}, rm_orga_rank={self.rm_orga_rank},'
+                f' thm_orga_rank={self.thm_orga_rank})>')
+
+
+class AggregatedUserData:
+    """
+    Columns shared by the aggregated user data models.
+    Used to store the ranking & score of a user over a period once its daily data has been rolled up.
+    """
+    period_start = Column(Date, nullable=False, comment='First day of the aggregated period')
+    discord_id = Column(Integer, nullable=False, comment='Discord ID of the user')
+
+    # Platform rankings at the end of the period
+    htb_rank_last = Column(Integer, comment="User's last rank on HackTheBox over the period")
+    rm_rank_last = Column(Integer, comment="User's last rank on RootMe over the period")
+    thm_rank_last = Column(Integer, comment="User's last rank on TryHackMe over the period")
+
+    # Organization rankings at the end of the period
+    htb_orga_rank_last = Column(Integer, comment="User's last rank in the organization on HackTheBox over the period")
+    rm_orga_rank_last = Column(Integer, comment="User's last rank in the organization on RootMe over the period")
+    thm_orga_rank_last = Column(Integer, comment="User's last rank in the organization on TryHackMe over the period")
+
+    # Platform scores over the period
+    htb_score_last = Column(Integer, comment="User's last score on HackTheBox over the period")
+    htb_score_min = Column(Integer, comment="User's lowest score on HackTheBox over the period")
+    htb_score_max = Column(Integer, comment="User's highest score on HackTheBox over the period")
+    htb_score_delta = Column(Integer, comment="User's score progress on HackTheBox over the period")
+    rm_score_last = Column(Integer, comment="User's last score on RootMe over the period")
+    rm_score_min = Column(Integer, comment="User's lowest score on RootMe over the period")
+    rm_score_max = Column(Integer, comment="User's highest score on RootMe over the period")
+    rm_score_delta = Column(Integer, comment="User's score progress on RootMe over the period")
+    thm_rooms_last = Column(Integer, comment="User's last number of rooms on TryHackMe over the period")
+    thm_rooms_min = Column(Integer, comment="User's lowest number of rooms on TryHackMe over the period")
+    thm_rooms_max = Column(Integer, comment="User's highest number of rooms on TryHackMe over the period")
+    thm_rooms_delta = Column(Integer, comment="User's rooms progress on TryHackMe over the period")
+
+    def __repr__(self):
+        return (f'<{type(self).__name__}(period_start={self.period_start}, discord_id={self.discord_id},'
+                f' htb_score_last={self.htb_score_last}, rm_score_last={self.rm_score_last},'
+                f' thm_rooms_last={self.thm_rooms_last})>')
+
+
+class WeeklyUserData(AggregatedUserData, Base):
+    """
+    WeeklyUserData model for the database.
+    Used to store the weekly aggregates of the daily data older than the daily retention, weeks start on Monday.
+    """
+    __tablename__ = WEEKLY_USER_DATA_TABLE
+
+    __table_args__ = (
+        PrimaryKeyConstraint('period_start', 'discord_id'),
+        Index('ix_weekly_user_data_discord_id_period_start', 'discord_id', 'period_start'),
+    )
+
+
+class MonthlyUserData(AggregatedUserData, Base):
+    """
+    MonthlyUserData model for the database.
+    Used to store the monthly aggregates of the weekly data older than the weekly retention.
+    """
+    __tablename__ = MONTHLY_USER_DATA_TABLE
+
+    __table_args__ = (
+        PrimaryKeyConstraint('period_start', 'discord_id'),
+        Index('ix_monthly_user_data_discord_id_period_start', 'discord_id', 'period_start'),
+    )
+
+
+class PaginationMessage(Base):
+    """
+    PaginationMessage model for the database.
+    Used to store the page displayed by each paginated leaderboard or movers message, so its buttons survive restarts.
+    """
+    __tablename__ = PAGINATION_MESSAGES_TABLE
+
+    message_id: int = Column(Integer, primary_key=True, comment='Discord ID of the paginated message')
+    board: str = Column(String, nullable=False, comment='Board displayed by the message, leaderboard or movers')
+    platform: str = Column(String, nullable=False, comment='Platform of the board')
+    board_date: Date = Column(Date, comment='Date of a past leaderboard, NULL for the current one')
+    snapshot_date: Date = Column(Date, comment='Date of the data displayed by the message, read again on each page')
+    days: int = Column(Integer, comment='Size of the movers window in days')
+    page: int = Column(Integer, nullable=False, default=1, comment='Page currently displayed by the message')
+    author_id: int = Column(Integer, nullable=False, comment='Discord ID of the member who ran the command')
+    last_used_at: DateTime = Column(DateTime, nullable=False, index=True, comment='Last time the message was used')
+
+    def __repr__(self):
+        return (f'<PaginationMessage(message_id={self.message_id}, board={self.board}, platform={self.platform},'
+                f' board_date={self.board_date}, days={self.days}, page={self.page})>')
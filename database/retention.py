@@ -0,0 +1,410 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.manager import DatabaseManager
+from database.models import DailyOrgRank, DailyUserData, MonthlyUserData, WeeklyUserData
+
+SessionLocal = DatabaseManager.get_session_local
+logger = logging.getLogger(__name__)
+
+SCORE_KEYS: dict[str, str] = {'htb': 'htb_score', 'rm': 'rm_score', 'thm': 'thm_rooms'}
+RANK_KEYS: tuple[str, ...] = ('htb_rank', 'rm_rank', 'thm_rank')
+ORGA_RANK_KEYS: tuple[str, ...] = ('htb_orga_rank', 'rm_orga_rank', 'thm_orga_rank')
+MIN_DAILY_RETENTION_DAYS: int = 31
+ROLLUP_YIELD_PER: int = 1000
+UPSERT_CHUNK_SIZE: int = 200
+
+
+def _week_start(date: datetime.date) -> datetime.date:
+    """
+    Get the first day (Monday) of the week of a date
+    :param date: datetime.date, date in the week
+    :return: datetime.date, first day of the week
+    """
+    return date - timedelta(days=date.weekday())
+
+
+def _month_start(date: datetime.date) -> datetime.date:
+    """
+    Get the first day of the month of a date
+    :param date: datetime.date, date in the month
+    :return: datetime.date, first day of the month
+    """
+    return date.replace(day=1)
+
+
+def _merge_partial(partial: dict | None, first: int, last: int, minimum: int, maximum: int) -> dict:
+    """
+    Helper function to merge a chronologically later piece of a series into a partial aggregate
+    :param partial: dict | None, partial aggregate {'first', 'last', 'min', 'max'}, None if empty
+    :param first: int, first value of the piece
+    :param last: int, last value of the piece
+    :param minimum: int, lowest value of the piece
+    :param maximum: int, highest value of the piece
+    :return: dict, merged partial aggregate
+    """
+    if partial is None:
+        return {'first': first, 'last': last, 'min': minimum, 'max': maximum}
+    partial['last'] = last
+    partial['min'] = min(partial['min'], minimum)
+    partial['max'] = max(partial['max'], maximum)
+    return partial
+
+
+def _aggregate_from_row(row) -> dict:
+    """
+    Helper function to read an aggregated row back as the partial aggregates of its metrics
+    :param row: Row | AggregatedUserData, weekly or monthly row
+    :return: dict, partial aggregates by score key and last ranks by rank key
+    """
+    aggregate: dict = {rank_key: getattr(row, f'{rank_key}_last') for rank_key in (*RANK_KEYS, *ORGA_RANK_KEYS)}
+    for score_key in SCORE_KEYS.values():
+        last: int | None = getattr(row, f'{score_key}_last')
+        aggregate[score_key] = _merge_partial(
+            None,
+            last - (getattr(row, f'{score_key}_delta') or 0),
+            last,
+            getattr(row, f'{score_key}_min'),
+            getattr(row, f'{score_key}_max'),
+        ) if last is not None else None
+    return aggregate
+
+
+def _merge_aggregates(aggregate: dict, later: dict) -> dict:
+    """
+    Helper function to merge the partial aggregates of a later piece of a period into the current ones
+    :param aggregate: dict, current partial aggregates by score key and last ranks by rank key
+    :param later: dict, partial aggregates of the later piece
+    :return: dict, merged partial aggregates
+    """
+    for rank_key in (*RANK_KEYS, *ORGA_RANK_KEYS):
+        if later[rank_key] is not None:
+            aggregate[rank_key] = later[rank_key]
+    for score_key in SCORE_KEYS.values():
+        piece: dict | None = later[score_key]
+        if piece is not None:
+            aggregate[score_key] = _merge_partial(
+                aggregate[score_key], piece['first'], piece['last'], piece['min'], piece['max']
+            )
+    return aggregate
+
+
+def _to_aggregated_row(period_start: datetime.date, discord_id: int, aggregate: dict) -> dict:
+    """
+    Helper function to convert partial aggregates to the columns of an aggregated row
+    :param period_start: datetime.date, first day of the period
+    :param discord_id: int, discord id of the user
+    :param aggregate: dict, partial aggregates by score key and last ranks by rank key
+    :return: dict, aggregated row
+    """
+    row: dict = {'period_start': period_start, 'discord_id': discord_id}
+    for rank_key in (*RANK_KEYS, *ORGA_RANK_KEYS):
+        row[f'{rank_key}_last'] = aggregate[rank_key]
+    for score_key in SCORE_KEYS.values():
+        partial: dict | None = aggregate[score_key]
+        row[f'{score_key}_last'] = partial['last'] if partial else None
+        row[f'{score_key}_min'] = partial['min'] if partial else None
+        row[f'{score_key}_max'] = partial['max'] if partial else None
+        row[f'{score_key}_delta'] = partial['last'] - partial['first'] if partial else None
+    return row
+
+
+def _store_aggregates(db, model, aggregates: dict[tuple, dict]) -> None:
+    """
+    Helper function to merge aggregates with the already stored ones of the same periods and write them
+    Stored aggregates come from rows rolled up earlier, they are considered as the beginning of their period.
+    :param db: Session, session of the running transaction
+    :param model: type, WeeklyUserData or MonthlyUserData
+    :param aggregates: dict[tuple, dict], partial aggregates by (period_start, discord_id)
+    :return: None
+    """
+    if not aggregates:
+        return
+    periods: list[datetime.date] = [period_start for period_start, _ in aggregates]
+    stored_rows = db.execute(
+        select(model.__table__).where(model.period_start.between(min(periods), max(periods)))
+    ).all()
+    for stored_row in stored_rows:
+        later: dict | None = aggregates.get((stored_row.period_start, stored_row.discord_id))
+        if later is not None:
+            aggregates[(stored_row.period_start, stored_row.discord_id)] = _merge_aggregates(
+                _aggregate_from_row(stored_row), later
+            )
+
+    rows: list[dict] = [
+        _to_aggregated_row(period_start, discord_id, aggregate)
+        for (period_start, discord_id), aggregate in aggregates.items()
+    ]
+    for index in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        statement = sqlite_insert(model).values(rows[index:index + UPSERT_CHUNK_SIZE])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['period_start', 'discord_id'],
+            set_={
+                column: statement.excluded[column]
+                for column in model.__table__.columns.keys() if column not in ('period_start', 'discord_id')
+            }
+        ))
+
+
+def _get_previous_scores(db, discord_id: int, period_start: datetime.date) -> dict:
+    """
+    Helper function to get the last stored aggregated scores of a user before a period
+    :param db: Session, session of the running transaction
+    :param discord_id: int, discord id of the user
+    :param period_start: datetime.date, first day of the period
+    :return: dict, last score by score key, None if unknown
+    """
+    scores: dict = dict.fromkeys(SCORE_KEYS.values())
+    for model in (WeeklyUserData, MonthlyUserData):
+        for score_key in scores:
+            if scores[score_key] is not None:
+                continue
+            score_column = getattr(model, f'{score_key}_last')
+            scores[score_key] = db.execute(
+                select(score_column)
+                .where(model.discord_id == discord_id, model.period_start < period_start, score_column.is_not(None))
+                .order_by(model.period_start.desc())
+                .limit(1)
+            ).scalar()
+    return scores
+
+
+def _carry_scores_forward(db, aggregates: dict[tuple, dict], daily_periods: set[tuple]) -> None:
+    """
+    Helper function to give the weeks holding only organization ranks the previous scores of their user
+    In 'changes' storage mode a user without daily row in a week kept the scores of its previous row.
+    :param db: Session, session of the running transaction
+    :param aggregates: dict[tuple, dict], partial aggregates by (period_start, discord_id)
+    :param daily_periods: set[tuple], (period_start, discord_id) keys aggregated from daily rows
+    :return: None
+    """
+    previous_scores: dict[int, dict] = {}
+    for period_start, discord_id in sorted(aggregates):
+        aggregate: dict = aggregates[(period_start, discord_id)]
+        if (period_start, discord_id) not in daily_periods:
+            scores: dict | None = previous_scores.get(discord_id)
+            if scores is None:
+                scores = _get_previous_scores(db, discord_id, period_start)
+            for score_key, value in scores.items():
+                if value is not None:
+                    aggregate[score_key] = _merge_partial(None, value, value, value, value)
+        previous_scores[discord_id] = {
+            score_key: aggregate[score_key]['last'] if aggregate[score_key] else None
+            for score_key in SCORE_KEYS.values()
+        }
+
+
+def rollup_daily_data(before: datetime.date) -> int:
+    """
+    Roll the daily data of the complete weeks before the given date up into weekly aggregates
+    Daily rows and organization ranks are streamed, aggregated per user and week, then deleted.
+    In 'changes' storage mode, the latest row of each user is kept since it holds its values after the boundary,
+    and the weeks holding only organization ranks carry the previous scores of the user.
+    :param before: datetime.date, only the weeks ending before this date are rolled up
+    :return: int, number of daily rows rolled up
+    """
+    boundary: datetime.date = _week_start(before)
+    aggregates: dict[tuple, dict] = {}
+    rolled_up: int = 0
+
+    with SessionLocal() as db:
+        try:
+            daily_rows = db.execute(
+                select(DailyUserData.__table__)
+                .where(DailyUserData.date < boundary)
+                .order_by(DailyUserData.discord_id, DailyUserData.date)
+                .execution_options(yield_per=ROLLUP_YIELD_PER)
+            )
+            for daily_row in daily_rows:
+                key: tuple = (_week_start(daily_row.date), daily_row.discord_id)
+                aggregate: dict = aggregates.setdefault(
+                    key, dict.fromkeys((*RANK_KEYS, *ORGA_RANK_KEYS, *SCORE_KEYS.values()))
+                )
+                for rank_key in RANK_KEYS:
+                    if getattr(daily_row, rank_key) is not None:
+                        aggregate[rank_key] = getattr(daily_row, rank_key)
+                for score_key in SCORE_KEYS.values():
+                    value: int | None = getattr(daily_row, score_key)
+                    if value is not None:
+                        aggregate[score_key] = _merge_partial(aggregate[score_key], value, value, value, value)
+                rolled_up += 1
+            daily_periods: set[tuple] = set(aggregates)
+
+            organization_ranks = db.execute(
+                select(DailyOrgRank.__table__)
+                .where(DailyOrgRank.date < boundary)
+                .order_by(DailyOrgRank.discord_id, DailyOrgRank.date)
+                .execution_options(yield_per=ROLLUP_YIELD_PER)
+            )
+            for organization_rank in organization_ranks:
+                key: tuple = (_week_start(organization_rank.date), organization_rank.discord_id)
+                aggregate: dict = aggregates.setdefault(
+                    key, dict.fromkeys((*RANK_KEYS, *ORGA_RANK_KEYS, *SCORE_KEYS.values()))
+                )
+                for rank_key in ORGA_RANK_KEYS:
+                    if getattr(organization_rank, rank_key) is not None:
+                        aggregate[rank_key] = getattr(organization_rank, rank_key)
+
+            _carry_scores_forward(db, aggregates, daily_periods)
+            _store_aggregates(db, WeeklyUserData, aggregates)
+            rolled_up_rows = DailyUserData.date < boundary
+            if DatabaseManager.get_storage_mode() == 'changes':
+                rolled_up_rows &= tuple_(DailyUserData.date, DailyUserData.discord_id).not_in(
+                    select(func.max(DailyUserData.date), DailyUserData.discord_id)
+                    .where(DailyUserData.date < boundary)
+                    .group_by(DailyUserData.discord_id)
+                )
+            db.execute(delete(DailyUserData).where(rolled_up_rows))
+            db.execute(delete(DailyOrgRank).where(DailyOrgRank.date < boundary))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    if rolled_up:
+        logger.info(f'{rolled_up} daily rows before {boundary} rolled up into {len(aggregates)} weekly rows.')
+    return rolled_up
+
+
+def rollup_weekly_data(before: datetime.date) -> int:
+    """
+    Roll the weekly aggregates of the complete months before the given date up into monthly aggregates
+    A week belongs to the month of its first day.
+    :param before: datetime.date, only the months ending before this date are rolled up
+    :return: int, number of weekly rows rolled up
+    """
+    boundary: datetime.date = _month_start(before)
+    aggregates: dict[tuple, dict] = {}
+    rolled_up: int = 0
+
+    with SessionLocal() as db:
+        try:
+            weekly_rows = db.execute(
+                select(WeeklyUserData.__table__)
+                .where(WeeklyUserData.period_start < boundary)
+                .order_by(WeeklyUserData.discord_id, WeeklyUserData.period_start)
+                .execution_options(yield_per=ROLLUP_YIELD_PER)
+            )
+            for weekly_row in weekly_rows:
+                key: tuple = (_month_start(weekly_row.period_start), weekly_row.discord_id)
+                aggregate: dict | None = aggregates.get(key)
+                week: dict = _aggregate_from_row(weekly_row)
+                aggregates[key] = _merge_aggregates(aggregate, week) if aggregate else week
+                rolled_up += 1
+
+            _store_aggregates(db, MonthlyUserData, aggregates)
+            db.execute(delete(WeeklyUserData).where(WeeklyUserData.period_start < boundary))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    if rolled_up:
+        logger.info(f'{rolled_up} weekly rows before {boundary} rolled up into {len(aggregates)} monthly rows.')
+    return rolled_up
+
+
+def apply_retention(daily_retention_days: int | None, weekly_retention_days: int | None) -> None:
+    """
+    Downsample the history of the users, daily data older than the daily retention is rolled up into weeks
+    and weekly data older than the weekly retention is rolled up into months. A retention set to None is disabled.
+    :param daily_retention_days: int | None, number of days the daily data is kept
+    :param weekly_retention_days: int | None, number of days the weekly data is kept
+    :return: None
+    """
+    today: datetime.date = datetime.now().date()
+    if daily_retention_days is not None:
+        rollup_daily_data(today - timedelta(days=max(daily_retention_days, MIN_DAILY_RETENTION_DAYS)))
+    if weekly_retention_days is not None:
+        rollup_weekly_data(today - timedelta(days=weekly_retention_days))
+
+
+def get_rolled_up_period(date: datetime.date) -> tuple[type, datetime.date] | None:
+    """
+    Get the aggregated period holding a date whose daily data has been rolled up
+    It's the week of the date, or the month of this week since a week belongs to the month of its first day.
+    :param date: datetime.date, date to look up
+    :return: tuple[type, datetime.date] | None, WeeklyUserData or MonthlyUserData and the first day of the period,
+    None if the daily data of the date is kept
+    """
+    week_start: datetime.date = _week_start(date)
+    with SessionLocal() as db:
+        for model, period_start in ((WeeklyUserData, week_start), (MonthlyUserData, _month_start(week_start))):
+            if db.execute(select(model.period_start).where(model.period_start == period_start).limit(1)).first():
+                return model, period_start
+    return None
+
+
+def get_score_on_date(discord_id: int, platform: str, date: datetime.date) -> int | None:
+    """
+    Get the score of a user on a platform at a given date, from the finest resolution available
+    The latest daily value up to the date is used, then the last value of the latest week or month starting before it.
+    :param discord_id: int, discord id of the user
+    :param platform: str, platform to get the score from
+    :param date: datetime.date, date of the score
+    :return: int | None, score of the user or None if unknown
+    """
+    score_key: str = SCORE_KEYS[platform]
+    with SessionLocal() as db:
+        score: int | None = db.execute(
+            select(getattr(DailyUserData, score_key))
+            .where(
+                DailyUserData.discord_id == discord_id,
+                DailyUserData.date <= date,
+                getattr(DailyUserData, score_key).is_not(None),
+            )
+            .order_by(DailyUserData.date.desc())
+            .limit(1)
+        ).scalar()
+        for model in (WeeklyUserData, MonthlyUserData):
+            if score is not None:
+                break
+            score_column = getattr(model, f'{score_key}_last')
+            score = db.execute(
+                select(score_column)
+                .where(model.discord_id == discord_id, model.period_start <= date, score_column.is_not(None))
+                .order_by(model.period_start.desc())
+                .limit(1)
+            ).scalar()
+    return score
+
+
+def get_score_evolution(
+        discord_id: int, platform: str, start: datetime.date, end: datetime.date
+) -> list[tuple[datetime.date, int]]:
+    """
+    Get the evolution of the score of a user on a platform over a window, mixing the available resolutions
+    Monthly and weekly points are dated by the first day of their period and hold the last value of the period.
+    :param discord_id: int, discord id of the user
+    :param platform: str, platform to get the scores from
+    :param start: datetime.date, first date of the window
+    :param end: datetime.date, last date of the window
+    :return: list[tuple[datetime.date, int]], (date, score) points sorted by date
+    """
+    score_key: str = SCORE_KEYS[platform]
+    points: dict[datetime.date, int] = {}
+    with SessionLocal() as db:
+        for model in (MonthlyUserData, WeeklyUserData):
+            score_column = getattr(model, f'{score_key}_last')
+            points.update(db.execute(
+                select(model.period_start, score_column)
+                .where(
+                    model.discord_id == discord_id,
+                    model.period_start.between(start, end),
+                    score_column.is_not(None),
+                )
+            ).tuples().all())
+        score_column = getattr(DailyUserData, score_key)
+        points.update(db.execute(
+            select(DailyUserData.date, score_column)
+            .where(
+                DailyUserData.discord_id == discord_id,
+                DailyUserData.date.between(start, end),
+                score_column.is_not(None),
+            )
+        ).tuples().all())
+    return sorted(points.items())
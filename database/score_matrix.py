@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from database.crud_data import SCORE_KEYS, data_as_of
+from database.manager import DatabaseManager
+from database.models import DailyUserData
+
+SessionLocal = DatabaseManager.get_session_local
+logger = logging.getLogger(__name__)
+
+SCORE_MATRIX_DAYS: int = 366
+SCORE_MATRIX_YIELD_PER: int = 1000
+
+
+def _forward_fill(scores: np.ndarray) -> np.ndarray:
+    """
+    Helper function to replace the missing scores of each user by its last known score
+    :param scores: np.ndarray, users x days matrix, NaN where the score is missing
+    :return: np.ndarray, forward-filled matrix, NaN before the first known score of a user
+    """
+    known_columns: np.ndarray = np.where(~np.isnan(scores), np.arange(scores.shape[1]), 0)
+    np.maximum.accumulate(known_columns, axis=1, out=known_columns)
+    return scores[np.arange(scores.shape[0])[:, None], known_columns]
+
+
+class ScoreMatrix:
+    """
+    Dense matrix of the scores of the users on a platform, one row per user and one column per day.
+    Missing days hold the last known score of the user, days before its first score are NaN.
+    """
+
+    def __init__(self, platform: str, start_date: datetime.date, discord_ids: list[int], scores: np.ndarray):
+        self.platform: str = platform
+        self.start_date: datetime.date = start_date
+        self.discord_ids: np.ndarray = np.asarray(discord_ids, dtype=np.int64)
+        self.scores: np.ndarray = scores
+        self._rows: dict[int, int] = {discord_id: row for row, discord_id in enumerate(discord_ids)}
+
+    @property
+    def end_date(self) -> datetime.date:
+        """
+        Date of the last column of the matrix
+        :return: datetime.date, last date
+        """
+        return self.start_date + timedelta(days=self.scores.shape[1] - 1)
+
+    @classmethod
+    def build(cls, platform: str, end_date: datetime.date, days: int = SCORE_MATRIX_DAYS) -> 'ScoreMatrix':
+        """
+        Build the matrix of the given number of days up to the end date from the daily data
+        :param platform: str, platform of the scores
+        :param end_date: datetime.date, date of the last column
+        :param days: int, number of columns
+        :return: ScoreMatrix, built matrix
+        """
+        start_date: datetime.date = end_date - timedelta(days=days - 1)
+        matrix: ScoreMatrix = cls(platform, start_date, [], np.full((0, days), np.nan, dtype=np.float32))
+        return matrix.refreshed(end_date, since=start_date)
+
+    def refreshed(self, end_date: datetime.date, since: datetime.date = None) -> 'ScoreMatrix':
+        """
+        Build a new matrix extended up to the end date with the daily data written since the last column
+        The last column is read again since the data of the current day is updated by every cycle,
+        the oldest columns are dropped to keep SCORE_MATRIX_DAYS columns.
+        :param end_date: datetime.date, date of the last column
+        :param since: datetime.date, first date to read, the last column of the matrix by default
+        :return: ScoreMatrix, refreshed matrix, the current one is left untouched
+        """
+        since = since or min(self.end_date, end_date)
+        score_key: str = SCORE_KEYS[self.platform]
+        daily_data, on_since = data_as_of(since)
+        first_rows = select(daily_data.discord_id, daily_data.date, getattr(daily_data, score_key)).where(on_since)
+        next_rows = (
+            select(DailyUserData.discord_id, DailyUserData.date, getattr(DailyUserData, score_key))
+            .where(DailyUserData.date > since, DailyUserData.date <= end_date)
+        )
+
+        discord_ids: list[int] = self.discord_ids.tolist()
+        rows: dict[int, int] = dict(self._rows)
+        user_rows: list[int] = []
+        day_columns: list[int] = []
+        values: list[float] = []
+        with SessionLocal() as db:
+            for statement in (first_rows, next_rows):
+                statement = statement.execution_options(yield_per=SCORE_MATRIX_YIELD_PER)
+                for discord_id, date, score in db.execute(statement):
+                    if score is None:
+                        continue
+                    if discord_id not in rows:
+                        rows[discord_id] = len(discord_ids)
+                        discord_ids.append(discord_id)
+                    user_rows.append(rows[discord_id])
+                    day_columns.append((max(date, since) - self.start_date).days)
+                    values.append(score)
+
+        days: int = (end_date - self.start_date).days + 1
+        since_column: int = (since - self.start_date).days
+        scores: np.ndarray = np.full((len(discord_ids), days), np.nan, dtype=np.float32)
+        scores[:self.scores.shape[0], :since_column] = self.scores[:, :since_column]
+        scores[user_rows, day_columns] = values
+        scores = _forward_fill(scores)
+
+        start_date: datetime.date = self.start_date
+        if days > SCORE_MATRIX_DAYS:
+            scores = scores[:, days - SCORE_MATRIX_DAYS:]
+            start_date += timedelta(days=days - SCORE_MATRIX_DAYS)
+        return ScoreMatrix(self.platform, start_date, discord_ids, np.ascontiguousarray(scores))
+
+    def save(self, directory: str) -> None:
+        """
+        Write the matrix to a .npy file and its metadata to a JSON sidecar, both replaced atomically
+        :param directory: str, directory of the files
+        :return: None
+        """
+        path: str = os.path.join(directory, f'{self.platform}_scores')
+        with open(f'{path}.npy.tmp', 'wb') as file:
+            np.save(file, self.scores)
+        with open(f'{path}.json.tmp', 'w') as file:
+            json.dump({
+                'platform': self.platform,
+                'start_date': self.start_date.isoformat(),
+                'discord_ids': self.discord_ids.tolist(),
+            }, file)
+        os.replace(f'{path}.npy.tmp', f'{path}.npy')
+        os.replace(f'{path}.json.tmp', f'{path}.json')
+
+    @classmethod
+    def load(cls, platform: str, directory: str) -> 'ScoreMatrix | None':
+        """
+        Memory-map a matrix written by save, read-only
+        :param platform: str, platform of the scores
+        :param directory: str, directory of the files
+        :return: ScoreMatrix | None, loaded matrix or None if missing or inconsistent
+        """
+        path: str = os.path.join(directory, f'{platform}_scores')
+        try:
+            with open(f'{path}.json') as file:
+                metadata: dict = json.load(file)
+            scores: np.ndarray = np.load(f'{path}.npy', mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logger.debug(f'No usable {platform} score matrix in {directory}: {e}')
+            return None
+        if metadata.get('platform') != platform or scores.ndim != 2 or scores.shape[0] != len(metadata['discord_ids']):
+            logger.warning(f'Inconsistent {platform} score matrix in {directory}, it will be rebuilt.')
+            return None
+        return cls(platform, datetime.fromisoformat(metadata['start_date']).date(), metadata['discord_ids'], scores)
+
+    def scores_of(self, discord_ids: list[int], days_ago: int = 0) -> np.ndarray:
+        """
+        Get the scores of the given users on a day
+        :param discord_ids: list[int], users to get the scores of
+        :param days_ago: int, number of days before the last column
+        :return: np.ndarray, score of each user in the given order, NaN if unknown
+        """
+        rows: np.ndarray = np.array([self._rows.get(discord_id, -1) for discord_id in discord_ids], dtype=np.int64)
+        if days_ago >= self.scores.shape[1] or not self.scores.shape[0]:
+            return np.full(len(rows), np.nan, dtype=np.float32)
+        scores: np.ndarray = self.scores[rows, self.scores.shape[1] - 1 - days_ago]
+        return np.where(rows >= 0, scores, np.nan)
+
+    def _window(self, days: int, days_ago: int = 0) -> np.ndarray:
+        """
+        Helper function to get the columns of the last days, the current day included
+        :param days: int, number of days before the last column
+        :param days_ago: int, number of days the window ends before the last column
+        :return: np.ndarray, users x (days + 1) view of the matrix
+        """
+        window_end: int = self.scores.shape[1] - days_ago
+        return self.scores[:, max(window_end - days - 1, 0):window_end]
+
+    def gains(self, days: int, days_ago: int = 0) -> np.ndarray:
+        """
+        Get the progress of every user over the last days
+        Users without a score at the start of the window progress from their first score in the window.
+        :param days: int, size of the window in days
+        :param days_ago: int, number of days the window ends before the last column, between 0 and the last column
+        :return: np.ndarray, progress of each user, NaN if the user has no score at the end of the window
+        """
+        window: np.ndarray = self._window(days, days_ago)
+        first_known: np.ndarray = np.argmax(~np.isnan(window), axis=1)
+        baseline: np.ndarray = window[np.arange(window.shape[0]), first_known]
+        return window[:, -1] - baseline
+
+    def top_gainers(
+            self, days: int, limit: int = None, discord_ids: set[int] = None, days_ago: int = 0
+    ) -> list[tuple[int, int]]:
+        """
+        Get the users with the biggest progress over the last days
+        :param days: int, size of the window in days
+        :param limit: int, maximum number of users, all the users who progressed by default
+        :param discord_ids: set[int], users to rank, all the users of the matrix by default
+        :param days_ago: int, number of days the window ends before the last column
+        :return: list[tuple[int, int]], (discord_id, progress) sorted by progress
+        """
+        gains: np.ndarray = np.nan_to_num(self.gains(days, days_ago), nan=0.0)
+        if discord_ids is not None:
+            gains = np.where(np.isin(self.discord_ids, list(discord_ids)), gains, 0.0)
+        order: np.ndarray = np.argsort(-gains, kind='stable')
+        order = order[gains[order] > 0][:limit]
+        return [(int(self.discord_ids[row]), int(gains[row])) for row in order]
+
+    def average_daily_progress(self, days: int) -> np.ndarray:
+        """
+        Get the average daily progress of every user over the last days
+        :param days: int, size of the window in days
+        :return: np.ndarray, average progress per day of each user
+        """
+        return self.gains(days) / max(min(days, self.scores.shape[1] - 1), 1)
+
+    def streaks(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the streaks of consecutive days with progress of every user
+        :return: tuple[np.ndarray, np.ndarray], (current streak, longest streak) of each user in days
+        """
+        progress: np.ndarray = np.diff(self.scores, axis=1) > 0
+        progress_days: np.ndarray = np.cumsum(progress, axis=1)
+        days_before_streak: np.ndarray = np.maximum.accumulate(np.where(progress, 0, progress_days), axis=1)
+        streaks: np.ndarray = progress_days - days_before_streak
+        current: np.ndarray = streaks[:, -1] if streaks.shape[1] else np.zeros(len(self.discord_ids), dtype=int)
+        longest: np.ndarray = streaks.max(axis=1) if streaks.shape[1] else current
+        return current, longest
+
+
+class ScoreMatrices:
+    """
+    Score matrices of every platform, refreshed after each update cycle.
+    Matrices are persisted in a directory when one is set, so a restart only reads the daily data written since.
+    """
+
+    def __init__(self):
+        self.directory: str | None = None
+        self._matrices: dict[str, ScoreMatrix] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get(self, platform: str) -> ScoreMatrix | None:
+        """
+        Get the score matrix of a platform, the returned matrix is never modified
+        :param platform: str, platform of the scores
+        :return: ScoreMatrix | None, score matrix or None if not loaded yet
+        """
+        return self._matrices.get(platform)
+
+    def load(self, directory: str | None = None) -> None:
+        """
+        Load the persisted matrices or build them from the daily data, then bring them up to date
+        :param directory: str | None, directory where the matrices are persisted, kept in memory only if None
+        :return: None
+        """
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            for platform in SCORE_KEYS:
+                matrix: ScoreMatrix | None = ScoreMatrix.load(platform, directory) if directory else None
+                if matrix is not None:
+                    self._matrices[platform] = matrix
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Extend every matrix with the daily data written since its last column and persist it
+        Refreshed matrices replace the previous ones at once, readers never see a partially updated matrix.
+        :return: None
+        """
+        today: datetime.date = datetime.now().date()
+        with self._lock:
+            for platform in SCORE_KEYS:
+                matrix: ScoreMatrix | None = self._matrices.get(platform)
+                if matrix is None or (today - matrix.end_date).days >= SCORE_MATRIX_DAYS:
+                    matrix = ScoreMatrix.build(platform, today)
+                else:
+                    matrix = matrix.refreshed(today)
+                if self.directory:
+                    matrix.save(self.directory)
+                self._matrices[platform] = matrix
+                logger.debug(f'{platform} score matrix refreshed: {matrix.scores.shape[0]} users'
+                             f' from {matrix.start_date} to {matrix.end_date}')
+
+
+score_matrices: ScoreMatrices = ScoreMatrices()
@@ -0,0 +1,62 @@
+import logging
+import logging.config
+
+from sqlalchemy import and_, delete, func, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.manager import DatabaseManager
+from database.crud_data import SCORE_KEYS
+from database.models import DailyUserData
+
+SessionLocal = DatabaseManager.get_session_local
+logger = logging.getLogger(__name__)
+
+
+def compact_daily_data() -> int:
+    """
+    Convert the stored history to the 'changes' storage mode
+    Every daily row holding the same scores as the previous row of its user is deleted, running it again is a no-op.
+    The ranks and fetch states are not compared, the previous row keeps its own.
+    :return: int, number of rows deleted
+    """
+    value_columns: list[str] = list(SCORE_KEYS.values())
+    window: dict = {'partition_by': DailyUserData.discord_id, 'order_by': DailyUserData.date}
+    history = select(
+        DailyUserData.date,
+        DailyUserData.discord_id,
+        func.row_number().over(**window).label('position'),
+        *(getattr(DailyUserData, column) for column in value_columns),
+        *(
+            func.lag(getattr(DailyUserData, column)).over(**window).label(f'previous_{column}')
+            for column in value_columns
+        ),
+    ).subquery()
+    unchanged_rows = select(history.c.date, history.c.discord_id).where(
+        history.c.position > 1,
+        and_(*(history.c[column].is_not_distinct_from(history.c[f'previous_{column}']) for column in value_columns)),
+    )
+
+    with SessionLocal() as db:
+        try:
+            rows_before: int = db.execute(select(func.count()).select_from(DailyUserData)).scalar()
+            deleted: int = db.execute(
+                delete(DailyUserData).where(tuple_(DailyUserData.date, DailyUserData.discord_id).in_(unchanged_rows))
+            ).rowcount
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    logger.info(f'Daily data compacted: {deleted} unchanged rows deleted out of {rows_before}.')
+    return deleted
+
+
+if __name__ == '__main__':
+    from utils.env_checker import get_database_path, get_data_storage_mode, get_storage_profile
+
+    logging.config.fileConfig(fname='logging.conf', disable_existing_loggers=True)
+    if get_data_storage_mode() != 'changes':
+        raise ValueError('DATA_STORAGE_MODE must be set to changes before compacting the daily data.')
+    DatabaseManager(get_database_path(), get_storage_profile(), 'changes').create_database()
+    compact_daily_data()
+    DatabaseManager.run_maintenance()
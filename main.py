@@ -3,11 +3,16 @@ import logging.config
 import discord
 
 from bot.core import setup_bot
+from database.crud_data import get_fetch_states
 from database.manager import DatabaseManager
+from utils.http_cache import http_cache
+from utils.services import data_freshness
 from utils.env_checker import (
     get_discord_token, get_discord_guild_id, get_discord_channel_id,get_birthday_channel_id,
     get_organization_name, get_database_path, get_rm_api_key, get_update_interval,
-    get_dev_mode
+    get_dev_mode, get_storage_profile, get_database_backup_path, get_database_maintenance_interval,
+    get_data_retention_days, get_weekly_retention_days, get_data_storage_mode, get_score_matrix_directory,
+    get_profile_fetch_deadline, get_profile_max_age, get_http_cache_path
 )
 
 
@@ -28,16 +33,35 @@ def main() -> None:
     birthday_channel_id: int = get_birthday_channel_id()
     organization_name: str = get_organization_name()
     database_path: str = get_database_path()
+    storage_profile: dict = get_storage_profile()
+    storage_mode: str = get_data_storage_mode()
+    database_backup_path: str | None = get_database_backup_path()
+    database_maintenance_interval: int = get_database_maintenance_interval()
+    data_retention_days: int | None = get_data_retention_days()
+    weekly_retention_days: int | None = get_weekly_retention_days()
+    score_matrix_directory: str | None = get_score_matrix_directory()
+    profile_fetch_deadline: float = get_profile_fetch_deadline()
+    profile_max_age: int = get_profile_max_age()
+    http_cache_path: str = get_http_cache_path(database_path)
     update_interval: int = get_update_interval()
     rm_api_key: str = get_rm_api_key()
 
-    DatabaseManager(database_path).create_database()
+    DatabaseManager(database_path, storage_profile, storage_mode).create_database()
+    http_cache.open(http_cache_path)
+    data_freshness.load(get_fetch_states())
 
     bot_instance: discord.Bot = setup_bot(
         guild_id=discord_guild_id,
         channel_id=discord_channel_id,
         birthday_channel_id=birthday_channel_id,
         update_interval=update_interval,
+        database_maintenance_interval=database_maintenance_interval,
+        database_backup_path=database_backup_path,
+        data_retention_days=data_retention_days,
+        weekly_retention_days=weekly_retention_days,
+        score_matrix_directory=score_matrix_directory,
+        profile_fetch_deadline=profile_fetch_deadline,
+        profile_max_age=profile_max_age,
         organization_name=organization_name,
         dev_mode=dev_mode,
     )
@@ -0,0 +1,35 @@
+import itertools
+from typing import Callable
+
+import pytest
+
+from database.cache import leaderboard_cache
+from database.manager import DatabaseManager
+
+
+@pytest.fixture(scope='module')
+def database_factory(tmp_path_factory):
+    """
+    Create new SQLite databases, the DatabaseManager singleton is bound to the last one created
+    :param tmp_path_factory: TempPathFactory, factory of the temporary directory holding the databases
+    :return: Callable[[str, Callable[[str], None]], DatabaseManager], function creating a database in the given
+    storage mode, from the file prepared by the optional function receiving its path, like a legacy database
+    """
+    directory = tmp_path_factory.mktemp('database')
+    counter = itertools.count()
+
+    def create_database(storage_mode: str = 'daily', prepare: Callable[[str], None] = None) -> DatabaseManager:
+        if DatabaseManager._engine is not None:
+            DatabaseManager._engine.dispose()
+        DatabaseManager._instance = None
+        database_path: str = str(directory / f'test{next(counter)}.db')
+        if prepare is not None:
+            prepare(database_path)
+        database_manager = DatabaseManager(database_path, storage_mode=storage_mode)
+        database_manager.create_database()
+        leaderboard_cache.invalidate()
+        return database_manager
+
+    yield create_database
+    DatabaseManager._engine.dispose()
+    DatabaseManager._instance = None
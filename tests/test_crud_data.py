@@ -0,0 +1,112 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from database.manager import DatabaseManager
+
+SEED_USERS: int = 60
+SEED_DAYS: int = 90
+SEED_TODAY: date = date(2024, 5, 1)
+PLATFORMS: tuple[str, ...] = ('htb', 'rm', 'thm')
+
+
+@pytest.fixture(scope='module')
+def crud_data(database_factory):
+    """
+    Seed a SQLite database with users having gaps, zero and null scores in their history, and inactive users
+    :param database_factory: Callable[..., DatabaseManager], function creating a database
+    :return: module, crud_data module bound to the seeded database
+    """
+    database_factory()
+    from database import crud_data
+    from database.models import DailyUserData, User
+
+    random.seed(1)
+    with DatabaseManager.get_session_local() as db:
+        for discord_id in range(SEED_USERS):
+            db.add(User(
+                discord_id=discord_id, username=f'user{discord_id}', active=random.random() > 0.1,
+                htb_id=discord_id, rm_id=discord_id, rm_name=f'name{discord_id}', thm_id=f'thm{discord_id}'
+            ))
+            base_score: int = random.randint(0, 1000)
+            for days_ago in range(SEED_DAYS):
+                if random.random() < 0.2:
+                    continue
+                row: dict = {'date': SEED_TODAY - timedelta(days=days_ago), 'discord_id': discord_id}
+                for platform in ('htb', 'rm'):
+                    draw: float = random.random()
+                    # The user id keeps the scores distinct, the order of equal scores is not defined
+                    row[f'{platform}_score'] = (
+                        None if draw < 0.1 else 0 if draw < 0.2
+                        else base_score * 1000 + (SEED_DAYS - days_ago) * 7 + discord_id
+                    )
+                    row[f'{platform}_rank'] = random.randint(1, 9999)
+                row['thm_rooms'] = None if random.random() < 0.1 else random.randint(0, 5) * 1000 + discord_id
+                row['thm_rank'] = 5
+                db.add(DailyUserData(**row))
+        db.commit()
+    return crud_data
+
+
+def _per_user_organization_leaderboard(platform: str, date: date) -> list[dict]:
+    """
+    Helper function to build the organization leaderboard with a query per user, as it was before the single join
+    :param platform: str, platform to get the ranking from
+    :param date: datetime.date, date of the data to get
+    :return: list[dict], daily leaderboard of the organization members
+    """
+    from database.crud_user import get_active_users, get_user
+    from database.models import DailyUserData
+
+    score_key = f'{platform}_score' if platform in ['htb', 'rm'] else f'{platform}_rooms'
+    with DatabaseManager.get_session_local() as db:
+        profiles_ids: dict = {
+            user.discord_id: getattr(user, f'{platform}_id' if platform in ['htb', 'thm'] else f'{platform}_name')
+            for user in get_active_users()
+        }
+        daily_users: list = (
+            db.query(DailyUserData)
+            .filter(DailyUserData.date == date, DailyUserData.discord_id.in_(list(profiles_ids)))
+            .order_by(getattr(DailyUserData, score_key).desc())
+            .all()
+        )
+
+        organization_leaderboard: list[dict] = []
+        for daily_user in daily_users:
+            if not getattr(daily_user, score_key):
+                continue
+            old_data = db.query(DailyUserData).filter(
+                DailyUserData.discord_id == daily_user.discord_id,
+                DailyUserData.date == date - timedelta(days=30)
+            ).first()
+            if not old_data or not getattr(old_data, score_key):
+                old_data = (
+                    db.query(DailyUserData)
+                    .filter(DailyUserData.discord_id == daily_user.discord_id, getattr(DailyUserData, score_key) > 0)
+                    .order_by(DailyUserData.date)
+                    .first()
+                )
+            organization_leaderboard.append({
+                'username': get_user(discord_id=daily_user.discord_id).username,
+                'platform_rank': daily_users.index(daily_user) + 1,
+                'platform_score': getattr(daily_user, score_key),
+                'platform_global_rank': getattr(daily_user, f'{platform}_rank'),
+                'score_evolution': getattr(daily_user, score_key) - getattr(old_data, score_key) if old_data else 0,
+                'platform_id': profiles_ids.get(daily_user.discord_id)
+            })
+    return organization_leaderboard
+
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+@pytest.mark.parametrize('days_ago', range(0, 60, 3))
+def test_organization_leaderboard_matches_per_user_queries(crud_data, platform, days_ago):
+    leaderboard_date: date = SEED_TODAY - timedelta(days=days_ago)
+    expected_leaderboard: list[dict] = _per_user_organization_leaderboard(platform, leaderboard_date)
+    assert expected_leaderboard
+    assert crud_data._query_organization_leaderboard(platform, leaderboard_date) == expected_leaderboard
+
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_organization_leaderboard_is_empty_without_data(crud_data, platform):
+    assert crud_data._query_organization_leaderboard(platform, SEED_TODAY + timedelta(days=1)) == []
@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils import fetch_cache as fetch_cache_module
+from utils.fetch_cache import FetchCache
+
+
+class Fetcher:
+    """
+    Fake platform fetcher counting its calls, each call returns the next score
+    """
+
+    def __init__(self, data: dict | None = None, delay: float = 0):
+        self.data: dict | None = data
+        self.delay: float = delay
+        self.calls: int = 0
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        data: dict = dict(self.data) if self.data is not None else {'htb_score': self.calls}
+        await asyncio.sleep(self.delay)
+        return data
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """
+    Replace the monotonic clock of the fetch cache by a clock moved by the tests, the event loop keeps its own
+    :param monkeypatch: MonkeyPatch, automatically passed
+    :return: list[float], current time of the clock, as a single element to be modified
+    """
+    now: list[float] = [1000.0]
+    monkeypatch.setattr(fetch_cache_module, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_fetched_data_is_reused_until_the_ttl_expires(clock):
+    cache: FetchCache = FetchCache({'htb': 60}, max_entries=8)
+    fetch: Fetcher = Fetcher()
+
+    async def scenario() -> list[dict]:
+        results: list[dict] = [await cache.get('htb', 1, fetch)]
+        clock[0] += 59
+        results.append(await cache.get('htb', 1, fetch))
+        clock[0] += 2
+        results.append(await cache.get('htb', 1, fetch))
+        return results
+
+    assert asyncio.run(scenario()) == [{'htb_score': 1}, {'htb_score': 1}, {'htb_score': 2}]
+    assert (fetch.calls, cache.hits, cache.misses) == (2, 1, 2)
+
+
+def test_cached_data_is_copied(clock):
+    cache: FetchCache = FetchCache({'htb': 60}, max_entries=8)
+    fetch: Fetcher = Fetcher()
+
+    async def scenario() -> dict:
+        (await cache.get('htb', 1, fetch))['htb_score'] = 100
+        return await cache.get('htb', 1, fetch)
+
+    assert asyncio.run(scenario()) == {'htb_score': 1}
+
+
+def test_concurrent_fetches_of_a_key_are_coalesced(clock):
+    cache: FetchCache = FetchCache({'htb': 60}, max_entries=8)
+    fetch: Fetcher = Fetcher(delay=0.01)
+
+    async def scenario() -> list[dict]:
+        return list(await asyncio.gather(
+            *(cache.get('htb', 1, fetch) for _ in range(3)), cache.get('htb', 2, fetch)
+        ))
+
+    assert asyncio.run(scenario()) == [{'htb_score': 1}] * 3 + [{'htb_score': 2}]
+    assert (fetch.calls, cache.coalesced, cache.misses) == (2, 2, 2)
+    assert cache.stats()['in_flight'] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch(clock):
+    cache: FetchCache = FetchCache({'htb': 60}, max_entries=8)
+    fetch: Fetcher = Fetcher(delay=0.01)
+
+    async def scenario() -> dict:
+        cancelled: asyncio.Task = asyncio.ensure_future(cache.get('htb', 1, fetch))
+        waiting: asyncio.Task = asyncio.ensure_future(cache.get('htb', 1, fetch))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await waiting
+
+    assert asyncio.run(scenario()) == {'htb_score': 1}
+    assert cache.get_fetched_at('htb', 1) is not None
+
+
+@pytest.mark.parametrize('ttls, data', [({'htb': 60}, {}), ({'htb': 0}, None), ({}, None)])
+def test_failed_or_uncached_fetches_are_not_stored(clock, ttls, data):
+    cache: FetchCache = FetchCache(ttls, max_entries=8)
+    fetch: Fetcher = Fetcher(data)
+
+    async def scenario() -> None:
+        await cache.get('htb', 1, fetch)
+        await cache.get('htb', 1, fetch)
+
+    asyncio.run(scenario())
+    assert fetch.calls == 2
+    assert cache.get_fetched_at('htb', 1) is None
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache: FetchCache = FetchCache({'htb': 60}, max_entries=2)
+    fetch: Fetcher = Fetcher({'htb_score': 1})
+
+    async def scenario() -> None:
+        for platform_id in (1, 2, 1, 3):
+            await cache.get('htb', platform_id, fetch)
+
+    asyncio.run(scenario())
+    assert [cache.get_fetched_at('htb', platform_id) is not None for platform_id in (1, 2, 3)] == [True, False, True]
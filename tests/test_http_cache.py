@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.http_cache import HttpCache, NotModified
+
+URL: str = 'https://platform.test/profile/1'
+
+
+def _response(status_code: int, url: str = URL, headers: dict = None, **kwargs) -> httpx.Response:
+    """
+    Helper function to build a response of a platform
+    :param status_code: int, HTTP status code
+    :param url: str, requested URL
+    :param headers: dict, headers of the response
+    :return: httpx.Response, response bound to its request
+    """
+    return httpx.Response(status_code, headers=headers, request=httpx.Request('GET', url), **kwargs)
+
+
+@pytest.fixture
+def http_cache(tmp_path) -> HttpCache:
+    """
+    Open an empty HTTP cache in a temporary file
+    :param tmp_path: Path, temporary directory of the test
+    :return: HttpCache, opened cache
+    """
+    cache: HttpCache = HttpCache()
+    cache.open(str(tmp_path / 'http_cache.db'))
+    return cache
+
+
+def test_not_modified_response_returns_the_cached_data(http_cache):
+    http_cache.store(URL, _response(200, headers={'ETag': '"v1"'}), {'htb_score': 10})
+    assert http_cache.get_validators(URL) == {'If-None-Match': '"v1"'}
+
+    data: NotModified | None = http_cache.get_not_modified(URL, _response(304))
+    assert isinstance(data, NotModified) and data == {'htb_score': 10}
+    assert http_cache.get_not_modified(URL, _response(200)) is None
+    assert http_cache.stats() == {'not_modified': 1, 'modified': 1, 'entries': 1}
+
+
+def test_not_modified_response_without_cached_data_is_parsed(http_cache):
+    assert http_cache.get_validators(URL) == {}
+    assert http_cache.get_not_modified(URL, _response(304)) is None
+
+
+@pytest.mark.parametrize('headers, data', [({}, {'htb_score': 10}), ({'ETag': '"v1"'}, {})])
+def test_responses_without_validators_or_data_are_not_cached(http_cache, headers, data):
+    http_cache.store(URL, _response(200, headers=headers), data)
+    assert http_cache.get_validators(URL) == {}
+
+
+def test_flushed_entries_are_loaded_again(http_cache):
+    http_cache.store(URL, _response(200, headers={'Last-Modified': 'Wed, 01 May 2024 10:00:00 GMT'}), {'rm_score': 5})
+    assert http_cache.flush() == 1
+    assert http_cache.flush() == 0
+
+    reopened_cache: HttpCache = HttpCache()
+    reopened_cache.open(http_cache.path)
+    assert reopened_cache.get_validators(URL) == {'If-Modified-Since': 'Wed, 01 May 2024 10:00:00 GMT'}
+    assert reopened_cache.get_not_modified(URL, _response(304)) == {'rm_score': 5}
+
+
+@pytest.fixture
+def api(monkeypatch, http_cache):
+    """
+    Import the platform fetchers with a fresh HTTP cache, the requests are answered by the tests
+    :param monkeypatch: MonkeyPatch, automatically passed
+    :param http_cache: HttpCache, opened cache
+    :return: module, utils.api module
+    """
+    monkeypatch.setenv('RM_API_KEY', 'test')
+    from utils import api
+
+    monkeypatch.setattr(api, 'http_cache', http_cache)
+    return api
+
+
+def _answer(monkeypatch, api, responses: dict[str, httpx.Response]) -> None:
+    """
+    Helper function to answer the requests of the fetchers with the given responses
+    :param monkeypatch: MonkeyPatch, automatically passed
+    :param api: module, utils.api module
+    :param responses: dict[str, httpx.Response], response of each URL
+    :return: None
+    """
+    async def _get(platform: str, url: str, headers: dict | None = None) -> httpx.Response:
+        return responses[url]
+
+    monkeypatch.setattr(api, '_get', _get)
+
+
+def test_thm_rooms_unavailable_after_a_not_modified_rank(monkeypatch, api, http_cache):
+    rank_url: str = api.THM_API + 'user/rank/user1'
+    rooms_url: str = api.THM_API + 'no-completed-rooms-public/user1'
+    http_cache.store(rank_url, _response(200, rank_url, {'ETag': '"rank"'}), {'thm_rank': 42})
+    _answer(monkeypatch, api, {
+        rank_url: _response(304, rank_url),
+        rooms_url: _response(200, rooms_url, json=0),
+    })
+    assert asyncio.run(api._fetch_thm_data('user1')) == {}
+
+
+def test_thm_data_not_modified(monkeypatch, api, http_cache):
+    rank_url: str = api.THM_API + 'user/rank/user1'
+    rooms_url: str = api.THM_API + 'no-completed-rooms-public/user1'
+    http_cache.store(rank_url, _response(200, rank_url, {'ETag': '"rank"'}), {'thm_rank': 42})
+    http_cache.store(rooms_url, _response(200, rooms_url, {'ETag': '"rooms"'}), {'thm_rooms': 7})
+    _answer(monkeypatch, api, {rank_url: _response(304, rank_url), rooms_url: _response(304, rooms_url)})
+
+    data: dict = asyncio.run(api._fetch_thm_data('user1'))
+    assert isinstance(data, NotModified) and data == {'thm_rank': 42, 'thm_rooms': 7}
+
+    _answer(monkeypatch, api, {
+        rank_url: _response(304, rank_url),
+        rooms_url: _response(200, rooms_url, {'ETag': '"rooms2"'}, json=8),
+    })
+    data = asyncio.run(api._fetch_thm_data('user1'))
+    assert not isinstance(data, NotModified) and data == {'thm_rank': 42, 'thm_rooms': 8}
+    assert http_cache.get_validators(rooms_url) == {'If-None-Match': '"rooms2"'}
@@ -0,0 +1,127 @@
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+
+from database.manager import MIGRATIONS, DatabaseManager
+from database.models import (Base, DAILY_USER_DATA_TABLE, MONTHLY_USER_DATA_TABLE, PAGINATION_MESSAGES_TABLE,
+                             WEEKLY_USER_DATA_TABLE)
+
+LATEST_VERSION: int = MIGRATIONS[-1][0]
+ORGA_RANK_COLUMNS: tuple[str, ...] = ('htb_orga_rank_last', 'rm_orga_rank_last', 'thm_orga_rank_last')
+
+
+def _create_baseline_database(database_path: str) -> None:
+    """
+    Helper function to create a database as written before the migrations, with a user and a daily row
+    :param database_path: str, path of the database
+    :return: None
+    """
+    with sqlite3.connect(database_path) as connection:
+        connection.execute(
+            'CREATE TABLE users (discord_id INTEGER NOT NULL PRIMARY KEY, username VARCHAR, active INTEGER,'
+            ' birthday DATE, htb_id INTEGER, rm_id INTEGER, rm_name VARCHAR, thm_id VARCHAR)'
+        )
+        connection.execute(
+            'CREATE TABLE daily_user_data (date DATE NOT NULL, discord_id INTEGER NOT NULL, htb_rank INTEGER,'
+            ' htb_score INTEGER, rm_rank INTEGER, rm_score INTEGER, thm_rank INTEGER, thm_rooms INTEGER,'
+            ' PRIMARY KEY (date, discord_id))'
+        )
+        connection.execute("INSERT INTO users (discord_id, username, active) VALUES (1, 'user1', 1)")
+        connection.execute(
+            "INSERT INTO daily_user_data (date, discord_id, htb_score, rm_score, thm_rooms) "
+            "VALUES ('2024-05-01', 1, 100, 200, 3)"
+        )
+    connection.close()
+
+
+def _create_version_3_database(database_path: str) -> None:
+    """
+    Helper function to create a database at version 3, before the organization rank aggregates and the snapshot date
+    :param database_path: str, path of the database
+    :return: None
+    """
+    engine = create_engine(f'sqlite:///{database_path}')
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for table in (WEEKLY_USER_DATA_TABLE, MONTHLY_USER_DATA_TABLE):
+            for column in ORGA_RANK_COLUMNS:
+                connection.exec_driver_sql(f'ALTER TABLE {table} DROP COLUMN {column}')
+            connection.exec_driver_sql(
+                f"INSERT INTO {table} (period_start, discord_id, htb_score_last) VALUES ('2024-01-01', 1, 100)"
+            )
+        connection.exec_driver_sql(f'ALTER TABLE {PAGINATION_MESSAGES_TABLE} DROP COLUMN snapshot_date')
+        connection.exec_driver_sql('PRAGMA user_version = 3')
+    engine.dispose()
+
+
+def _get_columns(table: str) -> set[str]:
+    """
+    Helper function to get the columns of a table of the current database
+    :param table: str, name of the table
+    :return: set[str], names of the columns
+    """
+    with DatabaseManager._engine.connect() as connection:
+        return {column_info[1] for column_info in connection.exec_driver_sql(f'PRAGMA table_info({table})')}
+
+
+def _get_indexes(table: str) -> set[str]:
+    """
+    Helper function to get the indexes of a table of the current database
+    :param table: str, name of the table
+    :return: set[str], names of the indexes
+    """
+    with DatabaseManager._engine.connect() as connection:
+        return {index_info[1] for index_info in connection.exec_driver_sql(f'PRAGMA index_list({table})')}
+
+
+def test_migrations_are_ordered():
+    versions: list[int] = [version for version, _, _ in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_new_database_is_at_the_latest_version(database_factory):
+    database_factory()
+    assert DatabaseManager.get_schema_version() == LATEST_VERSION
+
+
+def test_baseline_database_is_migrated_to_the_latest_version(database_factory):
+    database_factory(prepare=_create_baseline_database)
+    from database import crud_data
+
+    assert DatabaseManager.get_schema_version() == LATEST_VERSION
+    assert {
+        'ix_daily_user_data_discord_id_date', 'ix_daily_user_data_date_htb_score',
+        'ix_daily_user_data_date_rm_score', 'ix_daily_user_data_date_thm_rooms',
+    } <= _get_indexes(DAILY_USER_DATA_TABLE)
+    assert set(crud_data.FETCH_STATE_COLUMNS) <= _get_columns(DAILY_USER_DATA_TABLE)
+    with DatabaseManager._engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2
+    daily_user = crud_data.get_data(1, date(2024, 5, 1))
+    assert (daily_user.htb_score, daily_user.rm_score, daily_user.thm_rooms) == (100, 200, 3)
+
+
+def test_version_3_database_gets_the_missing_columns(database_factory):
+    database_factory(prepare=_create_version_3_database)
+    from database.models import WeeklyUserData
+
+    assert DatabaseManager.get_schema_version() == LATEST_VERSION
+    for table in (WEEKLY_USER_DATA_TABLE, MONTHLY_USER_DATA_TABLE):
+        assert set(ORGA_RANK_COLUMNS) <= _get_columns(table)
+    assert 'snapshot_date' in _get_columns(PAGINATION_MESSAGES_TABLE)
+    with DatabaseManager.get_session_local() as db:
+        weekly_user: WeeklyUserData = db.get(WeeklyUserData, (date(2024, 1, 1), 1))
+        assert (weekly_user.htb_score_last, weekly_user.htb_orga_rank_last) == (100, None)
+
+
+@pytest.mark.parametrize('prepare', [_create_baseline_database, _create_version_3_database])
+def test_migrations_can_run_again(database_factory, prepare):
+    database_factory(prepare=prepare)
+    columns: dict[str, set[str]] = {table: _get_columns(table) for table in Base.metadata.tables}
+
+    with DatabaseManager._engine.begin() as connection:
+        connection.exec_driver_sql('PRAGMA user_version = 0')
+    DatabaseManager.migrate()
+    assert DatabaseManager.get_schema_version() == LATEST_VERSION
+    assert {table: _get_columns(table) for table in Base.metadata.tables} == columns
@@ -0,0 +1,146 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from database.manager import DatabaseManager
+
+SEED_USERS: int = 20
+SEED_DAYS: int = 200
+SEED_TODAY: date = date(2026, 10, 16)
+
+
+def _seed_history(storage_mode: str) -> None:
+    """
+    Helper function to store a history of rarely changing scores with the organization ranks of every day
+    :param storage_mode: str, storage mode the rows are written in
+    :return: None
+    """
+    from database import crud_data
+    from database.models import User
+
+    random.seed(3)
+    with DatabaseManager.get_session_local() as db:
+        for discord_id in range(SEED_USERS):
+            db.add(User(discord_id=discord_id, username=f'u{discord_id}', active=1, htb_id=discord_id))
+        db.commit()
+    scores: dict[int, int] = {discord_id: random.randint(1, 100) for discord_id in range(SEED_USERS)}
+    for days_ago in range(SEED_DAYS, -1, -1):
+        day: date = SEED_TODAY - timedelta(days=days_ago)
+        for discord_id in scores:
+            # Most users don't progress for weeks, so their weeks only hold organization ranks in 'changes' mode
+            if random.random() < 0.02:
+                scores[discord_id] += random.randint(1, 50)
+        crud_data.upsert_data([
+            {'date': day, 'discord_id': discord_id, 'htb_score': score, 'htb_rank': 10_000 - score}
+            for discord_id, score in scores.items()
+        ])
+        crud_data.update_organization_ranks(day)
+    assert DatabaseManager.get_storage_mode() == storage_mode
+
+
+@pytest.mark.parametrize('storage_mode', ['daily', 'changes'])
+def test_rollup_keeps_every_member_on_past_leaderboards(database_factory, storage_mode):
+    database_factory(storage_mode)
+    _seed_history(storage_mode)
+    from database import crud_data, retention
+    from database.cache import leaderboard_cache
+
+    board_date: date = SEED_TODAY - timedelta(days=45)
+    members_before: set[str] = {
+        user['username'] for user in crud_data._query_organization_leaderboard('htb', board_date)
+    }
+    assert len(members_before) == SEED_USERS
+
+    assert retention.rollup_daily_data(SEED_TODAY - timedelta(days=31))
+    assert retention.rollup_weekly_data(SEED_TODAY - timedelta(days=90))
+    leaderboard_cache.invalidate()
+
+    snapshot_date: date = crud_data.get_snapshot_date(board_date)
+    assert retention.get_rolled_up_period(board_date) == (retention.WeeklyUserData, snapshot_date)
+    assert {
+        user['username'] for user in crud_data._query_organization_leaderboard('htb', snapshot_date)
+    } == members_before
+    monthly_date: date = SEED_TODAY - timedelta(days=150)
+    monthly_period = retention.get_rolled_up_period(monthly_date)
+    assert monthly_period[0] is retention.MonthlyUserData
+    assert len(crud_data._query_organization_leaderboard('htb', monthly_period[1])) == SEED_USERS
+
+
+@pytest.mark.parametrize('storage_mode', ['daily', 'changes'])
+def test_rollup_keeps_the_organization_ranks(database_factory, storage_mode):
+    database_factory(storage_mode)
+    _seed_history(storage_mode)
+    from database import crud_data, retention
+
+    rank_date: date = SEED_TODAY - timedelta(days=60)
+    week_end: date = rank_date - timedelta(days=rank_date.weekday()) + timedelta(days=6)
+    ranks_before: dict[int, dict] = {
+        discord_id: crud_data.get_organization_rank(discord_id, week_end) for discord_id in range(SEED_USERS)
+    }
+
+    retention.rollup_daily_data(SEED_TODAY - timedelta(days=31))
+    assert {
+        discord_id: crud_data.get_organization_rank(discord_id, rank_date) for discord_id in range(SEED_USERS)
+    } == ranks_before
+
+
+def _count_rows(model) -> tuple[int, date | None]:
+    """
+    Helper function to count the rows of a table and get its first date
+    :param model: type, model of the table, with a date or a period_start column
+    :return: tuple[int, date | None], number of rows and first date, None if empty
+    """
+    date_column = model.date if hasattr(model, 'date') else model.period_start
+    with DatabaseManager.get_session_local() as db:
+        return tuple(db.execute(select(func.count(), func.min(date_column))).one())
+
+
+@pytest.mark.parametrize('storage_mode', ['daily', 'changes'])
+def test_apply_retention_downsamples_the_history(database_factory, monkeypatch, storage_mode):
+    database_factory(storage_mode)
+    _seed_history(storage_mode)
+    from database import retention
+    from database.models import DailyOrgRank, DailyUserData, MonthlyUserData, WeeklyUserData
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None) -> datetime:
+            return datetime.combine(SEED_TODAY, time(12), tz)
+
+    monkeypatch.setattr(retention, 'datetime', FrozenDatetime)
+    daily_boundary: date = retention._week_start(SEED_TODAY - timedelta(days=retention.MIN_DAILY_RETENTION_DAYS))
+    weekly_boundary: date = retention._month_start(SEED_TODAY - timedelta(days=90))
+    # The last day of each week keeps its score once the daily data is rolled up
+    week_ends: list[date] = [
+        week_start + timedelta(days=6)
+        for week_start in (daily_boundary - timedelta(weeks=weeks) for weeks in range(1, 8))
+    ]
+    scores_before: dict[tuple, int | None] = {
+        (discord_id, day): retention.get_score_on_date(discord_id, 'htb', day)
+        for discord_id in range(SEED_USERS) for day in (*week_ends, SEED_TODAY)
+    }
+    rows_before: tuple[int, date] = _count_rows(DailyUserData)
+
+    retention.apply_retention(None, None)
+    assert _count_rows(DailyUserData) == rows_before
+    assert _count_rows(WeeklyUserData) == (0, None)
+
+    retention.apply_retention(10, 90)
+    daily_rows, first_daily_date = _count_rows(DailyUserData)
+    assert storage_mode == 'changes' or first_daily_date == daily_boundary
+    assert _count_rows(DailyOrgRank)[1] == daily_boundary
+    weekly_rows, first_week_start = _count_rows(WeeklyUserData)
+    assert first_week_start >= weekly_boundary and weekly_rows
+    monthly_rows, first_month_start = _count_rows(MonthlyUserData)
+    assert first_month_start == retention._month_start(SEED_TODAY - timedelta(days=SEED_DAYS)) and monthly_rows
+    assert {
+        (discord_id, day): retention.get_score_on_date(discord_id, 'htb', day)
+        for discord_id in range(SEED_USERS) for day in (*week_ends, SEED_TODAY)
+    } == scores_before
+
+    retention.apply_retention(10, 90)
+    assert (_count_rows(DailyUserData), _count_rows(WeeklyUserData), _count_rows(MonthlyUserData)) == (
+        (daily_rows, first_daily_date), (weekly_rows, first_week_start), (monthly_rows, first_month_start)
+    )
@@ -0,0 +1,155 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event, func, select
+
+from database.manager import DatabaseManager
+
+SEED_USERS: int = 450
+SEED_TODAY: date = date(2024, 5, 1)
+
+
+@pytest.fixture
+def inserts(database_factory) -> list[int]:
+    """
+    Create a database counting the rows of each INSERT statement sent to its daily_user_data table
+    :param database_factory: Callable[..., DatabaseManager], function creating a database
+    :return: list[int], number of rows of each statement, in execution order
+    """
+    database_factory()
+    statements: list[int] = []
+
+    def _count_insert(connection, cursor, statement: str, parameters, context, executemany: bool) -> None:
+        if statement.startswith('INSERT INTO daily_user_data'):
+            statements.append(statement.count('(?, ?') or 1)
+
+    event.listen(DatabaseManager._engine, 'before_cursor_execute', _count_insert)
+    yield statements
+    event.remove(DatabaseManager._engine, 'before_cursor_execute', _count_insert)
+
+
+def _count_rows() -> int:
+    """
+    Helper function to count the daily rows of the current database
+    :return: int, number of daily rows
+    """
+    from database.models import DailyUserData
+
+    with DatabaseManager.get_session_local() as db:
+        return db.execute(select(func.count()).select_from(DailyUserData)).scalar()
+
+
+def _add_users() -> None:
+    """
+    Helper function to store an active user per daily row
+    :return: None
+    """
+    from database.models import User
+
+    with DatabaseManager.get_session_local() as db:
+        db.add_all(
+            User(discord_id=discord_id, username=f'user{discord_id}', active=1, htb_id=discord_id)
+            for discord_id in range(SEED_USERS)
+        )
+        db.commit()
+
+
+def _scores(day: date, htb_score: int = 100) -> list[dict]:
+    """
+    Helper function to build a daily row per user
+    :param day: date, date of the rows
+    :param htb_score: int, HackTheBox score of every user
+    :return: list[dict], rows to upsert
+    """
+    return [
+        {'date': day, 'discord_id': discord_id, 'htb_score': htb_score + discord_id, 'htb_rank': discord_id + 1}
+        for discord_id in range(SEED_USERS)
+    ]
+
+
+def test_upsert_is_written_by_chunks(inserts):
+    from database import crud_data
+
+    assert crud_data.upsert_data(_scores(SEED_TODAY)) == SEED_USERS
+    chunk_size: int = crud_data.UPSERT_CHUNK_SIZE
+    assert inserts == [chunk_size, chunk_size, SEED_USERS % chunk_size]
+    assert _count_rows() == SEED_USERS
+
+
+def test_upsert_only_updates_the_given_columns(database_factory):
+    database_factory()
+    from database import crud_data
+
+    crud_data.upsert_data(_scores(SEED_TODAY))
+    crud_data.upsert_data([
+        {'date': SEED_TODAY, 'discord_id': discord_id, 'rm_score': discord_id} for discord_id in range(SEED_USERS)
+    ])
+    assert _count_rows() == SEED_USERS
+    daily_user = crud_data.get_data(7, SEED_TODAY)
+    assert (daily_user.htb_score, daily_user.htb_rank, daily_user.rm_score) == (107, 8, 7)
+
+
+def test_upsert_completes_new_rows_with_the_latest_values(database_factory):
+    database_factory()
+    from database import crud_data
+
+    crud_data.upsert_data(_scores(SEED_TODAY - timedelta(days=1)))
+    crud_data.upsert_data([{'date': SEED_TODAY, 'discord_id': 3, 'rm_score': 50, 'rm_rank': 9}])
+    daily_user = crud_data.get_data(3, SEED_TODAY)
+    assert (daily_user.htb_score, daily_user.htb_rank, daily_user.rm_score) == (103, 4, 50)
+
+
+def test_changes_mode_skips_the_unchanged_rows(database_factory):
+    database_factory('changes')
+    from database import crud_data
+
+    crud_data.upsert_data(_scores(SEED_TODAY - timedelta(days=2)))
+    crud_data.upsert_data(_scores(SEED_TODAY - timedelta(days=1)))
+    rows: list[dict] = _scores(SEED_TODAY)
+    rows[5]['htb_score'] += 10
+    rows[6]['htb_fetched_at'] = datetime(2024, 5, 1, 12)
+    rows[6]['htb_fetch_status'] = crud_data.FETCH_STATUS_OK
+    assert crud_data.upsert_data(rows) == SEED_USERS
+
+    assert _count_rows() == SEED_USERS + 1
+    assert crud_data.get_data(5, SEED_TODAY).htb_score == 115
+    unchanged_user = crud_data.get_data(6, SEED_TODAY)
+    assert unchanged_user.date == SEED_TODAY - timedelta(days=2)
+    assert (unchanged_user.htb_score, unchanged_user.htb_fetch_status) == (106, crud_data.FETCH_STATUS_OK)
+
+
+def test_compaction_keeps_the_history(database_factory):
+    database_factory()
+    from database import crud_data, storage
+
+    _add_users()
+    for days_ago in range(5, -1, -1):
+        crud_data.upsert_data(_scores(SEED_TODAY - timedelta(days=days_ago), htb_score=100 + days_ago // 2 * 1000))
+    leaderboards: list[list[dict]] = [
+        crud_data._query_organization_leaderboard('htb', SEED_TODAY - timedelta(days=days_ago))
+        for days_ago in range(5)
+    ]
+    assert all(len(leaderboard) == SEED_USERS for leaderboard in leaderboards)
+
+    assert storage.compact_daily_data() == 3 * SEED_USERS
+    assert storage.compact_daily_data() == 0
+    DatabaseManager._storage_mode = 'changes'
+    crud_data.leaderboard_cache.invalidate()
+    snapshot_dates: list[date] = [
+        crud_data.get_snapshot_date(SEED_TODAY - timedelta(days=days_ago)) for days_ago in range(5)
+    ]
+    assert [
+        crud_data._query_organization_leaderboard('htb', snapshot_date) for snapshot_date in snapshot_dates
+    ] == leaderboards
+
+
+def test_update_data_writes_the_buffered_update_first(database_factory):
+    database_factory()
+    from database import crud_data
+
+    crud_data.daily_data_buffer.add(1, {'htb_score': 5, 'rm_score': 7})
+    daily_user = crud_data.update_data(1, {'htb_score': 10})
+    assert (daily_user.htb_score, daily_user.rm_score) == (10, 7)
+    assert crud_data.daily_data_buffer.get_pending(1) == {}
+    crud_data.daily_data_buffer.flush()
+    assert crud_data.get_data(1).htb_score == 10
@@ -1,32 +1,112 @@
 import logging
-from asyncio import sleep
+from functools import partial
 
+import httpx
 from dotenv import load_dotenv
-from requests import get, Response, RequestException
 
-from utils.env_checker import get_rm_api_key
+from utils.env_checker import get_fetch_cache_ttls, get_rm_api_key
+from utils.fetch_cache import FetchCache
+from utils.http_cache import NotModified, http_cache
+from utils.rate_limiter import RATE_LIMITERS, TokenBucket
 
 logger = logging.getLogger(__name__)
 load_dotenv()
 
 HTB_API: str = 'https://www.hackthebox.com/api/v4/profile/'
 RM_API: str = 'https://api.www.root-me.org/auteurs/'
+RM_WEBSITE: str = 'https://www.root-me.org/'
 THM_API: str = 'https://tryhackme.com/api/'
 RM_API_KEY: str = get_rm_api_key()
-SLEEP_API_REQUEST: float = 0.1
+MAX_RATE_LIMITED_RETRIES: int = 2
 HEADERS: dict = {'User-Agent': 'HackerRanker/1.0'}
+FETCH_CACHE_MAX_ENTRIES: int = 1024
+
+HTTP_TIMEOUT: httpx.Timeout = httpx.Timeout(connect=5.0, read=15.0, write=5.0, pool=30.0)
+HTTP_LIMITS: httpx.Limits = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=120.0)
+HOST_COOKIES: dict[str, dict] = {
+    'api.www.root-me.org': {'api_key': RM_API_KEY},
+    'www.root-me.org': {'api_key': RM_API_KEY},
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+fetch_cache: FetchCache = FetchCache(get_fetch_cache_ttls(), FETCH_CACHE_MAX_ENTRIES)
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """
+    Get the pooled HTTP client of the host of the given URL, create it on first use
+    Each platform host gets its own keep-alive connection pool, HTTP/2 is negotiated when the host supports it
+    :param url: str, URL to request
+    :return: httpx.AsyncClient, client bound to the host of the URL
+    """
+    host: str = httpx.URL(url).host
+    client: httpx.AsyncClient | None = _clients.get(host)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=True,
+            headers=HEADERS,
+            cookies=HOST_COOKIES.get(host),
+            timeout=HTTP_TIMEOUT,
+            limits=HTTP_LIMITS,
+        )
+        _clients[host] = client
+        logger.debug(f'HTTP client created for {host}')
+    return client
+
+
+async def aclose_clients() -> None:
+    """
+    Close the pooled HTTP clients of every host, to be called when the bot shuts down
+    :return: None
+    """
+    while _clients:
+        host, client = _clients.popitem()
+        await client.aclose()
+        logger.debug(f'HTTP client closed for {host}')
+
+
+async def _get(platform: str, url: str, headers: dict | None = None) -> httpx.Response:
+    """
+    Send a GET request paced by the rate limiter of the platform
+    The limiter adapts to the rate limit headers, a 429 is retried once the platform allows it
+    :param platform: str, platform of the request, key of RATE_LIMITERS
+    :param url: str, URL to request
+    :param headers: dict | None, additional headers of the request, like the conditional request headers
+    :return: httpx.Response, response of the platform
+    """
+    limiter: TokenBucket = RATE_LIMITERS[platform]
+    for _ in range(MAX_RATE_LIMITED_RETRIES + 1):
+        await limiter.acquire()
+        response: httpx.Response = await get_client(url).get(url, headers=headers)
+        limiter.update_from_response(response.status_code, response.headers)
+        if response.status_code != 429:
+            break
+    return response
 
 
 async def get_htb_data(htb_id: int) -> dict:
     """
-    Get the HackTheBox data of a user
-    https://documenter.getpostman.com/view/13129365/TVeqbmeq#a52f369b-eeca-4271-b50c-bc6b00ff0469
+    Get the HackTheBox data of a user, reused from the fetch cache if it was fetched recently
     :param htb_id: int, HackTheBox user ID
     :return: dict, HackTheBox data {'htb_rank': int, 'htb_score': int}
     """
+    return await fetch_cache.get('htb', htb_id, partial(_fetch_htb_data, htb_id))
+
+
+async def _fetch_htb_data(htb_id: int) -> dict:
+    """
+    Fetch the HackTheBox data of a user, with a conditional request if its last response is in the HTTP cache
+    https://documenter.getpostman.com/view/13129365/TVeqbmeq#a52f369b-eeca-4271-b50c-bc6b00ff0469
+    :param htb_id: int, HackTheBox user ID
+    :return: dict, HackTheBox data {'htb_rank': int, 'htb_score': int}, NotModified if it didn't change
+    """
+    url: str = HTB_API + str(htb_id)
     try:
-        await sleep(SLEEP_API_REQUEST)
-        response: Response = get(HTB_API + str(htb_id), headers=HEADERS)
+        response: httpx.Response = await _get('htb', url, http_cache.get_validators(url))
+        not_modified: NotModified | None = http_cache.get_not_modified(url, response)
+        if not_modified is not None:
+            logger.debug(f'HTB data not modified for {htb_id}')
+            return not_modified
         response.raise_for_status()
         data = response.json()
         if 'profile' not in data:
@@ -36,77 +116,148 @@ async def get_htb_data(htb_id: int) -> dict:
             htb_rank: int = int(data['profile']['ranking']) if data['profile']['ranking'] else 0
             htb_score: int = int(data['profile']['points'])
             logger.debug(f'HTB data retrieved for {htb_id}: {htb_rank}, {htb_score}')
-            return {'htb_rank': htb_rank, 'htb_score': htb_score}
-    except RequestException as e:
+            htb_data: dict = {'htb_rank': htb_rank, 'htb_score': htb_score}
+            http_cache.store(url, response, htb_data)
+            return htb_data
+    except (httpx.HTTPError, ValueError) as e:
         logger.warning(f'Couldn\'t get HTB data for {htb_id}. Error: {e}')
         return {}
 
 
-async def get_rm_data(rm_id: int, fast_mode: bool = False) -> dict:
+def _is_rm_name_of(rm_name: str, rm_nom: str, rm_id: int) -> bool:
     """
-    Get the RootMe data of a user
+    Check if a stored RootMe profile name was resolved from the given RootMe nickname
+    :param rm_name: str, stored RootMe profile name
+    :param rm_nom: str, RootMe nickname returned by the API
+    :param rm_id: int, RootMe user ID
+    :return: bool, True if the stored profile name can be reused
+    """
+    rm_slug: str = rm_nom.replace(' ', '-')
+    return rm_name in (f'{rm_slug}-{rm_id}', rm_slug, f'?{rm_slug}')
+
+
+async def _resolve_rm_name(rm_nom: str, rm_id: int) -> str:
+    """
+    Resolve the RootMe profile name of a user by trying the possible profile URLs
+    :param rm_nom: str, RootMe nickname returned by the API
+    :param rm_id: int, RootMe user ID
+    :return: str, RootMe profile name, prefixed by '?' if no profile page was found
+    """
+    rm_name: str = rm_nom.replace(' ', '-') + '-' + str(rm_id)
+    response: httpx.Response = await _get('rm', RM_WEBSITE + rm_name)
+    if response.status_code == 404:
+        rm_name: str = '-'.join(rm_name.split('-')[:-1])
+        response: httpx.Response = await _get('rm', RM_WEBSITE + rm_name)
+        if response.status_code == 404:
+            rm_name: str = f'?{rm_name}'
+    logger.debug(f'RM profile name resolved for {rm_id}: {rm_name}')
+    return rm_name
+
+
+async def _fetch_rm_author(rm_id: int) -> dict:
+    """
+    Fetch the RootMe API data of a user, only the fields used by the bot are kept
+    The request is conditional if the last response of the user is in the HTTP cache
     https://www.root-me.org/fr/breve/API-api-www-root-me-org
     :param rm_id: int, RootMe user ID
-    :param fast_mode: bool, if True, reduce delay between requests
-    :return: dict, RootMe data {'rm_rank': int, 'rm_score': int}
+    :return: dict, RootMe API data {'nom': str, 'score': str, 'position': str}, NotModified if it didn't change
     """
-    retry_delay: float = 0.5 if fast_mode else 5
+    url: str = RM_API + str(rm_id)
     try:
-        rm_data: dict = {}
-        cookies: dict = {'api_key': RM_API_KEY}
-        await sleep(retry_delay)
-        response: Response = get(RM_API + str(rm_id), headers=HEADERS, cookies=cookies)
+        response: httpx.Response = await _get('rm', url, http_cache.get_validators(url))
+        not_modified: NotModified | None = http_cache.get_not_modified(url, response)
+        if not_modified is not None:
+            logger.debug(f'RM data not modified for {rm_id}')
+            return not_modified
         data = response.json()
-        if 'score' not in data:
-            logger.warning(f'Couldn\'t get RM data for {rm_id}. Error: {data}')
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f'Couldn\'t get RM data for {rm_id}. Error: {e}')
+        return {}
+    if not isinstance(data, dict) or 'score' not in data:
+        logger.warning(f'Couldn\'t get RM data for {rm_id}. Error: {data}')
+        return {}
+    rm_author: dict = {'nom': data.get('nom'), 'score': data['score'], 'position': data.get('position')}
+    http_cache.store(url, response, rm_author)
+    return rm_author
+
+
+async def get_rm_data(rm_id: int, fast_mode: bool = False, rm_name: str | None = None) -> dict:
+    """
+    Get the RootMe data of a user
+    The profile name is only resolved when no stored one is given or when the RootMe nickname changed
+    The RootMe API response is reused from the fetch cache if it was fetched recently
+    :param rm_id: int, RootMe user ID
+    :param fast_mode: bool, if True, skip the resolution of the RootMe profile name
+    :param rm_name: str | None, stored RootMe profile name of the user, reused if still valid
+    :return: dict, RootMe data {'rm_rank': int, 'rm_score': int, 'rm_name': str}, NotModified if it didn't change
+    """
+    try:
+        data: dict = await fetch_cache.get('rm', rm_id, partial(_fetch_rm_author, rm_id))
+        rm_data: dict = NotModified() if isinstance(data, NotModified) else {}
+        if not data:
             return {}
         else:
             rm_data['rm_rank']: int = int(data['position']) if data['position'] else 0
             rm_data['rm_score']: int = int(data['score'])
             if not fast_mode:
-                rm_name: str = data['nom'].replace(' ', '-') + '-' + str(rm_id)
-                await sleep(retry_delay)
-                response: Response = get(f'https://www.root-me.org/{rm_name}', headers=HEADERS, cookies=cookies)
-                if response.status_code == 404:
-                    rm_name: str = '-'.join(rm_name.split('-')[:-1])
-                    await sleep(retry_delay)
-                    response: Response = get(f'https://www.root-me.org/{rm_name}', headers=HEADERS, cookies=cookies)
-                    if response.status_code == 404:
-                        rm_name: str = f'?{rm_name}'
-                rm_data['rm_name']: str = rm_name
+                if rm_name and _is_rm_name_of(rm_name, data['nom'], rm_id):
+                    rm_data['rm_name']: str = rm_name
+                else:
+                    rm_data['rm_name']: str = await _resolve_rm_name(data['nom'], rm_id)
             logger.debug(
                 f'RM data retrieved for {rm_id}: {rm_data["rm_rank"]}, {rm_data["rm_score"]}'
             )
             return rm_data
-    except RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
         logger.warning(f'Couldn\'t get RM score for {rm_id}. Error: {e}')
         return {}
 
 
 async def get_thm_data(thm_id: str) -> dict:
     """
-    Get the TryHackMe data of a user
-    https://www.postman.com/gnarlito/workspace/tryhackme-doc/documentation/18269560-b1c3d2f3-f378-4291-9025-1a9fa88a24e0
+    Get the TryHackMe data of a user, reused from the fetch cache if it was fetched recently
     :param thm_id: str, TryHackMe user ID
     :return: dict, TryHackMe data {'thm_rank': int, 'thm_rooms': int}
     """
+    return await fetch_cache.get('thm', thm_id, partial(_fetch_thm_data, thm_id))
+
+
+async def _fetch_thm_data(thm_id: str) -> dict:
+    """
+    Fetch the TryHackMe data of a user, with conditional requests if its last responses are in the HTTP cache
+    https://www.postman.com/gnarlito/workspace/tryhackme-doc/documentation/18269560-b1c3d2f3-f378-4291-9025-1a9fa88a24e0
+    :param thm_id: str, TryHackMe user ID
+    :return: dict, TryHackMe data {'thm_rank': int, 'thm_rooms': int}, NotModified if it didn't change
+    """
+    rank_url: str = THM_API + 'user/rank/' + thm_id
+    rooms_url: str = THM_API + 'no-completed-rooms-public/' + thm_id
     try:
-        response: Response = get(THM_API + 'user/rank/' + thm_id, headers=HEADERS)
-        await sleep(SLEEP_API_REQUEST)
-        response.raise_for_status()
-        data_rank = response.json()
-        response: Response = get(THM_API + 'no-completed-rooms-public/' + thm_id, headers=HEADERS)
-        await sleep(SLEEP_API_REQUEST)
-        response.raise_for_status()
-        data_rooms = response.json()
-        if 'userRank' not in data_rank or int(data_rooms) == 0:
-            logger.warning(f'Couldn\'t get THM data for {thm_id}. Error: {data_rank} {data_rooms}')
-            return {}
-        else:
-            thm_rank: int = int(data_rank['userRank'])
-            thm_rooms: int = int(data_rooms)
-            logger.debug(f'THM data retrieved for {thm_id}: {thm_rank}, {thm_rooms}')
-            return {'thm_rank': thm_rank, 'thm_rooms': thm_rooms}
-    except RequestException as e:
+        response: httpx.Response = await _get('thm', rank_url, http_cache.get_validators(rank_url))
+        rank_data: dict | None = http_cache.get_not_modified(rank_url, response)
+        if rank_data is None:
+            response.raise_for_status()
+            data_rank = response.json()
+            if 'userRank' not in data_rank:
+                logger.warning(f'Couldn\'t get THM data for {thm_id}. Error: {data_rank}')
+                return {}
+            rank_data = {'thm_rank': int(data_rank['userRank'])}
+            http_cache.store(rank_url, response, rank_data)
+
+        response: httpx.Response = await _get('thm', rooms_url, http_cache.get_validators(rooms_url))
+        rooms_data: dict | None = http_cache.get_not_modified(rooms_url, response)
+        if rooms_data is None:
+            response.raise_for_status()
+            data_rooms = response.json()
+            if int(data_rooms) == 0:
+                logger.warning(f'Couldn\'t get THM data for {thm_id}. Error: {rank_data} {data_rooms}')
+                return {}
+            rooms_data = {'thm_rooms': int(data_rooms)}
+            http_cache.store(rooms_url, response, rooms_data)
+
+        logger.debug(f'THM data retrieved for {thm_id}: {rank_data["thm_rank"]}, {rooms_data["thm_rooms"]}')
+        if isinstance(rank_data, NotModified) and isinstance(rooms_data, NotModified):
+            return NotModified(rank_data, **rooms_data)
+        return {**rank_data, **rooms_data}
+    except (httpx.HTTPError, ValueError) as e:
         logger.warning(f'Couldn\'t get THM data for {thm_id}. Error: {e}')
         return {}
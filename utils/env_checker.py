@@ -134,6 +134,186 @@ def get_database_path() -> str:
     return database_path
 
 
+def get_storage_profile() -> dict:
+    """
+    Retrieve the SQLite storage profile from the environment variables.
+    Every variable is optional, the defaults of the database manager are used for the missing ones.
+    :return: dict, storage profile
+    """
+    storage_profile: dict = {}
+
+    journal_mode: str | None = os.environ.get('SQLITE_JOURNAL_MODE')
+    if journal_mode:
+        if journal_mode.upper() not in ['WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY']:
+            raise ValueError('SQLITE_JOURNAL_MODE is not a valid journal mode.')
+        storage_profile['journal_mode'] = journal_mode.upper()
+
+    synchronous: str | None = os.environ.get('SQLITE_SYNCHRONOUS')
+    if synchronous:
+        if synchronous.upper() not in ['OFF', 'NORMAL', 'FULL', 'EXTRA']:
+            raise ValueError('SQLITE_SYNCHRONOUS is not a valid synchronous mode.')
+        storage_profile['synchronous'] = synchronous.upper()
+
+    for key, env_var in [
+        ('cache_size', 'SQLITE_CACHE_SIZE'), ('mmap_size', 'SQLITE_MMAP_SIZE'), ('busy_timeout', 'SQLITE_BUSY_TIMEOUT')
+    ]:
+        value_str: str | None = os.environ.get(env_var)
+        if value_str:
+            try:
+                storage_profile[key] = int(value_str)
+            except ValueError:
+                raise ValueError(f'{env_var} is not a valid integer.')
+
+    logger.debug(f'Storage profile retrieved: {storage_profile}')
+    return storage_profile
+
+
+def get_score_matrix_directory() -> str | None:
+    """
+    Retrieve the directory where the score matrices are persisted, kept in memory only if not set.
+    :return: str | None, score matrix directory
+    """
+    score_matrix_directory: str | None = os.environ.get('SCORE_MATRIX_DIRECTORY')
+    logger.debug(f'Score matrix directory retrieved: {score_matrix_directory}')
+    return score_matrix_directory
+
+
+def get_data_storage_mode() -> str:
+    """
+    Retrieve the storage mode of the daily data from the environment variables (default: daily).
+    :return: str, 'daily' to store a row per user and day, 'changes' to store a row only when a value changes
+    """
+    storage_mode: str = os.environ.get('DATA_STORAGE_MODE', 'daily').lower()
+    if storage_mode not in ['daily', 'changes']:
+        raise ValueError('DATA_STORAGE_MODE must be either daily or changes.')
+    logger.debug(f'Data storage mode retrieved: {storage_mode}')
+    return storage_mode
+
+
+def get_database_backup_path() -> str | None:
+    """
+    Retrieve the database backup path from the environment variables, backups are disabled if not set.
+    :return: str | None, database backup path
+    """
+    database_backup_path: str | None = os.environ.get('DATABASE_BACKUP_PATH')
+    logger.debug(f'Database backup path retrieved: {database_backup_path}')
+    return database_backup_path
+
+
+def get_database_maintenance_interval() -> int:
+    """
+    Retrieve the interval between two database maintenances from the environment variables (default: 24).
+    :return: int, maintenance interval in hours
+    """
+    maintenance_interval_str: str = os.environ.get('DATABASE_MAINTENANCE_INTERVAL', '24')
+    try:
+        maintenance_interval: int = int(maintenance_interval_str)
+        logger.debug(f'Database maintenance interval retrieved: {maintenance_interval} hours')
+        return maintenance_interval
+    except ValueError:
+        raise ValueError('DATABASE_MAINTENANCE_INTERVAL is not a valid integer.')
+
+
+def _get_optional_days(env_var: str, minimum: int = 1) -> int | None:
+    """
+    Retrieve an optional number of days from the environment variables.
+    :param env_var: str, name of the environment variable
+    :param minimum: int, lowest accepted number of days
+    :return: int | None, number of days or None if not set
+    """
+    days_str: str | None = os.environ.get(env_var)
+    if not days_str:
+        return None
+    try:
+        days: int = int(days_str)
+    except ValueError:
+        raise ValueError(f'{env_var} is not a valid integer.')
+    if days < minimum:
+        raise ValueError(f'{env_var} must be at least {minimum} days.')
+    logger.debug(f'{env_var} retrieved: {days} days')
+    return days
+
+
+def get_data_retention_days() -> int | None:
+    """
+    Retrieve the number of days the daily data is kept before being rolled up into weeks, disabled if not set.
+    At least 31 days are required to keep the score evolution of the leaderboard.
+    :return: int | None, daily data retention in days
+    """
+    return _get_optional_days('DATA_RETENTION_DAYS', minimum=31)
+
+
+def get_weekly_retention_days() -> int | None:
+    """
+    Retrieve the number of days the weekly data is kept before being rolled up into months, disabled if not set.
+    :return: int | None, weekly data retention in days
+    """
+    return _get_optional_days('WEEKLY_RETENTION_DAYS')
+
+
+def get_profile_fetch_deadline() -> float:
+    """
+    Retrieve the number of seconds /profile and /update wait for the platforms (default: 5).
+    :return: float, fetch deadline in seconds
+    """
+    deadline_str: str = os.environ.get('PROFILE_FETCH_DEADLINE', '5')
+    try:
+        deadline: float = float(deadline_str)
+    except ValueError:
+        raise ValueError('PROFILE_FETCH_DEADLINE is not a valid number.')
+    if deadline <= 0:
+        raise ValueError('PROFILE_FETCH_DEADLINE must be a positive number of seconds.')
+    logger.debug(f'Profile fetch deadline retrieved: {deadline} seconds')
+    return deadline
+
+
+def get_profile_max_age() -> int:
+    """
+    Retrieve the age in minutes after which /profile refreshes the stored data of a platform (default: 15).
+    :return: int, maximum age of the displayed data in minutes
+    """
+    max_age_str: str = os.environ.get('PROFILE_MAX_AGE', '15')
+    try:
+        max_age: int = int(max_age_str)
+    except ValueError:
+        raise ValueError('PROFILE_MAX_AGE is not a valid integer.')
+    if max_age < 0:
+        raise ValueError('PROFILE_MAX_AGE must be a non-negative number of minutes.')
+    logger.debug(f'Profile max age retrieved: {max_age} minutes')
+    return max_age
+
+
+def get_fetch_cache_ttls() -> dict[str, float]:
+    """
+    Retrieve the time in seconds the data fetched from each platform is reused from the environment variables.
+    Defaults: 60 seconds for HackTheBox and TryHackMe, 120 seconds for RootMe, 0 disables the cache of a platform.
+    :return: dict[str, float], TTL of each platform
+    """
+    fetch_cache_ttls: dict[str, float] = {'htb': 60.0, 'rm': 120.0, 'thm': 60.0}
+    for platform in fetch_cache_ttls:
+        env_var: str = f'FETCH_CACHE_TTL_{platform.upper()}'
+        ttl_str: str | None = os.environ.get(env_var)
+        if ttl_str:
+            try:
+                fetch_cache_ttls[platform] = float(ttl_str)
+            except ValueError:
+                raise ValueError(f'{env_var} is not a valid number.')
+    logger.debug(f'Fetch cache TTLs retrieved: {fetch_cache_ttls}')
+    return fetch_cache_ttls
+
+
+def get_http_cache_path(database_path: str) -> str:
+    """
+    Retrieve the path of the HTTP cache file from the environment variables.
+    Defaults to a file next to the database, named after it.
+    :param database_path: str, database path
+    :return: str, HTTP cache path
+    """
+    http_cache_path: str = os.environ.get('HTTP_CACHE_PATH') or os.path.splitext(database_path)[0] + '_http_cache.db'
+    logger.debug(f'HTTP cache path retrieved: {http_cache_path}')
+    return http_cache_path
+
+
 def get_update_interval() -> int:
     """
     Retrieve the update interval from the environment variables.
@@ -0,0 +1,92 @@
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class FetchCache:
+    """
+    LRU cache of the data fetched from the platforms, keyed by (platform, id), each platform having its own TTL.
+    Concurrent callers of a key being fetched share the same request (single-flight).
+    Failed fetches, returning an empty dict, are not cached.
+    """
+
+    def __init__(self, ttls: dict[str, float], max_entries: int):
+        self.ttls: dict[str, float] = ttls
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0
+        self._entries: OrderedDict[tuple[str, Hashable], tuple[float, dict, datetime]] = OrderedDict()
+        self._in_flight: dict[tuple[str, Hashable], asyncio.Future] = {}
+
+    async def get(self, platform: str, platform_id: Hashable, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Get the data of an ID on a platform from the cache, or fetch it if missing or expired
+        The shared request keeps running if a caller is cancelled, so the other callers still get its result.
+        :param platform: str, platform of the data
+        :param platform_id: Hashable, ID of the user on the platform
+        :param fetch: Callable[[], Awaitable[dict]], fetcher of the data, returning an empty dict on failure
+        :return: dict, copy of the data, empty if the fetch failed
+        """
+        key: tuple[str, Hashable] = (platform, platform_id)
+        entry: tuple[float, dict, datetime] | None = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.copy(entry[1])
+
+        in_flight: asyncio.Future | None = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            in_flight = asyncio.ensure_future(fetch())
+            in_flight.add_done_callback(lambda task: self._store(key, task))
+            self._in_flight[key] = in_flight
+        return copy.copy(await asyncio.shield(in_flight))
+
+    def get_fetched_at(self, platform: str, platform_id: Hashable) -> datetime | None:
+        """
+        Get the time the cached data of an ID on a platform was fetched, which can be up to the TTL of the platform ago
+        :param platform: str, platform of the data
+        :param platform_id: Hashable, ID of the user on the platform
+        :return: datetime | None, fetch time of the cached data, None if it isn't cached
+        """
+        entry: tuple[float, dict, datetime] | None = self._entries.get((platform, platform_id))
+        return entry[2] if entry is not None else None
+
+    def _store(self, key: tuple[str, Hashable], task: asyncio.Future) -> None:
+        """
+        Helper function to cache the result of a finished fetch, evicting the least recently used entries
+        :param key: tuple[str, Hashable], (platform, id) of the fetch
+        :param task: asyncio.Future, finished fetch
+        :return: None
+        """
+        self._in_flight.pop(key, None)
+        ttl: float = self.ttls.get(key[0], 0)
+        if task.cancelled() or task.exception() is not None or not task.result() or ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + ttl, task.result(), datetime.now())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache
+        :return: dict, {'hits': int, 'misses': int, 'coalesced': int, 'entries': int, 'in_flight': int}
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._entries),
+            'in_flight': len(self._in_flight),
+        }
@@ -0,0 +1,152 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_MAX_AGE_DAYS: int = 30
+
+
+class NotModified(dict):
+    """
+    Data of a platform returned unchanged by a conditional request (304 Not Modified).
+    It holds the data parsed from the last full response, so it can be used like any other fetched data.
+    """
+
+
+class HttpCache:
+    """
+    Persistent cache of the validators (ETag, Last-Modified) of the platform responses and of the data parsed from them.
+    Entries are kept in memory and written to a small SQLite file, separate from the main database, by flush.
+    Entries not refreshed for HTTP_CACHE_MAX_AGE_DAYS are dropped when the cache is opened.
+    """
+
+    def __init__(self):
+        self.path: str | None = None
+        self.not_modified: int = 0
+        self.modified: int = 0
+        self._entries: dict[str, tuple[str | None, str | None, dict, float]] = {}
+        self._dirty: dict[str, tuple[str | None, str | None, dict, float]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def open(self, path: str) -> None:
+        """
+        Create the cache file if needed and load its entries
+        :param path: str, path of the SQLite file of the cache
+        :return: None
+        """
+        with sqlite3.connect(path) as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS http_cache ('
+                'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, data TEXT NOT NULL, stored_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'DELETE FROM http_cache WHERE stored_at < ?', (time.time() - HTTP_CACHE_MAX_AGE_DAYS * 86400,)
+            )
+            rows: list[tuple] = connection.execute(
+                'SELECT url, etag, last_modified, data, stored_at FROM http_cache'
+            ).fetchall()
+        connection.close()
+        self._entries = {
+            url: (etag, last_modified, json.loads(data), stored_at)
+            for url, etag, last_modified, data, stored_at in rows
+        }
+        self.path = path
+        logger.info(f'HTTP cache opened: {len(self._entries)} entries loaded from {path}')
+
+    def get_validators(self, url: str) -> dict:
+        """
+        Get the headers making a request conditional on the last response cached for the URL
+        :param url: str, URL to request
+        :return: dict, If-None-Match and If-Modified-Since headers, empty if nothing is cached
+        """
+        entry: tuple | None = self._entries.get(url)
+        if entry is None:
+            return {}
+        etag, last_modified, _, _ = entry
+        headers: dict = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def get_not_modified(self, url: str, response: httpx.Response) -> NotModified | None:
+        """
+        Get the cached data of a URL if the platform answered that it didn't change
+        :param url: str, requested URL
+        :param response: httpx.Response, response of the platform
+        :return: NotModified | None, cached data or None if the response must be parsed
+        """
+        entry: tuple | None = self._entries.get(url)
+        if response.status_code != 304 or entry is None:
+            return None
+        self.not_modified += 1
+        self._set(url, (entry[0], entry[1], entry[2], time.time()))
+        return NotModified(entry[2])
+
+    def store(self, url: str, response: httpx.Response, data: dict) -> None:
+        """
+        Cache the data parsed from a full response, if the platform sent validators with it
+        :param url: str, requested URL
+        :param response: httpx.Response, response of the platform
+        :param data: dict, data parsed from the response
+        :return: None
+        """
+        self.modified += 1
+        etag: str | None = response.headers.get('ETag')
+        last_modified: str | None = response.headers.get('Last-Modified')
+        if self.path is None or not data or not (etag or last_modified):
+            return
+        self._set(url, (etag, last_modified, data, time.time()))
+
+    def _set(self, url: str, entry: tuple[str | None, str | None, dict, float]) -> None:
+        """
+        Helper function to update an entry in memory and mark it to be written by the next flush
+        :param url: str, URL of the entry
+        :param entry: tuple[str | None, str | None, dict, float], (etag, last_modified, data, stored_at)
+        :return: None
+        """
+        with self._lock:
+            self._entries[url] = entry
+            self._dirty[url] = entry
+
+    def flush(self) -> int:
+        """
+        Write the entries updated since the last flush to the cache file, blocking, to be run in a thread
+        :return: int, number of entries written
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty or self.path is None:
+            return 0
+        try:
+            with sqlite3.connect(self.path) as connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO http_cache (url, etag, last_modified, data, stored_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(url, etag, last_modified, json.dumps(data), stored_at)
+                     for url, (etag, last_modified, data, stored_at) in dirty.items()]
+                )
+            connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f'Couldn\'t flush the HTTP cache to {self.path}. Error: {e}')
+            with self._lock:
+                self._dirty = {**dirty, **self._dirty}
+            return 0
+        logger.debug(f'HTTP cache flushed: {len(dirty)} entries written, {self.stats()}')
+        return len(dirty)
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the cache
+        :return: dict, {'not_modified': int, 'modified': int, 'entries': int}
+        """
+        return {'not_modified': self.not_modified, 'modified': self.modified, 'entries': len(self._entries)}
+
+
+http_cache: HttpCache = HttpCache()
@@ -0,0 +1,175 @@
+import logging
+import time
+from asyncio import Lock, sleep
+from email.utils import parsedate_to_datetime
+from typing import Mapping
+
+logger = logging.getLogger(__name__)
+
+EPOCH_THRESHOLD: float = 1e9
+
+
+def _parse_float(value: str | None) -> float | None:
+    """
+    Parse a header value as a float
+    :param value: str | None, header value
+    :return: float | None, parsed value or None if missing or invalid
+    """
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date
+    :param value: str | None, header value
+    :return: float | None, delay to wait in seconds
+    """
+    if value is None:
+        return None
+    delay: float | None = _parse_float(value)
+    if delay is None:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(delay, 0.0)
+
+
+def parse_rate_limit_reset(value: str | None) -> float | None:
+    """
+    Parse a X-RateLimit-Reset header, given either as a delay in seconds or as an epoch timestamp
+    :param value: str | None, header value
+    :return: float | None, delay until the reset in seconds
+    """
+    reset: float | None = _parse_float(value)
+    if reset is None:
+        return None
+    if reset > EPOCH_THRESHOLD:
+        reset -= time.time()
+    return max(reset, 0.0)
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate of a platform.
+    The rate adapts to the platform answers: it is halved on 429 and follows the X-RateLimit-* headers
+    when the platform sends them, without exceeding its nominal value. It is restored once the window passed.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int, min_rate: float = 0.05):
+        self.name: str = name
+        self.nominal_rate: float = rate
+        self.rate: float = rate
+        self.min_rate: float = min_rate
+        self.capacity: int = capacity
+        self.tokens: float = capacity
+        self.blocked_until: float = 0.0
+        self.limited_until: float = 0.0
+        self.waiting: int = 0
+        self._updated_at: float = time.monotonic()
+        self._lock: Lock = Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of requests waiting for a token
+        :return: int, queue depth
+        """
+        return self.waiting
+
+    def _refill(self, now: float) -> None:
+        """
+        Add the tokens earned since the last refill
+        :param now: float, current monotonic time
+        :return: None
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self.rate != self.nominal_rate and now >= self.limited_until:
+            self.rate = self.nominal_rate
+
+    def _limit(self, rate: float, window: float) -> None:
+        """
+        Lower the rate until the end of the rate limit window of the platform
+        :param rate: float, new rate, clamped between the minimal and the nominal rates
+        :param window: float, delay until the end of the window in seconds
+        :return: None
+        """
+        now: float = time.monotonic()
+        self._refill(now)
+        self.rate = min(self.nominal_rate, max(self.min_rate, rate))
+        self.limited_until = now + window
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and consume it, waiters are served in arrival order
+        :return: None
+        """
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now: float = time.monotonic()
+                    self._refill(now)
+                    delay: float = self.blocked_until - now
+                    if delay <= 0 and self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await sleep(delay if delay > 0 else (1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+    def block(self, delay: float) -> None:
+        """
+        Stop handing out tokens for the given delay
+        :param delay: float, delay in seconds
+        :return: None
+        """
+        now: float = time.monotonic()
+        self._refill(now)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + delay)
+
+    def update_from_response(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """
+        Adapt the rate to a platform answer
+        :param status_code: int, HTTP status code of the response
+        :param headers: Mapping[str, str], headers of the response (case-insensitive)
+        :return: None
+        """
+        retry_after: float | None = parse_retry_after(headers.get('Retry-After'))
+        remaining: float | None = _parse_float(headers.get('X-RateLimit-Remaining'))
+        reset: float | None = parse_rate_limit_reset(headers.get('X-RateLimit-Reset'))
+        self._refill(time.monotonic())
+
+        if status_code == 429:
+            rate: float = self.rate / 2
+            delay: float = retry_after if retry_after is not None else reset if reset else 1 / max(self.min_rate, rate)
+            self.block(delay)
+            self._limit(rate, reset if reset else delay)
+            logger.warning(f'{self.name} rate limited, waiting {delay:.1f}s, rate lowered to {self.rate:.2f} req/s')
+        elif remaining is not None and reset:
+            if remaining < 1:
+                self.block(reset)
+            self._limit(remaining / reset, reset)
+        elif retry_after is not None:
+            self.block(retry_after)
+
+    def stats(self) -> dict:
+        """
+        Get the current state of the bucket
+        :return: dict, {'rate': float, 'tokens': float, 'queue_depth': int}
+        """
+        return {'rate': self.rate, 'tokens': self.tokens, 'queue_depth': self.queue_depth}
+
+
+# RootMe documents no limit, it starts at the former pacing of a request every 5 seconds
+# and follows the X-RateLimit-* headers when the API sends them
+RATE_LIMITERS: dict[str, TokenBucket] = {
+    'htb': TokenBucket('HTB', rate=10, capacity=5),
+    'rm': TokenBucket('RM', rate=0.2, capacity=1),
+    'thm': TokenBucket('THM', rate=10, capacity=5),
+}
@@ -1,46 +1,235 @@
-from database.crud_data import update_data
-from database.crud_user import deactivate_user, activate_user, delete_user, \
-    update_user
+import logging
+from asyncio import Semaphore, Task, ensure_future, gather, sleep, to_thread, wait
+from datetime import date, datetime
+from typing import Awaitable
+
+from database.aio import deactivate_user, activate_user, delete_user, update_user, update_data, \
+    update_organization_ranks, upsert_data, flush_daily_data_buffer, refresh_score_matrices, get_discord_ids_with_data
+from database.cache import leaderboard_cache
+from database.crud_data import SCORE_KEYS, FETCH_STATE_COLUMNS, FETCH_STATUS_OK, FETCH_STATUS_FAILED, \
+    FETCH_STATUS_TIMEOUT
 from database.models import User, DailyUserData
-from utils.api import get_htb_data, get_rm_data, get_thm_data
+from utils.api import fetch_cache, get_htb_data, get_rm_data, get_thm_data
+from utils.http_cache import NotModified, http_cache
+from utils.rate_limiter import RATE_LIMITERS
+from utils.statistics import movers, overall_leaderboard
+
+logger = logging.getLogger(__name__)
+
+DATA_FETCHERS: dict = {'htb': get_htb_data, 'rm': get_rm_data, 'thm': get_thm_data}
+PLATFORM_CONCURRENCY: dict[str, int] = {'htb': 5, 'rm': 1, 'thm': 5}
+# The update cycle only skips the platforms fetched within this share of its interval, so the fetches of the
+# previous cycle are always stale and only the ones made since by /profile or /update are skipped
+CYCLE_MAX_AGE_RATIO: float = 0.5
+FAILED_FETCH_RETRY_DELAY: float = 10.0
 
 
-async def update_daily_data(user: User) -> DailyUserData:
+class DataFreshness:
     """
-    Update the daily datas of a user by fetching it from the APIs
-    :param user: User, user to update
-    :return: DailyUserData, updated daily data
+    Time of the last successful fetch and outcome of the last fetch of each user on each platform,
+    used to skip the fetches of fresh data and to retry the failed ones.
+    It mirrors the fetch states stored with the daily data, loaded at startup so it survives a restart.
     """
-    if not any([user.htb_id, user.rm_id, user.thm_id]):
-        return user
 
-    daily_data: dict = {}
+    def __init__(self):
+        self._fetch_states: dict[tuple[int, str], tuple[datetime | None, str | None]] = {}
+
+    def load(self, fetch_states: dict[int, dict]) -> None:
+        """
+        Load the fetch states stored with the latest daily data of the users
+        :param fetch_states: dict[int, dict], fetch state columns of each user, from get_fetch_states
+        :return: None
+        """
+        for discord_id, fetch_state in fetch_states.items():
+            for platform in SCORE_KEYS:
+                fetched_at: datetime | None = fetch_state.get(f'{platform}_fetched_at')
+                fetch_status: str | None = fetch_state.get(f'{platform}_fetch_status')
+                if fetched_at or fetch_status:
+                    self._fetch_states[(discord_id, platform)] = (fetched_at, fetch_status)
+        logger.info(f'Fetch states loaded for {len(fetch_states)} users')
+
+    def record(self, discord_id: int, platforms_data: dict[str, dict | None], platform_ids: dict) -> dict:
+        """
+        Record the outcome of the fetches of a user
+        The data served by the fetch cache keeps the time it was actually fetched.
+        :param discord_id: int, discord id of the user
+        :param platforms_data: dict[str, dict | None], data of each platform, empty if the fetch failed,
+        None if it missed the deadline
+        :param platform_ids: dict, ID of the user on each fetched platform
+        :return: dict, fetch state columns to store with the daily data of the user
+        """
+        now: datetime = datetime.now()
+        fetch_state: dict = {}
+        for platform, platform_data in platforms_data.items():
+            if platform_data:
+                fetched_at: datetime = fetch_cache.get_fetched_at(platform, platform_ids[platform]) or now
+                self._fetch_states[(discord_id, platform)] = (fetched_at, FETCH_STATUS_OK)
+                fetch_state[f'{platform}_fetched_at'] = fetched_at
+                fetch_state[f'{platform}_fetch_status'] = FETCH_STATUS_OK
+            else:
+                fetch_status: str = FETCH_STATUS_FAILED if platform_data is not None else FETCH_STATUS_TIMEOUT
+                fetched_at: datetime | None = self._fetch_states.get((discord_id, platform), (None, None))[0]
+                self._fetch_states[(discord_id, platform)] = (fetched_at, fetch_status)
+                fetch_state[f'{platform}_fetch_status'] = fetch_status
+        return fetch_state
+
+    def is_fresh(self, discord_id: int, platform: str, max_age: float) -> bool:
+        """
+        Check if the data of a user on a platform was fetched recently and its last fetch didn't fail
+        :param discord_id: int, discord id of the user
+        :param platform: str, platform of the data
+        :param max_age: float, maximum age of the data in seconds
+        :return: bool, True if the data was fetched less than max_age seconds ago
+        """
+        fetched_at, fetch_status = self._fetch_states.get((discord_id, platform), (None, None))
+        return (
+            fetch_status == FETCH_STATUS_OK and fetched_at is not None
+            and (datetime.now() - fetched_at).total_seconds() <= max_age
+        )
+
+
+data_freshness: DataFreshness = DataFreshness()
+
+
+async def _fetch_platform_data(platform: str, user: User, semaphores: dict[str, Semaphore] | None) -> dict:
+    """
+    Fetch the data of a user on a platform, waiting for a free slot of the platform if semaphores are given
+    :param platform: str, platform to fetch the data from
+    :param user: User, user to fetch the data of
+    :param semaphores: dict[str, Semaphore] | None, concurrency limit of each platform
+    :return: dict, platform data
+    """
+    user_id: int | str = getattr(user, f'{platform}_id')
+    kwargs: dict = {'rm_name': user.rm_name} if platform == 'rm' else {}
+    if semaphores is None:
+        return await DATA_FETCHERS[platform](user_id, **kwargs)
+    async with semaphores[platform]:
+        return await DATA_FETCHERS[platform](user_id, **kwargs)
+
+
+async def fetch_with_deadline(fetches: dict[str, Awaitable[dict]], deadline: float) -> dict[str, dict | None]:
+    """
+    Fetch several platforms concurrently, waiting at most the deadline for all of them
+    The fetches still running at the deadline are cancelled.
+    :param fetches: dict[str, Awaitable[dict]], fetch of each platform
+    :param deadline: float, maximum time to wait in seconds
+    :return: dict[str, dict | None], data of each platform, empty if the fetch failed, None if it missed the deadline
+    """
+    tasks: dict[str, Task] = {platform: ensure_future(fetch) for platform, fetch in fetches.items()}
+    if not tasks:
+        return {}
+    _, pending = await wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    platforms_data: dict[str, dict | None] = {}
+    for platform, task in tasks.items():
+        if task in pending:
+            logger.warning(f'{platform} data not fetched within the {deadline}s deadline')
+            platforms_data[platform] = None
+        elif task.exception() is not None:
+            logger.error(f'Couldn\'t fetch {platform} data. Error: {task.exception()}')
+            platforms_data[platform] = {}
+        else:
+            platforms_data[platform] = task.result()
+    return platforms_data
+
+
+async def fetch_daily_data(
+        user: User,
+        semaphores: dict[str, Semaphore] | None = None,
+        platforms: list[str] | None = None
+) -> dict | None:
+    """
+    Fetch the daily datas of a user from the APIs, the platforms of the user are fetched concurrently
+    The RootMe profile name of the user is updated if it changed, the fetch state of each platform is recorded
+    :param user: User, user to fetch the data of
+    :param semaphores: dict[str, Semaphore] | None, concurrency limit of each platform
+    :param platforms: list[str] | None, platforms to fetch, every platform of the user by default
+    :return: dict | None, fetched daily data with the fetch states, NotModified if no platform changed,
+    None if the user has no platform ID
+    """
     user_ids: dict = {'htb': user.htb_id, 'rm': user.rm_id, 'thm': user.thm_id}
-    data_fetchers: dict = {'htb': get_htb_data, 'rm': get_rm_data, 'thm': get_thm_data}
+    platforms = [platform for platform in (platforms or user_ids) if user_ids[platform]]
+    if not platforms:
+        return None
+
+    daily_data: dict = {}
+    platforms_data: list[dict] = await gather(
+        *(_fetch_platform_data(platform, user, semaphores) for platform in platforms)
+    )
+    for platform_data in platforms_data:
+        daily_data.update(platform_data)
+    daily_data.update(data_freshness.record(user.discord_id, dict(zip(platforms, platforms_data)), user_ids))
 
-    for platform, user_id in user_ids.items():
-        if user_id:
-            daily_data.update(await data_fetchers[platform](user_id))
-            if platform == 'rm':
-                user_data: dict = {'rm_name': daily_data.pop('rm_name')}
-                update_user(user, user_data)
+    rm_name: str | None = daily_data.pop('rm_name', None)
+    if rm_name and rm_name != user.rm_name:
+        await update_user(user, {'rm_name': rm_name})
+
+    if all(isinstance(platform_data, NotModified) for platform_data in platforms_data):
+        return NotModified(daily_data)
+    return daily_data
+
+
+async def _fetch_stale_daily_data(user: User, semaphores: dict[str, Semaphore], max_age: float) -> dict | None:
+    """
+    Fetch the platforms of a user not fetched successfully for max_age seconds, the failed ones are retried once
+    :param user: User, user to fetch the data of
+    :param semaphores: dict[str, Semaphore], concurrency limit of each platform
+    :param max_age: float, age in seconds after which the data of a platform is fetched again
+    :return: dict | None, fetched daily data, NotModified if no platform changed, None if every platform is fresh
+    """
+    platforms: list[str] = [
+        platform for platform in DATA_FETCHERS
+        if getattr(user, f'{platform}_id') and not data_freshness.is_fresh(user.discord_id, platform, max_age)
+    ]
+    if not platforms:
+        return None
+    daily_data: dict = await fetch_daily_data(user, semaphores, platforms)
 
-    return update_data(user.discord_id, daily_data)
+    failed_platforms: list[str] = [
+        platform for platform in platforms if daily_data.get(f'{platform}_fetch_status') != FETCH_STATUS_OK
+    ]
+    if not failed_platforms:
+        return daily_data
+    await sleep(FAILED_FETCH_RETRY_DELAY)
+    logger.debug(f'Retrying {", ".join(failed_platforms)} data of {user.discord_id}')
+    return {**daily_data, **await fetch_daily_data(user, semaphores, failed_platforms)}
+
+
+async def update_daily_data(user: User, semaphores: dict[str, Semaphore] | None = None) -> DailyUserData:
+    """
+    Update the daily datas of a user by fetching it from the APIs
+    :param user: User, user to update
+    :param semaphores: dict[str, Semaphore] | None, concurrency limit of each platform
+    :return: DailyUserData, updated daily data
+    """
+    daily_data: dict | None = await fetch_daily_data(user, semaphores)
+    if daily_data is None:
+        return user
+    return await update_data(user.discord_id, daily_data)
 
 
 async def update_all_daily_data(
         members_id: list[int],
         users: list[User],
         users_deactivated: list[User],
-        dev_mode: bool
-) -> None:
+        dev_mode: bool,
+        max_age: float = 0
+) -> int:
     """
     Update the daily datas of all users
+    Users are processed concurrently, each platform having its own concurrency limit (PLATFORM_CONCURRENCY)
+    so a slow platform doesn't hold back the others
+    The platforms fetched successfully less than max_age seconds ago are skipped, the failed ones are retried once.
+    The users whose platforms all answered 304 Not Modified and who already have a row today only get their fetch
+    states written.
     :param members_id: list[int], all members ids
     :param users: list[User], all users
     :param users_deactivated: list[User], all deactivated users
     :param dev_mode: bool, dev mode
-    :return: None
+    :param max_age: float, age in seconds after which the data of a platform is fetched again
+    :return: int, number of users successfully updated
     """
 
     if not dev_mode:
@@ -48,17 +237,57 @@ async def update_all_daily_data(
         for user in users:
             if not any([user.htb_id, user.rm_id, user.thm_id]):
                 users.remove(user)
-                delete_user(user)
+                await delete_user(user)
         # Remove users that are not in the server anymore
         for user in users:
             if user.discord_id not in members_id:
                 users.remove(user)
-                deactivate_user(user)
+                await deactivate_user(user)
         # Check if deactivated users are back in the server
         for user in users_deactivated:
             if user.discord_id in members_id:
                 users.append(user)
-                activate_user(user)
+                await activate_user(user)
+
+    await flush_daily_data_buffer()
+    semaphores: dict[str, Semaphore] = {
+        platform: Semaphore(limit) for platform, limit in PLATFORM_CONCURRENCY.items()
+    }
+    results: list = await gather(
+        *(_fetch_stale_daily_data(user, semaphores, max_age) for user in users), return_exceptions=True
+    )
+
+    today: date = datetime.now().date()
+    discord_ids_with_data: set[int] = await get_discord_ids_with_data(today)
+    daily_data_rows: list[dict] = []
+    fresh_users: int = 0
+    failed_users: int = 0
+    not_modified_users: int = 0
+    for user, result in zip(users, results):
+        if isinstance(result, Exception):
+            failed_users += 1
+            logger.error(f'Couldn\'t update daily data of {user.discord_id}. Error: {result}')
+        elif result is None:
+            fresh_users += any([user.htb_id, user.rm_id, user.thm_id])
+        else:
+            if isinstance(result, NotModified) and user.discord_id in discord_ids_with_data:
+                not_modified_users += 1
+                result = {column: value for column, value in result.items() if column in FETCH_STATE_COLUMNS}
+            daily_data_rows.append({'date': today, 'discord_id': user.discord_id, **result})
+    logger.info(
+        f'Daily data of {fresh_users} users still fresh and {failed_users} users failed, skipped.'
+        f' {not_modified_users} users not modified since their last fetch, only their fetch states written.'
+    )
+    updated_users: int = await upsert_data(daily_data_rows)
+    await to_thread(http_cache.flush)
+    await update_organization_ranks()
+    await refresh_score_matrices()
+    movers.refresh(users)
+    overall_leaderboard.refresh(users)
 
-    for user in users:
-        await update_daily_data(user)
+    logger.debug(f'Leaderboard cache after the cycle: {leaderboard_cache.stats()}')
+    logger.debug(f'Fetch cache after the cycle: {fetch_cache.stats()}')
+    logger.debug(f'HTTP cache after the cycle: {http_cache.stats()}')
+    for platform, limiter in RATE_LIMITERS.items():
+        logger.debug(f'{platform} rate limiter after the cycle: {limiter.stats()}')
+    return updated_users
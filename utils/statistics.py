@@ -0,0 +1,187 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from database.models import User
+from database.score_matrix import ScoreMatrix, score_matrices, SCORE_MATRIX_DAYS
+
+logger = logging.getLogger(__name__)
+
+MOVERS_WINDOWS: tuple[int, ...] = (1, 7, 30)
+MAX_MOVERS_WINDOW: int = SCORE_MATRIX_DAYS - 1
+PLATFORMS: tuple[str, ...] = ('htb', 'rm', 'thm')
+OVERALL_EVOLUTION_DAYS: int = 30
+
+
+def _build_movers(
+        matrix: ScoreMatrix, days: int, usernames: dict[int, str], date: datetime.date = None
+) -> list[dict]:
+    """
+    Helper function to build the list of the members who progressed the most over the last days
+    :param matrix: ScoreMatrix, score matrix of the platform
+    :param days: int, size of the window in days
+    :param usernames: dict[int, str], usernames of the active members by discord id
+    :param date: datetime.date, last day of the window, the last day of the score matrix by default
+    :return: list[dict], movers sorted by progress, empty if the date is not in the score matrix
+    """
+    days_ago: int = max((matrix.end_date - date).days, 0) if date else 0
+    if days_ago >= matrix.scores.shape[1]:
+        return []
+    latest_scores: dict[int, float] = dict(zip(
+        matrix.discord_ids.tolist(), matrix.scores[:, matrix.scores.shape[1] - 1 - days_ago].tolist()
+    ))
+    return [
+        {
+            'username': usernames[discord_id],
+            'platform_rank': index + 1,
+            'platform_score': int(latest_scores[discord_id]),
+            'score_evolution': gain,
+        }
+        for index, (discord_id, gain) in enumerate(
+            matrix.top_gainers(days, discord_ids=set(usernames), days_ago=days_ago)
+        )
+    ]
+
+
+class Movers:
+    """
+    Members who progressed the most on each platform.
+    The usual windows are computed at the end of each update cycle, the other ones on demand from the score matrix.
+    """
+
+    def __init__(self, windows: tuple[int, ...]):
+        self.windows: tuple[int, ...] = windows
+        self._usernames: dict[int, str] = {}
+        self._movers: dict[tuple[str, int], list[dict]] = {}
+        self.date: datetime.date | None = None
+
+    def refresh(self, users: list[User]) -> None:
+        """
+        Compute the movers of the usual windows from the current score matrices
+        :param users: list[User], active members
+        :return: None
+        """
+        usernames: dict[int, str] = {user.discord_id: user.username for user in users}
+        computed_movers: dict[tuple[str, int], list[dict]] = {}
+        for platform in PLATFORMS:
+            matrix: ScoreMatrix | None = score_matrices.get(platform)
+            if matrix is None:
+                continue
+            for days in self.windows:
+                computed_movers[(platform, days)] = _build_movers(matrix, days, usernames)
+        self._usernames, self._movers = usernames, computed_movers
+        self.date = datetime.now().date()
+        logger.debug(f'Movers refreshed for {len(usernames)} members and the windows {self.windows}')
+
+    def get(self, platform: str, days: int, date: datetime.date = None) -> list[dict]:
+        """
+        Get the members who progressed the most over the last days, shared and not to be modified
+        Movers of a window ending before the last refresh are computed on demand from the score matrix.
+        :param platform: str, platform of the scores
+        :param days: int, size of the window in days, between 1 and MAX_MOVERS_WINDOW
+        :param date: datetime.date, last day of the window, the last refresh by default
+        :return: list[dict], movers sorted by progress
+        """
+        if date is None or date == self.date:
+            movers_list: list[dict] | None = self._movers.get((platform, days))
+            if movers_list is not None:
+                return movers_list
+        matrix: ScoreMatrix | None = score_matrices.get(platform)
+        return _build_movers(matrix, days, self._usernames, date) if matrix is not None else []
+
+
+def _percentiles(scores: np.ndarray) -> np.ndarray:
+    """
+    Helper function to normalize scores as their percentile inside the organization
+    The percentile of a member is the share of the members with a positive score who don't score more than them,
+    members without a positive score get 0.
+    :param scores: np.ndarray, score of each member, NaN if unknown
+    :return: np.ndarray, percentile of each member between 0 and 100
+    """
+    scores = np.nan_to_num(scores, nan=0.0)
+    positive_scores: np.ndarray = np.sort(scores[scores > 0])
+    if not len(positive_scores):
+        return np.zeros(len(scores))
+    percentiles: np.ndarray = 100 * np.searchsorted(positive_scores, scores, side='right') / len(positive_scores)
+    return np.where(scores > 0, percentiles, 0.0)
+
+
+def _build_overall_leaderboard(usernames: dict[int, str], date: datetime.date = None) -> list[dict]:
+    """
+    Helper function to build the overall leaderboard, summing the percentile of the members on each platform
+    The evolution of a member only counts the platforms where both its current and its previous scores are known.
+    :param usernames: dict[int, str], usernames of the active members by discord id
+    :param date: datetime.date, date of the leaderboard, the last day of the score matrices by default
+    :return: list[dict], overall leaderboard sorted by overall score
+    """
+    discord_ids: list[int] = list(usernames)
+    platform_percentiles: dict[str, np.ndarray] = {}
+    percentile_evolutions: np.ndarray = np.zeros(len(discord_ids))
+    for platform in PLATFORMS:
+        matrix: ScoreMatrix | None = score_matrices.get(platform)
+        if matrix is None:
+            platform_percentiles[platform] = np.zeros(len(discord_ids))
+            continue
+        days_ago: int = max((matrix.end_date - date).days, 0) if date else 0
+        scores: np.ndarray = matrix.scores_of(discord_ids, days_ago)
+        previous_scores: np.ndarray = matrix.scores_of(discord_ids, days_ago + OVERALL_EVOLUTION_DAYS)
+        platform_percentiles[platform] = _percentiles(scores)
+        percentile_evolutions += np.where(
+            np.isnan(scores) | np.isnan(previous_scores), 0.0,
+            platform_percentiles[platform] - _percentiles(previous_scores)
+        )
+
+    overall_scores: np.ndarray = np.rint(sum(platform_percentiles.values())).astype(int)
+    score_evolutions: np.ndarray = np.rint(percentile_evolutions).astype(int)
+    order: np.ndarray = np.argsort(-overall_scores, kind='stable')
+    return [
+        {
+            'username': usernames[discord_ids[row]],
+            'platform_rank': index + 1,
+            'platform_score': int(overall_scores[row]),
+            'score_evolution': int(score_evolutions[row]),
+            'platform_percentiles': {
+                platform: int(round(percentiles[row])) for platform, percentiles in platform_percentiles.items()
+            },
+        }
+        for index, row in enumerate(order) if overall_scores[row] > 0
+    ]
+
+
+class OverallLeaderboard:
+    """
+    Leaderboard of the members across every platform, computed once at the end of each update cycle.
+    Scores are not comparable between platforms, so each one is normalized as a percentile inside the organization.
+    """
+
+    def __init__(self):
+        self._usernames: dict[int, str] = {}
+        self._leaderboard: list[dict] = []
+        self._date: datetime.date | None = None
+
+    def refresh(self, users: list[User]) -> None:
+        """
+        Compute the overall leaderboard from the current score matrices
+        :param users: list[User], active members
+        :return: None
+        """
+        self._usernames = {user.discord_id: user.username for user in users}
+        self._leaderboard = _build_overall_leaderboard(self._usernames)
+        self._date = datetime.now().date()
+        logger.debug(f'Overall leaderboard refreshed for {len(self._leaderboard)} members')
+
+    def get(self, date: datetime.date = None) -> list[dict]:
+        """
+        Get the overall leaderboard, shared and not to be modified
+        Past leaderboards are computed on demand from the score matrices.
+        :param date: datetime.date, date of the leaderboard, the last refresh by default
+        :return: list[dict], overall leaderboard sorted by overall score
+        """
+        if date is None or date == self._date:
+            return self._leaderboard
+        return _build_overall_leaderboard(self._usernames, date)
+
+
+movers: Movers = Movers(MOVERS_WINDOWS)
+overall_leaderboard: OverallLeaderboard = OverallLeaderboard()